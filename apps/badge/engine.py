@@ -0,0 +1,224 @@
+"""
+Moteur de règles des badges.
+
+Chaque type de badge est une règle « compteur >= seuil » sur les compteurs
+de l'utilisateur (UserBadgeCounters), tenus à jour par les signaux des
+livres. Quand un livre change, seuls les compteurs modifiés sont réévalués,
+donc seules les règles qui en dépendent : le coût d'une vérification est
+proportionnel aux règles touchées, pas au nombre de badges. Les déblocages
+d'un passage sont écrits ensemble : un UPDATE des lignes verrouillées et un
+bulk_create des lignes absentes, par lots d'utilisateurs.
+
+Les lignes UserBadge sont créées paresseusement : une ligne absente signifie
+« verrouillé ». Créer ou modifier un badge n'écrit qu'une ligne
+BadgeEvaluation ; la commande badge_worker débloque ensuite le badge pour
+tous les utilisateurs, y compris ceux qui n'ont pas encore de compteurs.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import summary
+from .models import Badge, BadgeEvaluation, UserBadge, UserBadgeCounters
+
+COUNTERS = ['finished_books', 'clean_finished_books']
+
+# type de badge -> (compteur, seuil à partir du badge)
+RULES = {
+    'plagiat': ('clean_finished_books', lambda badge: 1),
+    'first_book': ('finished_books', lambda badge: 1),
+    'completed_books': ('finished_books', lambda badge: badge.condition_value),
+}
+
+
+def book_contribution(status, plagiat_web, plagiat_local):
+    """Part d'un livre dans les compteurs de son auteur"""
+    finished = status == 'termine'
+    return {
+        'finished_books': int(finished),
+        'clean_finished_books': int(finished and not plagiat_web and not plagiat_local),
+    }
+
+
+def _database_counts(user_ids):
+    """{utilisateur: {compteur: valeur}} recalculés depuis les livres (une requête)"""
+    finished = Q(books__status='termine')
+    rows = (
+        get_user_model().objects.filter(id__in=user_ids).values('id').annotate(
+            finished_books=Count('books', filter=finished),
+            clean_finished_books=Count(
+                'books', filter=finished & Q(books__plagiat_web=False, books__plagiat_local=False)
+            ),
+        )
+    )
+    return {row['id']: {counter: row[counter] for counter in COUNTERS} for row in rows}
+
+
+def counters_for(user_id):
+    """Compteurs de l'utilisateur, calculés depuis les livres la première fois"""
+    counters = UserBadgeCounters.objects.filter(user_id=user_id).first()
+    if counters is None:
+        counts = _database_counts([user_id]).get(user_id, {})
+        counters, _ = UserBadgeCounters.objects.get_or_create(user_id=user_id, defaults=counts)
+    return counters
+
+
+def apply_book_change(author_id, before, after):
+    """
+    Reporte le changement d'un livre (contributions avant / après, None si
+    absent) sur les compteurs de l'auteur, puis évalue les règles touchées.
+    Retourne les badges débloqués.
+    """
+    deltas = {
+        counter: (after or {}).get(counter, 0) - (before or {}).get(counter, 0)
+        for counter in COUNTERS
+    }
+    deltas = {counter: delta for counter, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+    # Seule une hausse peut remplir une règle (un badge débloqué le reste)
+    raised = [counter for counter, delta in deltas.items() if delta > 0]
+    with transaction.atomic():
+        UserBadgeCounters.objects.filter(user_id=author_id).update(
+            **{counter: F(counter) + delta for counter, delta in deltas.items()}
+        )
+        # Sans ligne de compteurs, evaluate la calcule depuis les livres (changement compris)
+        return evaluate(author_id, raised) if raised else []
+
+
+def _thresholds(badges, counters):
+    """[(badge, compteur, seuil)] des règles portant sur les compteurs demandés"""
+    return [
+        (badge, RULES[badge.badge_type][0], RULES[badge.badge_type][1](badge))
+        for badge in badges
+        if badge.badge_type in RULES and RULES[badge.badge_type][0] in counters
+    ]
+
+
+def evaluate(user_id, counters=COUNTERS):
+    """Débloque les badges de l'utilisateur dont les règles sur `counters` sont remplies"""
+    types = [badge_type for badge_type, (counter, _) in RULES.items() if counter in counters]
+    values = counters_for(user_id)
+    candidates = Badge.objects.filter(badge_type__in=types).exclude(
+        Exists(UserBadge.objects.filter(user_id=user_id, badge=OuterRef('pk'), unlocked=True))
+    )
+    earned = [
+        badge for badge, counter, threshold in _thresholds(candidates, counters)
+        if getattr(values, counter) >= threshold
+    ]
+    _unlock([user_id], [badge.id for badge in earned])
+    return earned
+
+
+def evaluate_new_user(user_id):
+    """Première fois : compteurs calculés et toutes les règles évaluées ; ensuite, rien à faire"""
+    if UserBadgeCounters.objects.filter(user_id=user_id).exists():
+        return []
+    return evaluate(user_id)
+
+
+def evaluate_badge(badge):
+    """Débloque un badge (nouveau ou modifié) pour tous les utilisateurs qui le méritent"""
+    if badge.badge_type not in RULES:
+        return 0
+    counter, threshold = RULES[badge.badge_type][0], RULES[badge.badge_type][1](badge)
+    user_ids = list(
+        UserBadgeCounters.objects.filter(**{f'{counter}__gte': threshold})
+        .exclude(Exists(UserBadge.objects.filter(user_id=OuterRef('user_id'), badge=badge, unlocked=True)))
+        .values_list('user_id', flat=True)
+    )
+    _unlock(user_ids, [badge.id])
+    return len(user_ids)
+
+
+def queue_badge(badge_id):
+    """Inscrit le badge dans la file (une requête, dans la transaction de l'enregistrement)"""
+    BadgeEvaluation.objects.bulk_create(
+        [BadgeEvaluation(badge_id=badge_id)], update_conflicts=True,
+        unique_fields=['badge'], update_fields=['queued_at'],
+    )
+
+
+def create_missing_counters(batch_size=5000):
+    """
+    Compteurs des utilisateurs qui n'en ont pas encore, calculés depuis les
+    livres ; ceux qui remplissent déjà des règles sont évalués. Retourne leur nombre.
+    """
+    user_ids = list(
+        get_user_model().objects.filter(badge_counters__isnull=True).values_list('id', flat=True)
+    )
+    for start in range(0, len(user_ids), batch_size):
+        counts = _database_counts(user_ids[start:start + batch_size])
+        UserBadgeCounters.objects.bulk_create(
+            [UserBadgeCounters(user_id=user_id, **values) for user_id, values in counts.items()],
+            batch_size=1000, ignore_conflicts=True,
+        )
+        for user_id, values in counts.items():
+            if any(values.values()):
+                evaluate(user_id)
+    return len(user_ids)
+
+
+def evaluate_pending():
+    """
+    Traite la file BadgeEvaluation ; retourne le nombre de badges évalués.
+    Une ligne n'est retirée qu'une fois le badge évalué : un arrêt du worker
+    ne perd rien, et un badge modifié entre-temps (queued_at plus récent) est
+    réévalué.
+    """
+    pending = list(BadgeEvaluation.objects.order_by('queued_at'))
+    if not pending:
+        return 0
+    create_missing_counters()
+    for evaluation in pending:
+        badge = Badge.objects.filter(pk=evaluation.badge_id).first()
+        if badge is not None:
+            evaluate_badge(badge)
+        BadgeEvaluation.objects.filter(badge_id=evaluation.badge_id, queued_at=evaluation.queued_at).delete()
+    return len(pending)
+
+
+def _unlock(user_ids, badge_ids, batch_size=1000):
+    """
+    Débloque chaque couple de user_ids x badge_ids, par lots d'utilisateurs :
+    un UPDATE des lignes verrouillées puis un bulk_create des lignes absentes
+    (une ligne absente vaut « verrouillé » ; les conflits sont ignorés).
+    """
+    now = timezone.now()
+    user_ids, badge_ids = list(user_ids), list(badge_ids)
+    if not badge_ids:
+        return
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        UserBadge.objects.filter(user_id__in=batch, badge_id__in=badge_ids, unlocked=False).update(
+            unlocked=True, unlocked_at=now
+        )
+        UserBadge.objects.bulk_create(
+            [UserBadge(user_id=user_id, badge_id=badge_id, unlocked=True, unlocked_at=now)
+             for user_id in batch for badge_id in badge_ids],
+            ignore_conflicts=True,
+        )
+    summary.invalidate_users(user_ids)
+
+
+def rebuild_counters(batch_size=5000):
+    """Recalcule les compteurs de tous les utilisateurs puis évalue tous les badges ; retourne leur nombre"""
+    user_ids = list(get_user_model().objects.values_list('id', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        counts = _database_counts(user_ids[start:start + batch_size])
+        with transaction.atomic():
+            existing = UserBadgeCounters.objects.in_bulk(list(counts))
+            for user_id, values in counts.items():
+                row = existing.setdefault(user_id, UserBadgeCounters(user_id=user_id))
+                for counter, value in values.items():
+                    setattr(row, counter, value)
+            UserBadgeCounters.objects.bulk_create(
+                [row for row in existing.values() if row._state.adding], batch_size=1000
+            )
+            UserBadgeCounters.objects.bulk_update(
+                [row for row in existing.values() if not row._state.adding], COUNTERS, batch_size=1000
+            )
+    for badge in Badge.objects.filter(badge_type__in=list(RULES)):
+        evaluate_badge(badge)
+    return len(user_ids)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.badge.engine import evaluate_pending
+
+
+class Command(BaseCommand):
+    help = "Débloque les badges créés ou modifiés pour tous les utilisateurs (file BadgeEvaluation)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide la file puis s'arrête")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Pause (s) quand la file est vide")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            count = evaluate_pending()
+            if count:
+                self.stdout.write(f"{count} badge(s) évalué(s) en {time.perf_counter() - start:.2f}s")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
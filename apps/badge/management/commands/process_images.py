@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.badge import models as badge_models
+from apps.collaboration import models as collaboration_models
+from apps.images import complete_thumbnails, delete_image, is_processed, store_image
+
+# nom -> (modèle, préfixe, tailles des vignettes)
+TARGETS = {
+    'badges': (badge_models.Badge, 'badges', badge_models.THUMBNAIL_SIZES),
+    'collaboration': (collaboration_models.CollaborationPost, 'collaboration', collaboration_models.THUMBNAIL_SIZES),
+}
+
+
+class Command(BaseCommand):
+    help = ("Normalise les images déjà en ligne (badges, posts de collaboration) : "
+            "chemins adressés par contenu et vignettes WebP/JPEG")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+        parser.add_argument('--thumbnails', action='store_true',
+                            help="Écrit aussi les vignettes manquantes des images déjà traitées (image inchangée)")
+        parser.add_argument('--delete-originals', action='store_true',
+                            help="Supprime les fichiers d'origine qui ne servent plus à aucune ligne")
+
+    def handle(self, *args, **options):
+        for target in options['models']:
+            model, prefix, sizes = TARGETS[target]
+            start = time.perf_counter()
+            processed = completed = skipped = failed = 0
+            rows = model.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image')
+            for row in rows.iterator(chunk_size=500):
+                old_name = row.image.name
+                if is_processed(old_name) and not options['thumbnails']:
+                    skipped += 1
+                    continue
+                storage = row.image.storage
+                if not storage.exists(old_name):
+                    self.stderr.write(f"{target} #{row.id} : fichier absent ({old_name})")
+                    failed += 1
+                    continue
+                try:
+                    if is_processed(old_name):
+                        # Image déjà normalisée : seules les vignettes absentes sont écrites
+                        if complete_thumbnails(old_name, sizes, storage):
+                            completed += 1
+                        else:
+                            skipped += 1
+                        continue
+                    with storage.open(old_name, 'rb') as source:
+                        new_name = store_image(source, prefix, sizes, storage)
+                except ValueError as exc:
+                    self.stderr.write(f"{target} #{row.id} : {exc}")
+                    failed += 1
+                    continue
+                if new_name != old_name:
+                    # update() : ni save() ni signaux, l'image est déjà traitée
+                    model.objects.filter(pk=row.pk).update(image=new_name)
+                    if options['delete_originals'] and not model.objects.filter(image=old_name).exists():
+                        delete_image(old_name, sizes, storage)
+                processed += 1
+            self.stdout.write(
+                f"✅ {target} : {processed} image(s) traitée(s), {completed} vignette(s) complétée(s), "
+                f"{skipped} déjà à jour, {failed} en échec ({time.perf_counter() - start:.2f}s)"
+            )
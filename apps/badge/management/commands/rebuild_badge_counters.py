@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.badge.engine import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs de badges depuis les livres et débloque les badges mérités (mise en place, réparation)"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_counters()
+        self.stdout.write(f"✅ Compteurs de {count} utilisateur(s) recalculés en {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 03:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('badge', '0003_alter_userbadge_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBadgeCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='badge_counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('finished_books', models.IntegerField(default=0)),
+                ('clean_finished_books', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
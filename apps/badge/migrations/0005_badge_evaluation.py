@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 03:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('badge', '0004_user_badge_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeEvaluation',
+            fields=[
+                ('badge', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='badge.badge')),
+                ('queued_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
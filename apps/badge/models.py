@@ -1,9 +1,13 @@
 from django.db import models
 from django.conf import settings
-import os
+from apps.images import content_path, delete_image, process_upload, thumbnail_urls
+
+# Vignettes écrites à l'enregistrement (liste des badges, mes badges : 70 à 100 px)
+THUMBNAIL_SIZES = {'small': (200, 200)}
 
 def badge_image_path(instance, filename):
-    return f'badges/{instance.id}/{filename}'
+    # Adressé par contenu : l'id n'existe pas encore au premier enregistrement
+    return content_path('badges', instance.image, filename)
 
 class Badge(models.Model):
     BADGE_TYPES = [
@@ -30,9 +34,18 @@ class Badge(models.Model):
     def __str__(self):
         return self.nom
     
+    @property
+    def thumbnails(self):
+        return thumbnail_urls(self.image, THUMBNAIL_SIZES)
+    
+    def save(self, *args, **kwargs):
+        process_upload(self.image, 'badges', THUMBNAIL_SIZES)
+        super().save(*args, **kwargs)
+    
     def delete(self, *args, **kwargs):
-        if self.image and os.path.isfile(self.image.path):
-            os.remove(self.image.path)
+        # Un même contenu peut servir à plusieurs badges
+        if self.image and not Badge.objects.filter(image=self.image.name).exclude(pk=self.pk).exists():
+            delete_image(self.image.name, THUMBNAIL_SIZES, self.image.storage)
         super().delete(*args, **kwargs)
 
 
@@ -46,4 +59,24 @@ class UserBadge(models.Model):
         unique_together = ('user', 'badge')
     
     def __str__(self):
-        return f"{self.user.username} - {self.badge.nom} ({'Unlocked' if self.unlocked else 'Locked'})"
\ No newline at end of file
+        return f"{self.user.username} - {self.badge.nom} ({'Unlocked' if self.unlocked else 'Locked'})"
+
+class UserBadgeCounters(models.Model):
+    """Entrées des règles de badges (engine.py), tenues à jour à chaque enregistrement de livre"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='badge_counters'
+    )
+    finished_books = models.IntegerField(default=0)        # livres terminés
+    clean_finished_books = models.IntegerField(default=0)  # ... sans plagiat détecté
+
+    def __str__(self):
+        return f"{self.user_id} : {self.finished_books} terminé(s), {self.clean_finished_books} sans plagiat"
+
+
+class BadgeEvaluation(models.Model):
+    """Badge créé ou modifié à débloquer pour tous les utilisateurs (file traitée par badge_worker)"""
+    badge = models.OneToOneField(Badge, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    queued_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Évaluation du badge {self.badge_id}"
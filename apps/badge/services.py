@@ -1,63 +1,54 @@
-from django.utils import timezone
+from . import engine, summary
 from .models import Badge, UserBadge
-from apps.book.models import Book  # ✅ Ajoutez apps.
 
 class BadgeService:
     
     @staticmethod
     def check_and_unlock_badges(user):
-        """Vérifie et débloque les badges pour un utilisateur"""
-        badges = Badge.objects.all()
-        unlocked_badges = []
-        
-        for badge in badges:
-            user_badge, created = UserBadge.objects.get_or_create(
-                user=user, 
-                badge=badge
-            )
-            
-            if not user_badge.unlocked:
-                if BadgeService._check_badge_condition(user, badge):
-                    user_badge.unlocked = True
-                    user_badge.unlocked_at = timezone.now()
-                    user_badge.save()
-                    unlocked_badges.append(badge)
-        
-        return unlocked_badges
+        """Vérifie et débloque les badges pour un utilisateur (toutes les règles, depuis ses compteurs)"""
+        return engine.evaluate(user.id)
     
     @staticmethod
-    def _check_badge_condition(user, badge):
-        """Vérifie si l'utilisateur remplit les conditions du badge"""
-        
-        if badge.badge_type == 'plagiat':
-            # Vérifie si l'utilisateur a au moins 1 livre terminé sans plagiat
-            return Book.objects.filter(
-                author=user,
-                status='termine',
-                plagiat_web=False,
-                plagiat_local=False
-            ).exists()
-        
-        elif badge.badge_type == 'first_book':
-            # Premier livre terminé
-            return Book.objects.filter(
-                author=user,
-                status='termine'
-            ).exists()
-        
-        elif badge.badge_type == 'completed_books':
-            # Nombre de livres terminés >= condition_value
-            count = Book.objects.filter(
-                author=user,
-                status='termine'
-            ).count()
-            return count >= badge.condition_value
-        
-        return False
+    def unlock_new_user_badges(user):
+        """
+        Première visite : compteurs calculés et badges vérifiés une fois.
+        Ensuite les signaux des livres tiennent tout à jour (engine.py).
+        """
+        return engine.evaluate_new_user(user.id)
+    
+    @staticmethod
+    def user_badges(user):
+        """
+        (débloqués, verrouillés) de l'utilisateur en deux requêtes. Une ligne
+        UserBadge absente vaut « verrouillé » : les verrouillés sont des lignes
+        non enregistrées, construites à partir des badges.
+        """
+        unlocked = list(
+            UserBadge.objects.filter(user=user, unlocked=True).select_related('badge').order_by('-unlocked_at')
+        )
+        unlocked_ids = {user_badge.badge_id for user_badge in unlocked}
+        locked = [
+            UserBadge(user=user, badge=badge, unlocked=False)
+            for badge in Badge.objects.all() if badge.id not in unlocked_ids
+        ]
+        return unlocked, locked
+    
+    @staticmethod
+    def summary(user):
+        """
+        Résumé de la page your_badges (débloqués, verrouillés, compteurs) et
+        badges débloqués à l'instant. Servi par le cache ; reconstruit au besoin.
+        """
+        cached, stamp = summary.get(user.id)   # tampon lu avant de construire le résumé
+        if cached is not None:
+            return cached, []
+        newly_unlocked = BadgeService.unlock_new_user_badges(user)
+        unlocked, locked = BadgeService.user_badges(user)
+        return summary.store(user.id, stamp, unlocked, locked), newly_unlocked
     
     @staticmethod
     def initialize_user_badges(user):
-        """Initialise tous les badges pour un nouvel utilisateur"""
-        badges = Badge.objects.all()
-        for badge in badges:
-            UserBadge.objects.get_or_create(user=user, badge=badge)
\ No newline at end of file
+        """Matérialise toutes les lignes UserBadge d'un utilisateur (une requête ; facultatif)"""
+        UserBadge.objects.bulk_create(
+            [UserBadge(user=user, badge=badge) for badge in Badge.objects.all()], ignore_conflicts=True
+        )
@@ -1,10 +1,59 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from apps.book.models import Book  # ✅ Ajoutez apps.
-from .services import BadgeService
+from . import engine, summary
+from .models import Badge
+
+BOOK_FIELDS = ['author_id', 'status', 'plagiat_web', 'plagiat_local']
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """État du livre en base avant l'enregistrement (auteur et contribution aux compteurs)"""
+    instance._badge_state = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {'author', 'status', 'plagiat_web', 'plagiat_local'} & set(update_fields):
+        instance._badge_state = False   # rien qui compte pour les badges
+        return
+    row = Book.objects.filter(pk=instance.pk).values_list(*BOOK_FIELDS).first()
+    if row is not None:
+        instance._badge_state = (row[0], engine.book_contribution(*row[1:]))
+
 
 @receiver(post_save, sender=Book)
-def check_badges_on_book_update(sender, instance, **kwargs):
-    """Vérifie les badges quand un livre est mis à jour"""
-    if instance.status == 'termine':
-        BadgeService.check_and_unlock_badges(instance.author)
\ No newline at end of file
+def check_badges_on_book_update(sender, instance, raw=False, **kwargs):
+    """Met à jour les compteurs de l'auteur ; seules les règles touchées sont vérifiées"""
+    previous = getattr(instance, '_badge_state', None)
+    if raw or previous is False:
+        return
+    after = engine.book_contribution(instance.status, instance.plagiat_web, instance.plagiat_local)
+    if previous is not None and previous[0] != instance.author_id:
+        engine.apply_book_change(previous[0], previous[1], None)
+        previous = None
+    engine.apply_book_change(instance.author_id, previous[1] if previous else None, after)
+
+
+@receiver(post_delete, sender=Book)
+def uncount_deleted_book(sender, instance, **kwargs):
+    before = engine.book_contribution(instance.status, instance.plagiat_web, instance.plagiat_local)
+    engine.apply_book_change(instance.author_id, before, None)
+
+
+@receiver(post_save, sender=Badge)
+def evaluate_saved_badge(sender, instance, raw=False, **kwargs):
+    """
+    Badge créé ou modifié (seuil) : inscrit dans la file BadgeEvaluation, puis
+    débloqué par badge_worker pour tous ceux qui remplissent déjà la règle.
+    Les autres n'ont pas de ligne UserBadge (verrouillé) : rien à provisionner.
+    """
+    if raw:
+        return
+    summary.invalidate_all()
+    if instance.badge_type in engine.RULES:
+        engine.queue_badge(instance.pk)
+
+
+@receiver(post_delete, sender=Badge)
+def forget_deleted_badge(sender, instance, **kwargs):
+    summary.invalidate_all()
@@ -0,0 +1,96 @@
+"""
+Résumé des badges d'un utilisateur (page your_badges), gardé dans le cache
+`badges`.
+
+Ce cache doit être partagé entre processus (DatabaseCache par défaut, Redis
+ou Memcached en production) : les déblocages viennent aussi des workers
+(plagiarism_worker, badge_worker), qui doivent pouvoir périmer le résumé lu
+par le web. Un cache par processus (LocMemCache) est signalé par check.
+
+Chaque résumé est stocké avec son tampon (version de l'utilisateur,
+génération des badges), lu avant de construire le résumé. Un déblocage
+change la version de l'utilisateur ; créer, modifier ou supprimer un badge
+change la génération. Un résumé construit pendant un déblocage garde donc
+l'ancien tampon et sera reconstruit à la lecture suivante.
+"""
+import time
+
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'badges'
+SUMMARY_TTL = 600
+GENERATION_KEY = 'badges:generation'
+MAX_VERSIONS = 1000   # au-delà, changer la génération coûte moins qu'écrire une version par utilisateur
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(user_id):
+    return f'badges:summary:{user_id}'
+
+
+def _version_key(user_id):
+    return f'badges:version:{user_id}'
+
+
+def get(user_id):
+    """(résumé ou None, tampon courant à passer à `store`) ; une lecture groupée"""
+    cache = _cache()
+    stamp_keys = [_version_key(user_id), GENERATION_KEY]
+    values = cache.get_many([_key(user_id)] + stamp_keys)
+    missing = [key for key in stamp_keys if key not in values]
+    if missing:
+        # Jamais de tampon vide : une clé évincée ne doit pas rendre valide un vieux résumé
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        values.update(cache.get_many(missing))
+    stamp = tuple(values.get(key) for key in stamp_keys)
+    summary = values.get(_key(user_id))
+    if summary is not None and summary['stamp'] == stamp:
+        return summary, stamp
+    return None, stamp
+
+
+def store(user_id, stamp, unlocked, locked):
+    summary = {
+        'stamp': stamp,
+        'unlocked_badges': unlocked,
+        'locked_badges': locked,
+        'total_badges': len(unlocked) + len(locked),
+        'unlocked_count': len(unlocked),
+    }
+    _cache().set(_key(user_id), summary, SUMMARY_TTL)
+    return summary
+
+
+def invalidate_users(user_ids):
+    """Après le commit : nouvelle version pour les utilisateurs qui viennent de débloquer un badge"""
+    keys = [_version_key(user_id) for user_id in user_ids]
+    if len(keys) > MAX_VERSIONS:
+        invalidate_all()
+    elif keys:
+        transaction.on_commit(lambda: _cache().set_many(dict.fromkeys(keys, time.time_ns()), None))
+
+
+def invalidate_all():
+    """Après le commit : périme tous les résumés (badge créé, modifié ou supprimé)"""
+    transaction.on_commit(lambda: _cache().set(GENERATION_KEY, time.time_ns(), None))
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    from django.conf import settings
+
+    backend = settings.CACHES.get(CACHE_ALIAS, {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache') or backend.endswith('DummyCache'):
+        return [checks.Warning(
+            f"Le cache '{CACHE_ALIAS}' n'est pas partagé entre processus : les déblocages faits par "
+            "les workers ne périment pas les résumés servis par le web.",
+            hint="Utiliser DatabaseCache (createcachetable), Redis ou Memcached.",
+            id='badge.W001',
+        )]
+    return []
@@ -1,3 +1,179 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from apps.book.models import Book
+from . import summary as summary_cache
+from .engine import evaluate_pending, rebuild_counters
+from .models import Badge, BadgeEvaluation, UserBadge, UserBadgeCounters
+from .services import BadgeService
+
+
+class BadgeEngineTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('auteur', password='x')
+        self.first = Badge.objects.create(nom='Premier', badge_type='first_book')
+        self.clean = Badge.objects.create(nom='Sans plagiat', badge_type='plagiat')
+        self.three = Badge.objects.create(nom='Trois', badge_type='completed_books', condition_value=3)
+        Badge.objects.create(nom='Perso', badge_type='custom')
+
+    def unlocked(self):
+        return set(UserBadge.objects.filter(user=self.user, unlocked=True).values_list('badge__nom', flat=True))
+
+    def book(self, **fields):
+        return Book.objects.create(title='L', synopsis='-', genre='fantasy', author=self.user,
+                                   **{'status': 'en_cours', **fields})
+
+    def test_book_events_unlock_badges(self):
+        book = self.book()
+        self.assertEqual(self.unlocked(), set())
+        book.status = 'termine'
+        book.plagiat_web = True
+        book.save()
+        self.assertEqual(self.unlocked(), {'Premier'})
+
+        book.plagiat_web = False
+        book.save(update_fields=['plagiat_web'])
+        self.assertEqual(self.unlocked(), {'Premier', 'Sans plagiat'})
+
+        # Un enregistrement qui ne touche pas les entrées des règles ne coûte que la lecture de l'état
+        # (+ l'UPDATE du livre et l'inscription dans la file des livres similaires)
+        with self.assertNumQueries(3):
+            book.title = 'Nouveau titre'
+            book.save()
+
+        self.book(status='termine')
+        book.delete()
+        self.book(status='termine')
+        self.assertNotIn('Trois', self.unlocked())
+        self.book(status='termine')
+        self.assertEqual(self.unlocked(), {'Premier', 'Sans plagiat', 'Trois'})
+        self.assertEqual(UserBadgeCounters.objects.get(user=self.user).finished_books, 3)
+
+    def test_rebuild_matches_events(self):
+        for _ in range(3):
+            self.book(status='termine', plagiat_local=True)
+        counters = UserBadgeCounters.objects.get(user=self.user)
+        UserBadgeCounters.objects.all().delete()
+        UserBadge.objects.all().delete()
+        rebuild_counters()
+        rebuilt = UserBadgeCounters.objects.get(user=self.user)
+        self.assertEqual((rebuilt.finished_books, rebuilt.clean_finished_books),
+                         (counters.finished_books, counters.clean_finished_books))
+        self.assertEqual(self.unlocked(), {'Premier', 'Trois'})
+
+    def test_new_badge_is_queued_and_evaluated_by_the_worker(self):
+        # Livres importés sans signaux : l'auteur n'a pas encore de compteurs
+        other = get_user_model().objects.create_user('importe', password='x')
+        Book.objects.bulk_create([
+            Book(title='L', synopsis='-', genre='fantasy', status='termine', author=other) for _ in range(2)
+        ])
+        two = Badge.objects.create(nom='Deux', badge_type='completed_books', condition_value=2)
+        self.assertTrue(BadgeEvaluation.objects.filter(badge=two).exists())
+        self.assertFalse(UserBadge.objects.filter(badge=two).exists())
+
+        self.assertEqual(evaluate_pending(), 4)   # les trois badges à règle de setUp et le nouveau
+        self.assertFalse(BadgeEvaluation.objects.exists())
+        self.assertTrue(UserBadge.objects.filter(user=other, badge=two, unlocked=True).exists())
+        self.assertEqual(UserBadgeCounters.objects.get(user=other).finished_books, 2)
+        self.assertEqual(evaluate_pending(), 0)
+
+
+class BadgeSummaryCacheTests(TestCase):
+
+    def setUp(self):
+        caches['badges'].clear()
+        self.user = get_user_model().objects.create_user('lecteur', password='x')
+        Badge.objects.create(nom='Premier', badge_type='first_book')
+
+    def names(self, summary, key):
+        return [user_badge.badge.nom for user_badge in summary[key]]
+
+    def test_summary_served_from_cache_until_invalidated(self):
+        summary, _ = BadgeService.summary(self.user)
+        self.assertEqual((summary['unlocked_count'], summary['total_badges']), (0, 1))
+        with self.assertNumQueries(1):   # une lecture groupée du cache partagé (DatabaseCache)
+            BadgeService.summary(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='L', synopsis='-', genre='fantasy', status='termine', author=self.user)
+        summary, _ = BadgeService.summary(self.user)
+        self.assertEqual(self.names(summary, 'unlocked_badges'), ['Premier'])
+
+        with self.captureOnCommitCallbacks(execute=True):   # type sans règle : rien dans la file d'évaluation
+            Badge.objects.create(nom='Perso', badge_type='custom')
+        summary, _ = BadgeService.summary(self.user)
+        self.assertEqual(self.names(summary, 'locked_badges'), ['Perso'])
+
+    def test_summary_built_during_an_unlock_is_not_served(self):
+        _, stamp = summary_cache.get(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):   # déblocage validé pendant la construction
+            summary_cache.invalidate_users([self.user.id])
+        summary_cache.store(self.user.id, stamp, [], [])
+        self.assertIsNone(summary_cache.get(self.user.id)[0])
+
+        # Clé de version évincée : le résumé stocké n'est pas réutilisé
+        _, stamp = summary_cache.get(self.user.id)
+        summary_cache.store(self.user.id, stamp, [], [])
+        self.assertIsNotNone(summary_cache.get(self.user.id)[0])
+        caches['badges'].delete(f'badges:version:{self.user.id}')
+        self.assertIsNone(summary_cache.get(self.user.id)[0])
+
+
+class BadgeImageTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (2400, 1200), (200, 20, 20, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_is_normalized_with_thumbnails(self):
+        badge = Badge(nom='Image', image=self.upload('photo.png'))
+        badge.save()
+        self.assertRegex(badge.image.name, r'^badges/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        with Image.open(badge.image.path) as image:
+            self.assertEqual(image.size, (1600, 800))
+        for fmt in ('webp', 'jpeg'):
+            url = badge.thumbnails['small'][fmt]
+            with badge.image.storage.open(url.replace(badge.image.storage.base_url, '')) as thumbnail:
+                self.assertEqual(Image.open(thumbnail).size, (200, 200))
+
+        # Même contenu : même fichier, conservé tant qu'un badge s'en sert
+        other = Badge.objects.create(nom='Copie', image=self.upload('copie.png'))
+        self.assertEqual(other.image.name, badge.image.name)
+        other.delete()
+        self.assertTrue(badge.image.storage.exists(badge.image.name))
+        badge.delete()
+        self.assertFalse(badge.image.storage.exists(badge.image.name))
+
+    def test_thumbnails_option_only_restores_missing_thumbnails(self):
+        badge = Badge.objects.create(nom='Image', image=self.upload('photo.png'))
+        name, storage = badge.image.name, badge.image.storage
+        with storage.open(name) as f:
+            original = f.read()
+        webp = badge.thumbnails['small']['webp'].replace(storage.base_url, '')
+        storage.delete(webp)
+
+        for _ in range(2):
+            call_command('process_images', models=['badges'], thumbnails=True, stdout=io.StringIO())
+            badge.refresh_from_db()
+            self.assertEqual(badge.image.name, name)
+        self.assertTrue(storage.exists(webp))
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), original)
 
-# Create your tests here.
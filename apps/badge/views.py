@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth import get_user_model
 from django.http import JsonResponse
 from .models import Badge, UserBadge
 from .forms import BadgeForm
@@ -34,11 +35,8 @@ def badge_create(request):
             # DEBUG : affiche l'objet badge
             print("BADGE CRÉÉ → ID:", badge.id, "| NOM:", badge.nom, "| IMAGE:", badge.image)
 
-            # Initialiser pour tous les utilisateurs
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            for user in User.objects.all():
-                UserBadge.objects.get_or_create(user=user, badge=badge)
+            # Rien à initialiser : sans ligne UserBadge, le badge est verrouillé.
+            # Les utilisateurs qui le méritent déjà sont débloqués par badge_worker (file BadgeEvaluation, voir signals.py).
             
             messages.success(request, f'Le badge "{badge.nom}" a été créé avec succès!')
             return redirect('badge:badge_list')
@@ -104,7 +102,7 @@ def badge_detail(request, pk):
     badge = get_object_or_404(Badge, pk=pk)
     
     # Statistiques du badge
-    total_users = UserBadge.objects.filter(badge=badge).count()
+    total_users = get_user_model().objects.count()
     unlocked_users = UserBadge.objects.filter(badge=badge, unlocked=True).count()
     
     context = {
@@ -119,26 +117,10 @@ def badge_detail(request, pk):
 @login_required
 def your_badges(request):
     """Endpoint pour afficher les badges de l'utilisateur connecté"""
-    # Initialiser les badges si nécessaire
-    BadgeService.initialize_user_badges(request.user)
-    
-    # Vérifier et débloquer les badges
-    newly_unlocked = BadgeService.check_and_unlock_badges(request.user)
+    # Résumé en cache (débloquer les badges : à la première visite seulement, les signaux font le reste)
+    context, newly_unlocked = BadgeService.summary(request.user)
     
     if newly_unlocked:
         messages.success(request, f'Félicitations! Vous avez débloqué {len(newly_unlocked)} nouveau(x) badge(s)!')
     
-    # Récupérer tous les badges de l'utilisateur
-    user_badges = UserBadge.objects.filter(user=request.user).select_related('badge')
-    
-    unlocked_badges = user_badges.filter(unlocked=True)
-    locked_badges = user_badges.filter(unlocked=False)
-    
-    context = {
-        'unlocked_badges': unlocked_badges,
-        'locked_badges': locked_badges,
-        'total_badges': user_badges.count(),
-        'unlocked_count': unlocked_badges.count(),
-    }
-    
     return render(request, 'badge/your_badges.html', context)
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Alignement de passages entre deux textes (seed-and-extend).
+
+Les graines sont les séquences de SEED_WORDS mots communes aux deux textes
+(hachages glissants), chaque graine est ensuite étendue mot à mot. Le coût
+est borné par un budget de temps, un nombre maximal de graines et un nombre
+maximal de mots lus, contrairement à SequenceMatcher qui est quadratique.
+"""
+import re
+import time
+
+import numpy as np
+
+SEED_WORDS = 6             # taille d'une graine (mots)
+MAX_OCCURRENCES = 50       # graines trop fréquentes ignorées (formules répétées)
+MAX_SEEDS = 200000
+MAX_WORDS = 500000         # mots lus par texte
+TIME_BUDGET = 2.0          # secondes par comparaison
+EXTEND_BLOCK = 256
+
+_WORD_RE = re.compile(r'\w+')
+_BASE = np.uint64(1000003)
+
+
+def _tokenize(text, max_words):
+    """Identifiants des mots + positions (caractères) de début et de fin"""
+    ids, starts, ends = [], [], []
+    for match in _WORD_RE.finditer(text):
+        if len(ids) >= max_words:
+            break
+        ids.append(hash(match.group().lower()))
+        starts.append(match.start())
+        ends.append(match.end())
+    return np.array(ids, dtype=np.int64), np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+
+def _shingles(ids, k):
+    n = len(ids) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+    values = ids.view(np.uint64)
+    with np.errstate(over='ignore'):
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            h = h * _BASE + values[j:j + n]
+    return h
+
+
+def _extend_right(a, b, i, j):
+    """Nombre de mots identiques à partir de a[i] et b[j]"""
+    length = 0
+    while i + length < len(a) and j + length < len(b):
+        size = min(EXTEND_BLOCK, len(a) - i - length, len(b) - j - length)
+        equal = a[i + length:i + length + size] == b[j + length:j + length + size]
+        if equal.all():
+            length += size
+        else:
+            length += int(np.argmin(equal))
+            break
+    return length
+
+
+def _extend_left(a, b, i, j, limit):
+    """Nombre de mots identiques avant a[i] et b[j], sans dépasser a[limit]"""
+    length = 0
+    while i - length - 1 >= limit and j - length - 1 >= 0 and a[i - length - 1] == b[j - length - 1]:
+        length += 1
+    return length
+
+
+def align_texts(text, other, seed_words=SEED_WORDS, time_budget=TIME_BUDGET,
+                max_seeds=MAX_SEEDS, max_words=MAX_WORDS):
+    """
+    Passages communs à `text` et `other`.
+
+    Retourne un dict :
+      - score : 2 * mots alignés / (mots de text + mots de other), comme SequenceMatcher.ratio() ;
+        un mot n'est compté aligné qu'une fois de chaque côté, le score reste donc dans [0, 1]
+      - passages : [{'start', 'end', 'words'}] (positions en caractères dans `text`)
+      - truncated : True si un budget a été atteint
+    """
+    deadline = time.monotonic() + time_budget
+    a, a_starts, a_ends = _tokenize(text, max_words)
+    b, _, _ = _tokenize(other, max_words)
+    truncated = len(a) >= max_words or len(b) >= max_words
+    result = {'score': 0.0, 'passages': [], 'truncated': truncated}
+    if len(a) < seed_words or len(b) < seed_words:
+        return result
+
+    # Graines : shingles de `a` présents dans `b`
+    seeds_a = _shingles(a, seed_words)
+    seeds_b = _shingles(b, seed_words)
+    order = np.argsort(seeds_b, kind='stable')
+    sorted_b = seeds_b[order]
+    lo = np.searchsorted(sorted_b, seeds_a, side='left')
+    hi = np.searchsorted(sorted_b, seeds_a, side='right')
+    counts = hi - lo
+    positions = np.nonzero((counts > 0) & (counts <= MAX_OCCURRENCES))[0]
+
+    passages = []
+    matched = 0
+    covered = 0   # les passages ne se chevauchent pas dans `a`
+    covered_b = np.zeros(len(b), dtype=bool)   # mais peuvent se répéter dans `b`
+    seeds = 0
+    k = 0
+    while k < len(positions):
+        i = int(positions[k])
+        if seeds >= max_seeds or time.monotonic() > deadline:
+            result['truncated'] = True
+            break
+
+        # Extension de la meilleure graine pour cette position
+        best_j, best_length = -1, 0
+        for j in order[lo[i]:hi[i]]:
+            seeds += 1
+            length = _extend_right(a, b, i, int(j))
+            if length > best_length:
+                best_j, best_length = int(j), length
+
+        if best_length >= seed_words:
+            back = _extend_left(a, b, i, best_j, covered)
+            start, other_start = i - back, best_j - back
+            length = best_length + back
+            passages.append({
+                'start': int(a_starts[start]),
+                'end': int(a_ends[start + length - 1]),
+                'words': length,
+            })
+            matched += length
+            covered_b[other_start:other_start + length] = True
+            covered = start + length
+            # Saute les graines déjà couvertes par ce passage
+            k = int(np.searchsorted(positions, covered, side='left'))
+        else:
+            k += 1
+
+    # Un passage de `other` retrouvé plusieurs fois dans `text` ne compte qu'une fois
+    result['score'] = 2 * min(matched, int(covered_b.sum())) / (len(a) + len(b))
+    result['passages'] = passages
+    return result
+
+
+def alignment_similarity(text1, text2):
+    return align_texts(text1, text2)['score']
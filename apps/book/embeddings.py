@@ -0,0 +1,123 @@
+"""
+Cache persistant des embeddings sentence-transformers.
+
+Le texte d'un livre est découpé en passages ; chaque passage est encodé une
+seule fois (clé : hash du contenu) et stocké en float16. Les comparaisons
+entre livres deviennent un simple produit matriciel sur les vecteurs stockés.
+"""
+import hashlib
+
+import numpy as np
+from django.db import transaction
+
+from .models import BookEmbedding
+from .signals import embeddings_updated
+from .utils import embedding_model
+
+CHUNK_SIZE = 1000   # caractères : ~256 tokens, la longueur max du modèle
+BATCH_SIZE = 32
+
+
+def chunk_text(text, size=CHUNK_SIZE):
+    """Découpe le texte en passages d'environ `size` caractères, sur des espaces"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(' ', start, end)
+            if space > start:
+                end = space
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+    return chunks
+
+
+def _hash(chunk):
+    return hashlib.sha1(chunk.encode('utf-8')).hexdigest()
+
+
+def _decode(vector):
+    return np.frombuffer(bytes(vector), dtype=np.float16).astype(np.float32)
+
+
+def embed_book(book, text):
+    """
+    Vecteurs (n_passages x dim) du texte d'un livre.
+    Seuls les passages jamais vus sont encodés ; None si le modèle est indisponible.
+    """
+    if embedding_model is None:
+        return None
+
+    chunks = chunk_text(text)
+    hashes = [_hash(chunk) for chunk in chunks]
+    stored = list(BookEmbedding.objects.filter(book=book).values_list('content_hash', 'vector'))
+    if stored and [h for h, _ in stored] == hashes:
+        return np.vstack([_decode(v) for _, v in stored])
+
+    # Réutilise les vecteurs déjà calculés (ce livre ou un autre)
+    known = dict(
+        BookEmbedding.objects.filter(content_hash__in=set(hashes)).values_list('content_hash', 'vector')
+    )
+    vectors = {h: _decode(v) for h, v in known.items()}
+    missing = [(h, chunk) for h, chunk in zip(hashes, chunks) if h not in vectors]
+    if missing:
+        encoded = embedding_model.encode(
+            [chunk for _, chunk in missing],
+            batch_size=BATCH_SIZE,
+            normalize_embeddings=True,
+        )
+        for (h, _), vector in zip(missing, encoded):
+            vectors[h] = np.asarray(vector, dtype=np.float32)
+
+    with transaction.atomic():
+        BookEmbedding.objects.filter(book=book).delete()
+        BookEmbedding.objects.bulk_create([
+            BookEmbedding(
+                book=book, position=i, content_hash=h,
+                vector=vectors[h].astype(np.float16).tobytes()
+            )
+            for i, h in enumerate(hashes)
+        ])
+
+    chunk_vectors = np.vstack([vectors[h] for h in hashes]) if hashes else np.empty((0, 0), dtype=np.float32)
+    embeddings_updated.send(sender=book.__class__, book=book, vector=mean_vector(chunk_vectors))
+    return chunk_vectors
+
+
+def mean_vector(chunk_vectors):
+    """Vecteur unique d'un livre : moyenne normalisée de ses passages"""
+    if chunk_vectors is None or len(chunk_vectors) == 0:
+        return None
+    vector = chunk_vectors.mean(axis=0)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def book_vectors(book_ids):
+    """
+    Vecteurs des livres déjà encodés, en une requête.
+    Retourne (ids, matrice n_livres x dim) ; les livres sans embedding sont ignorés.
+    """
+    grouped = {}
+    rows = BookEmbedding.objects.filter(book_id__in=book_ids).values_list('book_id', 'vector')
+    for book_id, vector in rows.iterator():
+        grouped.setdefault(book_id, []).append(_decode(vector))
+
+    ids = [book_id for book_id in book_ids if book_id in grouped]
+    if not ids:
+        return [], np.empty((0, 0), dtype=np.float32)
+    matrix = np.vstack([mean_vector(np.vstack(grouped[book_id])) for book_id in ids])
+    return ids, matrix
+
+
+def embedding_scores(vector, book_ids):
+    """Similarité cosinus entre un vecteur et les livres donnés : {book_id: score}"""
+    if vector is None:
+        return {}
+    ids, matrix = book_vectors(book_ids)
+    if not ids:
+        return {}
+    return dict(zip(ids, (matrix @ vector).tolist()))
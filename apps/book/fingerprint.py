@@ -0,0 +1,197 @@
+"""
+Index d'empreintes pour la détection de plagiat entre livres.
+
+Chaque livre est réduit à un ensemble de hachages de n-grammes de caractères
+sélectionnés par winnowing, puis à une signature MinHash découpée en bandes
+(LSH). La recherche de candidats se fait par une requête indexée sur les
+bandes au lieu de relire et comparer tous les livres.
+"""
+import hashlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import BookFingerprint, FingerprintBand
+from .reader import iter_book_chunks
+from .utils import kgram_hashes
+
+# === CONFIG ===
+KGRAM_SIZE = 20      # taille des n-grammes de caractères
+WINNOW_WINDOW = 8    # fenêtre de winnowing
+NUM_PERM = 128       # nombre de permutations MinHash
+NUM_BANDS = 128      # une valeur par bande : le nombre de bandes communes estime le Jaccard,
+                     # ce qui fait ressortir aussi les copies partielles
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+MINHASH_CHUNK = 8192
+
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Permutations fixes : les signatures doivent rester comparables entre processus
+_rng = np.random.default_rng(20251101)
+_PERM_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def winnow(hashes, window=WINNOW_WINDOW):
+    """Garde le minimum de chaque fenêtre glissante (ensemble trié, sans doublons)"""
+    if len(hashes) == 0:
+        return hashes
+    if len(hashes) <= window:
+        return np.unique(hashes)
+    windows = np.lib.stride_tricks.sliding_window_view(hashes, window)
+    return np.unique(windows.min(axis=1))
+
+
+def minhash(hashes):
+    """Signature MinHash (NUM_PERM valeurs uint32) d'un ensemble de hachages"""
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    values = hashes.astype(np.uint64)
+    with np.errstate(over='ignore'):
+        for start in range(0, len(values), MINHASH_CHUNK):
+            block = values[start:start + MINHASH_CHUNK]
+            permuted = (_PERM_A[:, None] * block[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def band_buckets(signature):
+    """Découpe la signature en bandes LSH -> liste de (bande, seau)"""
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=8).digest()
+        # BigIntegerField est signé : on garde 63 bits
+        buckets.append((band, int.from_bytes(digest, 'big') >> 1))
+    return buckets
+
+
+def compute_fingerprint(text):
+    hashes = winnow(kgram_hashes(text, KGRAM_SIZE))
+    return hashes, minhash(hashes)
+
+
+def load_hashes(fingerprint):
+    return np.frombuffer(bytes(fingerprint.hashes), dtype=np.uint32)
+
+
+def load_signature(fingerprint):
+    return np.frombuffer(bytes(fingerprint.signature), dtype=np.uint32)
+
+
+def resemblance(hashes1, hashes2):
+    """Part d'empreintes communes, rapportée au plus petit des deux ensembles"""
+    if len(hashes1) == 0 or len(hashes2) == 0:
+        return 0.0
+    shared = np.intersect1d(hashes1, hashes2, assume_unique=True)
+    return len(shared) / min(len(hashes1), len(hashes2))
+
+
+def winnow_chunks(chunks):
+    """
+    Empreintes winnowing d'un texte fourni par blocs consécutifs.
+    Retourne (sha1 du texte, hachages) ; identique à winnow(kgram_hashes(texte))
+    sans jamais avoir le texte entier en mémoire.
+    """
+    digest = hashlib.sha1()
+    selected = []
+    text_tail = ''                              # KGRAM_SIZE - 1 derniers caractères
+    hash_tail = np.empty(0, dtype=np.uint32)    # WINNOW_WINDOW - 1 derniers n-grammes
+    for chunk in chunks:
+        digest.update(chunk.encode('utf-8'))
+        window = text_tail + chunk
+        hashes = np.concatenate([hash_tail, kgram_hashes(window, KGRAM_SIZE)])
+        if len(hashes) >= WINNOW_WINDOW:
+            selected.append(winnow(hashes))
+        text_tail = window[-(KGRAM_SIZE - 1):]
+        hash_tail = hashes[-(WINNOW_WINDOW - 1):]
+    if not selected:
+        # Texte plus court qu'une fenêtre : winnow garde tous les n-grammes
+        selected.append(np.unique(hash_tail))
+    return digest.hexdigest(), np.unique(np.concatenate(selected))
+
+
+def index_book(book):
+    """Met à jour l'empreinte d'un livre (lecture en flux), seulement si son texte a changé"""
+    digest, hashes = winnow_chunks(iter_book_chunks(book))
+    fingerprint = BookFingerprint.objects.filter(book=book).first()
+    if fingerprint and fingerprint.content_hash == digest:
+        return fingerprint
+    return _store_fingerprint(book, digest, hashes, minhash(hashes))
+
+
+def index_paragraphs(book, paragraphs):
+    """
+    Empreinte d'un livre recomposée à partir de celles de ses paragraphes
+    (BookParagraph.hashes et .signature), sans relire ni rehacher le texte :
+    la signature MinHash d'une union est le minimum des signatures.
+
+    Les n-grammes à cheval sur deux paragraphes sont ignorés ; l'empreinte
+    porte un digest différent de celui du texte, l'analyse complète
+    (index_book) la recalcule donc exactement.
+    """
+    digest = content_hash(''.join(sorted(p.content_hash for p in paragraphs)))
+    fingerprint = BookFingerprint.objects.filter(book=book).first()
+    if fingerprint and fingerprint.content_hash == digest:
+        return fingerprint
+    hashes = np.unique(np.concatenate([load_hashes(p) for p in paragraphs] or [np.empty(0, np.uint32)]))
+    signature = (
+        np.min([load_signature(p) for p in paragraphs], axis=0) if paragraphs
+        else np.full(NUM_PERM, _MAX_HASH, dtype=np.uint32)
+    )
+    return _store_fingerprint(book, digest, hashes, signature)
+
+
+def _store_fingerprint(book, digest, hashes, signature):
+    with transaction.atomic():
+        fingerprint, _ = BookFingerprint.objects.update_or_create(
+            book=book,
+            defaults={
+                'content_hash': digest,
+                'hashes': hashes.tobytes(),
+                'signature': signature.tobytes(),
+            }
+        )
+        fingerprint.bands.all().delete()
+        FingerprintBand.objects.bulk_create([
+            FingerprintBand(fingerprint=fingerprint, band=band, bucket=bucket)
+            for band, bucket in band_buckets(signature)
+        ])
+    return fingerprint
+
+
+def probe(fingerprint, books=None, probe_limit=20):
+    """Empreintes partageant le plus de bandes LSH avec `fingerprint` (requête indexée)"""
+    signature = load_signature(fingerprint)
+    query = Q()
+    for band, bucket in band_buckets(signature):
+        query |= Q(band=band, bucket=bucket)
+
+    matches = FingerprintBand.objects.filter(query).exclude(fingerprint=fingerprint)
+    if books is not None:
+        matches = matches.filter(fingerprint__book__in=books)
+    probed = [
+        row['fingerprint_id'] for row in
+        matches.values('fingerprint_id').annotate(hits=Count('id')).order_by('-hits')[:probe_limit]
+    ]
+    if not probed:
+        return []
+    return list(BookFingerprint.objects.filter(id__in=probed))
+
+
+def find_candidates(fingerprint, books=None, limit=3, probe_limit=20):
+    """
+    Livres les plus proches via l'index LSH.
+    Retourne une liste de (book_id, ressemblance) triée par ressemblance décroissante.
+    """
+    hashes = load_hashes(fingerprint)
+    scored = [
+        (other.book_id, resemblance(hashes, load_hashes(other)))
+        for other in probe(fingerprint, books, probe_limit)
+    ]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:limit]
@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.book.utils import compare_one_to_many, tfidf_similarity, ngram_similarity
+
+WORDS = (
+    "le la les un une des et ou mais donc car dans sur sous avec sans pour par "
+    "chat chien maison forêt rivière ville nuit jour soleil lune étoile mer montagne "
+    "marcher courir parler chanter écrire lire dormir rêver penser aimer regarder "
+    "rouge bleu vert sombre clair ancien nouveau grand petit rapide lent silencieux"
+).split()
+
+
+def synthetic_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit (paires/s) du scoring un-contre-plusieurs face à la boucle par paire"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+        parser.add_argument('--length', type=int, default=2000, help="Taille (caractères) de chaque texte")
+        parser.add_argument('--pairwise-sample', type=int, default=200,
+                            help="Nombre de paires mesurées pour la boucle par paire")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        length = options['length']
+        query = synthetic_text(rng, length)
+
+        self.stdout.write(f"{'livres':>8} {'par paire (p/s)':>16} {'lot (p/s)':>12} {'gain':>8}")
+        for size in options['sizes']:
+            candidates = [synthetic_text(rng, length) for _ in range(size)]
+
+            sample = candidates[:min(size, options['pairwise_sample'])]
+            start = time.perf_counter()
+            for candidate in sample:
+                tfidf_similarity(query, candidate)
+                ngram_similarity(query, candidate, n=5)
+            pairwise_rate = len(sample) / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            compare_one_to_many(query, candidates, with_sequence=False, with_embeddings=False)
+            batch_rate = size / (time.perf_counter() - start)
+
+            self.stdout.write(
+                f"{size:>8} {pairwise_rate:>16.0f} {batch_rate:>12.0f} {batch_rate / pairwise_rate:>7.1f}x"
+            )
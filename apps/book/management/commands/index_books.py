@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.book.embeddings import embed_book
+from apps.book.fingerprint import index_book
+from apps.book.models import Book
+from apps.book.reader import read_book_text
+
+
+class Command(BaseCommand):
+    help = "Construit ou met à jour l'index d'empreintes et les embeddings de tous les livres"
+
+    def handle(self, *args, **options):
+        total = 0
+        for book in Book.objects.all().iterator():
+            index_book(book)
+            embed_book(book, read_book_text(book))
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"{total} livre(s) indexé(s)"))
@@ -0,0 +1,32 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.book.plagiarism import claim_next_job, run_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Exécute les analyses de plagiat en file d'attente"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide la file puis s'arrête")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Pause (s) quand la file est vide")
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help="Remet en attente les jobs 'running' plus vieux que cette durée")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(timedelta(minutes=options['stale_minutes']))
+        if requeued:
+            self.stdout.write(f"{requeued} job(s) remis en attente")
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            job = run_job(job)
+            self.stdout.write(f"Job {job.id} (livre {job.book_id}) : {job.status}")
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 01:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0008_merge_0006_merge_20251031_2112_0007_alter_book_genre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=40)),
+                ('hashes', models.BinaryField()),
+                ('signature', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint', to='book.book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FingerprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='book.bookfingerprint')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='fingerprintband',
+            index=models.Index(fields=['band', 'bucket'], name='book_finger_band_001ebd_idx'),
+        ),
+    ]
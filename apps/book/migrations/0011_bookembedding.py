@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 01:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0010_plagiarismjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(db_index=True, max_length=40)),
+                ('vector', models.BinaryField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to='book.book')),
+            ],
+            options={
+                'ordering': ['book', 'position'],
+                'unique_together': {('book', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 01:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0011_bookembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plagiarismjob',
+            name='incremental',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='BookParagraph',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(max_length=40)),
+                ('length', models.PositiveIntegerField()),
+                ('excerpt', models.CharField(max_length=300)),
+                ('db_score', models.FloatField(default=0)),
+                ('web_matches', models.JSONField(blank=True, default=list)),
+                ('checked_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paragraphs', to='book.book')),
+                ('similar_book', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='book.book')),
+            ],
+            options={
+                'ordering': ['book', 'position'],
+                'unique_together': {('book', 'content_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0012_bookparagraph'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre'], name='book_book_genre_8d5c56_idx'),
+        ),
+    ]
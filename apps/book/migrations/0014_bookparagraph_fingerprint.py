@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_book_genre_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookparagraph',
+            name='hashes',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='bookparagraph',
+            name='signature',
+            field=models.BinaryField(default=b''),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 03:45
+
+from django.db import migrations, models
+
+
+def merge_pending_jobs(apps, schema_editor):
+    """Garde le plus ancien job en attente de chaque livre (complet si l'un des doublons l'était)"""
+    PlagiarismJob = apps.get_model('book', 'PlagiarismJob')
+    kept = {}
+    for job in PlagiarismJob.objects.filter(status='pending').order_by('created_at', 'id'):
+        first = kept.setdefault(job.book_id, job)
+        if first is job:
+            continue
+        if not job.incremental and first.incremental:
+            first.incremental = False
+            first.save(update_fields=['incremental'])
+        job.delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0014_bookparagraph_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_pending_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='plagiarismjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('book',), name='plagiarism_single_pending_job'),
+        ),
+    ]
@@ -58,5 +58,90 @@ class Book(models.Model):
         blank=True
     )
 
+    class Meta:
+        indexes = [models.Index(fields=['genre'])]  # recommandations par genre
+
+    def __str__(self):
+        return self.title
+
+class BookFingerprint(models.Model):
+    """Empreinte (winnowing + MinHash) utilisée par l'index de plagiat"""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='fingerprint')
+    content_hash = models.CharField(max_length=40)
+    hashes = models.BinaryField()     # hachages winnowing (uint32 triés)
+    signature = models.BinaryField()  # signature MinHash (uint32)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"Empreinte de {self.book.title}"
+
+
+class FingerprintBand(models.Model):
+    """Bande LSH d'une signature MinHash : la recherche de candidats est une requête indexée"""
+    fingerprint = models.ForeignKey(BookFingerprint, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['band', 'bucket'])]
+
+
+class PlagiarismJob(models.Model):
+    """Analyse de plagiat en file d'attente, exécutée par la commande plagiarism_worker"""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échoué'),
+    ]
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='plagiarism_jobs')
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    incremental = models.BooleanField(default=False)  # ne réanalyse que les paragraphes modifiés
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        constraints = [
+            # Un seul job en attente par livre : les sauvegardes suivantes le réutilisent
+            models.UniqueConstraint(fields=['book'], condition=models.Q(status='pending'),
+                                    name='plagiarism_single_pending_job'),
+        ]
+
+    def __str__(self):
+        return f"Analyse #{self.id} de {self.book.title} ({self.status})"
+
+
+class BookEmbedding(models.Model):
+    """Vecteur sentence-transformers d'un passage de livre, retrouvé par hash de contenu"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='embeddings')
+    position = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=40, db_index=True)
+    vector = models.BinaryField()  # float16, normalisé
+
+    class Meta:
+        ordering = ['book', 'position']
+        unique_together = ('book', 'position')
+
+
+class BookParagraph(models.Model):
+    """Dernier état analysé d'un paragraphe : seuls les paragraphes modifiés sont réanalysés"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='paragraphs')
+    position = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=40)
+    length = models.PositiveIntegerField()
+    excerpt = models.CharField(max_length=300)
+    db_score = models.FloatField(default=0)
+    similar_book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    web_matches = models.JSONField(default=list, blank=True)
+    hashes = models.BinaryField(default=b'')      # empreintes winnowing (uint32 triés)
+    signature = models.BinaryField(default=b'')   # MinHash (NUM_PERM x uint32)
+    checked_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['book', 'position']
+        unique_together = ('book', 'content_hash')
@@ -0,0 +1,357 @@
+"""
+Analyse de plagiat hors du cycle requête/réponse.
+
+Les sauvegardes de l'éditeur ne font que créer un PlagiarismJob ; la commande
+`plagiarism_worker` exécute l'analyse, écrit le résultat sur le job et met à
+jour Book.plagiat_web / Book.plagiat_local.
+
+Les jobs incrémentaux (sauvegardes de l'éditeur) ne réanalysent que les
+paragraphes modifiés depuis la révision précédente (voir BookParagraph).
+"""
+import logging
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .alignment import align_texts
+from .embeddings import embed_book, embedding_scores, mean_vector
+from .fingerprint import (
+    compute_fingerprint, content_hash, find_candidates, index_book, index_paragraphs, load_hashes, probe
+)
+from .models import Book, BookParagraph, PlagiarismJob
+from .reader import read_book_text
+from .utils import compare_one_to_many, check_web_plagiarism, embedding_model, split_paragraphs
+
+logger = logging.getLogger(__name__)
+
+DB_PLAGIARISM_THRESHOLD = 0.75
+DB_SIMILARITY_NOTICE = 0.5
+# Seuils de l'analyse incrémentale, dont le score est une part de texte retrouvé
+# (voir analyze_book_incremental) : étalonnés pour donner le même verdict que
+# l'analyse complète (copie à 10 %, 40 % et 100 % dans les tests)
+INCREMENTAL_PLAGIARISM_THRESHOLD = 0.6
+INCREMENTAL_SIMILARITY_NOTICE = 0.25
+MAX_PASSAGES = 20          # passages copiés renvoyés à l'éditeur
+MAX_PASSAGE_CHARS = 300
+MIN_PARAGRAPH_CHARS = 40   # paragraphes plus courts : enregistrés mais pas analysés
+
+
+def enqueue_plagiarism_check(book, user=None, incremental=False, attempts=3):
+    """
+    Crée un job, ou réutilise celui encore en attente pour ce livre. La
+    contrainte plagiarism_single_pending_job garantit l'unicité entre
+    sauvegardes concurrentes : get_or_create relit le job créé par l'autre.
+    """
+    for attempt in range(attempts):
+        try:
+            job, created = PlagiarismJob.objects.get_or_create(
+                book=book, status='pending', defaults={'requested_by': user, 'incremental': incremental}
+            )
+            break
+        except IntegrityError:
+            # Le job concurrent a été réservé par un worker avant d'être relu : on recommence
+            if attempt == attempts - 1:
+                raise
+    if not created and job.incremental and not incremental:
+        # Sans effet si un worker vient de le réserver : l'analyse complète suivante reste due
+        job.incremental = False
+        PlagiarismJob.objects.filter(id=job.id, status='pending').update(incremental=False)
+    return job
+
+
+def analyze_book(book):
+    """Analyse complète (DB + web) d'un livre ; retourne un dict sérialisable"""
+    test_text = read_book_text(book)
+    if len(test_text) < 100:
+        return {'too_short': True}
+
+    # 1. Plagiat dans la DB : l'index d'empreintes ne renvoie que les meilleurs candidats
+    fingerprint = index_book(book)
+    candidates = find_candidates(fingerprint, books=Book.objects.filter(author=book.author))
+    candidate_books = Book.objects.in_bulk([book_id for book_id, _ in candidates])
+    db_max_sim = 0
+    similar_title = ""
+    passages = []
+
+    # Textes des candidats retenus par l'index
+    other_texts = {}
+    for book_id, _ in candidates:
+        other_text = read_book_text(candidate_books[book_id])
+        if len(other_text) >= 50:
+            other_texts[book_id] = other_text
+
+    if other_texts:
+        ids = list(other_texts)
+        matrix = compare_one_to_many(
+            test_text, [other_texts[i] for i in ids], with_sequence=False, with_embeddings=False
+        )
+
+        # Alignement borné des passages (remplace SequenceMatcher sur les textes entiers)
+        alignments = [align_texts(test_text, other_texts[i]) for i in ids]
+        matrix[:, 0] = [alignment['score'] for alignment in alignments]
+
+        # Embeddings : encodés une fois par révision, comparés par produit scalaire
+        test_vector = mean_vector(embed_book(book, test_text))
+        cached_scores = embedding_scores(test_vector, ids)
+        for row, book_id in enumerate(ids):
+            embedding_score = cached_scores.get(book_id)
+            if embedding_score is None:
+                other_vector = mean_vector(embed_book(candidate_books[book_id], other_texts[book_id]))
+                embedding_score = float(other_vector @ test_vector) if other_vector is not None else 0.0
+            matrix[row, 2] = embedding_score
+
+        if embedding_model is None:
+            matrix = matrix[:, [0, 1, 3]]   # colonne des embeddings vide : hors de la moyenne
+        averages = matrix.mean(axis=1)
+        best = int(averages.argmax())
+        db_max_sim = float(averages[best])
+        similar_title = candidate_books[ids[best]].title
+        # Positions dans le texte normalisé, pas dans celui de l'éditeur : on n'envoie que l'extrait
+        passages = [
+            {'text': test_text[passage['start']:passage['end']][:MAX_PASSAGE_CHARS], 'words': passage['words']}
+            for passage in sorted(alignments[best]['passages'], key=lambda p: p['words'], reverse=True)
+        ][:MAX_PASSAGES]
+
+    # 2. Plagiat sur le web
+    web_matches = []
+    try:
+        web_matches = check_web_plagiarism(test_text)
+    except Exception as e:
+        logger.warning(f"Erreur web pendant l'analyse du livre {book.id}: {e}")
+
+    return {
+        'too_short': False,
+        'method': 'full',
+        'db_max_sim': db_max_sim,
+        'similar_title': similar_title,
+        'passages': passages,
+        'web_matches': web_matches,
+    }
+
+
+def _paragraph_db_score(hashes, candidates):
+    """Part des empreintes du paragraphe retrouvée dans le livre candidat le plus proche"""
+    best_score, best_book = 0.0, None
+    if len(hashes) == 0:
+        return best_score, best_book
+    for book_id, other_hashes in candidates:
+        score = float(np.isin(hashes, other_hashes, assume_unique=True).mean())
+        if score > best_score:
+            best_score, best_book = score, book_id
+    return best_score, best_book
+
+
+def analyze_book_incremental(book):
+    """
+    Analyse limitée aux paragraphes modifiés depuis la dernière analyse.
+    Les scores des paragraphes inchangés sont repris tels quels ; le résultat
+    a le même format que celui d'analyze_book.
+
+    Seuls les paragraphes modifiés sont hachés : l'empreinte du livre
+    utilisée pour chercher les candidats est recomposée à partir des
+    empreintes stockées sur chaque BookParagraph (index_paragraphs).
+
+    db_max_sim n'est pas la moyenne des quatre métriques de l'analyse
+    complète mais la part du texte (pondérée par la longueur des paragraphes)
+    retrouvée dans les empreintes d'un autre livre. Il est comparé à ses
+    propres seuils, INCREMENTAL_PLAGIARISM_THRESHOLD et
+    INCREMENTAL_SIMILARITY_NOTICE (voir db_verdict).
+    """
+    # Paragraphes actuels (dédoublonnés), comparés à la révision précédente
+    current = {}
+    for text in split_paragraphs(book.content):
+        current.setdefault(content_hash(text), text)
+    if sum(len(text) for text in current.values()) < 100:
+        return {'too_short': True}
+    previous = {p.content_hash: p for p in BookParagraph.objects.filter(book=book)}
+    changed = {h: text for h, text in current.items() if h not in previous}
+    to_score = {h: text for h, text in changed.items() if len(text) >= MIN_PARAGRAPH_CHARS}
+
+    # Nouvelle révision : empreintes des seuls paragraphes modifiés
+    positions = {h: i for i, h in enumerate(current)}
+    created = []
+    for h, text in changed.items():
+        hashes, signature = compute_fingerprint(text)
+        created.append(BookParagraph(
+            book=book, position=positions[h], content_hash=h, length=len(text),
+            excerpt=text[:MAX_PASSAGE_CHARS], hashes=hashes.tobytes(), signature=signature.tobytes(),
+        ))
+    updated = []
+    for h, paragraph in previous.items():
+        if h not in positions:
+            continue
+        if not paragraph.signature:
+            # Paragraphe enregistré avant le stockage des empreintes : calculé une seule fois
+            hashes, signature = compute_fingerprint(current[h])
+            paragraph.hashes, paragraph.signature = hashes.tobytes(), signature.tobytes()
+            updated.append(paragraph)
+        elif paragraph.position != positions[h]:
+            updated.append(paragraph)
+        paragraph.position = positions[h]
+    paragraphs = created + [p for h, p in previous.items() if h in positions]
+
+    web_by_paragraph = {}
+    fingerprint = index_paragraphs(book, paragraphs)
+    if to_score:
+        # 1. DB : empreintes des paragraphes modifiés contre les livres proposés par l'index
+        candidates = [
+            (other.book_id, load_hashes(other))
+            for other in probe(fingerprint, books=Book.objects.filter(author=book.author))
+        ]
+        for paragraph in created:
+            if paragraph.content_hash in to_score:
+                paragraph.db_score, paragraph.similar_book_id = _paragraph_db_score(
+                    load_hashes(paragraph), candidates
+                )
+
+        # 2. Web : phrases clés prises uniquement dans le texte modifié
+        try:
+            web_matches = check_web_plagiarism(' '.join(to_score.values()))
+        except Exception as e:
+            logger.warning(f"Erreur web pendant l'analyse du livre {book.id}: {e}")
+            web_matches = []
+        for match in web_matches:
+            owner = next((h for h, text in to_score.items() if match['sentence'][:60] in text), next(iter(to_score)))
+            web_by_paragraph.setdefault(owner, []).append(match)
+        for paragraph in created:
+            paragraph.web_matches = web_by_paragraph.get(paragraph.content_hash, [])
+
+    # 3. Sauvegarde de la nouvelle révision
+    with transaction.atomic():
+        BookParagraph.objects.filter(book=book).exclude(content_hash__in=list(current)).delete()
+        BookParagraph.objects.bulk_create(created)
+        BookParagraph.objects.bulk_update(updated, ['position', 'hashes', 'signature'])
+
+    # 4. Résultat du livre : agrégation de tous les paragraphes
+    total = sum(p.length for p in paragraphs) or 1
+    db_max_sim = sum(p.db_score * p.length for p in paragraphs) / total
+    weights = {}
+    for p in paragraphs:
+        if p.similar_book_id:
+            weights[p.similar_book_id] = weights.get(p.similar_book_id, 0) + p.db_score * p.length
+    similar_title = ""
+    if weights:
+        similar = Book.objects.filter(id=max(weights, key=weights.get)).first()
+        similar_title = similar.title if similar else ""
+
+    paragraphs.sort(key=lambda p: p.position)
+    return {
+        'too_short': False,
+        'db_max_sim': db_max_sim,
+        'similar_title': similar_title,
+        'passages': [
+            {'text': p.excerpt, 'similarity': round(p.db_score * 100, 2)}
+            for p in sorted(paragraphs, key=lambda p: p.db_score, reverse=True)
+            if p.db_score > INCREMENTAL_SIMILARITY_NOTICE
+        ][:MAX_PASSAGES],
+        'web_matches': [match for p in paragraphs for match in p.web_matches],
+        'method': 'incremental',
+        'paragraphs_checked': len(to_score),
+        'paragraphs_total': len(current),
+    }
+
+
+def db_verdict(result):
+    """'plagiat', 'notice' ou None selon les seuils de l'analyse qui a produit db_max_sim"""
+    if result.get('method') == 'incremental':
+        threshold, notice = INCREMENTAL_PLAGIARISM_THRESHOLD, INCREMENTAL_SIMILARITY_NOTICE
+    else:
+        threshold, notice = DB_PLAGIARISM_THRESHOLD, DB_SIMILARITY_NOTICE
+    if result['db_max_sim'] > threshold:
+        return 'plagiat'
+    if result['db_max_sim'] > notice:
+        return 'notice'
+    return None
+
+
+def plagiarism_messages(result):
+    """Messages affichés à l'utilisateur, au format attendu par l'éditeur"""
+    if result.get('too_short'):
+        return [{'text': "Contenu trop court pour analyse.", 'tags': 'info'}]
+
+    db_max_sim = result['db_max_sim']
+    similar_title = result['similar_title']
+    web_matches = result['web_matches']
+    message_list = []
+
+    verdict = db_verdict(result)
+    if verdict == 'plagiat':
+        message_list.append({'text': f"Plagiat DB détecté avec « {similar_title} » ({round(db_max_sim*100,1)}%)", 'tags': 'warning'})
+    elif verdict == 'notice':
+        message_list.append({'text': f"Similarité DB : {round(db_max_sim*100,1)}% avec « {similar_title} »", 'tags': 'info'})
+
+    if web_matches:
+        for match in web_matches[:2]:  # Max 2 alertes
+            message_list.append({'text': f"Plagiat web détecté : « {match['sentence'][:60]}... » → {match['url']} ({match['similarity']}%)", 'tags': 'warning'})
+    else:
+        message_list.append({'text': f"Analyse terminée ! DB: {round(db_max_sim*100,1)}% | Web: OK", 'tags': 'success'})
+    return message_list
+
+
+def claim_next_job():
+    """Réserve le plus ancien job en attente (sûr avec plusieurs workers)"""
+    with transaction.atomic():
+        job = (
+            PlagiarismJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_job(job):
+    try:
+        if job.incremental and job.book.content:
+            result = analyze_book_incremental(job.book)
+        else:
+            result = analyze_book(job.book)
+    except Exception as e:
+        logger.exception(f"Échec de l'analyse de plagiat (job {job.id})")
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+
+    book = job.book
+    if not result['too_short']:
+        book.plagiat_local = db_verdict(result) == 'plagiat'
+        book.plagiat_web = bool(result['web_matches'])
+        book.save(update_fields=['plagiat_web', 'plagiat_local'])
+
+    job.status = 'done'
+    job.result = result
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(older_than):
+    """
+    Remet en attente les jobs restés 'running' après l'arrêt brutal d'un
+    worker. Si le livre a déjà un job en attente, celui-ci refera l'analyse :
+    le job interrompu est marqué échoué (et le job en attente passe en
+    analyse complète si besoin).
+    """
+    stale = PlagiarismJob.objects.filter(status='running', started_at__lt=timezone.now() - older_than)
+    requeued = 0
+    for job in stale.order_by('-created_at'):
+        try:
+            with transaction.atomic():
+                requeued += PlagiarismJob.objects.filter(id=job.id, status='running').update(
+                    status='pending', started_at=None
+                )
+        except IntegrityError:
+            if not job.incremental:
+                PlagiarismJob.objects.filter(book_id=job.book_id, status='pending').update(incremental=False)
+            PlagiarismJob.objects.filter(id=job.id).update(
+                status='failed', error="Interrompu ; remplacé par le job en attente", finished_at=timezone.now()
+            )
+    return requeued
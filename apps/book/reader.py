@@ -0,0 +1,133 @@
+"""
+Lecture en flux du texte des livres.
+
+Les fichiers ne sont jamais chargés en entier : les .txt sont lus par blocs
+via mmap (décodage UTF-8 incrémental), les .pdf page par page. Chaque bloc est
+normalisé en coupant après un espace, hors d'une balise HTML : la
+concaténation des blocs est exactement clean_text(texte complet).
+"""
+import codecs
+import mmap
+import os
+
+from django.utils.html import strip_tags
+
+from .utils import NON_TEXT_RE, WHITESPACE_RE
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+CHUNK_BYTES = 256 * 1024
+MAX_ANALYSIS_CHARS = 3000000   # texte maximal chargé en mémoire pour une analyse
+MAX_TAG_CHARS = 4096           # au-delà, un '<' sans '>' n'est pas une balise
+
+
+def _iter_txt(path, chunk_bytes):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Validation avant le premier bloc : un fichier qui n'est pas en UTF-8
+            # lève UnicodeDecodeError avant toute lecture, d'où le repli sur book.content
+            validator = codecs.getincrementaldecoder('utf-8')()
+            for offset in range(0, len(mm), chunk_bytes):
+                validator.decode(mm[offset:offset + chunk_bytes])
+            validator.decode(b'', final=True)
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            for offset in range(0, len(mm), chunk_bytes):
+                yield decoder.decode(mm[offset:offset + chunk_bytes])
+            yield decoder.decode(b'', final=True)
+
+
+def _iter_pdf(path):
+    if pdfplumber is None:
+        raise ValueError("pdfplumber n'est pas installé")
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            yield (page.extract_text() or '') + '\n'
+            page.flush_cache()  # libère les objets de la page déjà lue
+
+
+def iter_raw_chunks(book, chunk_bytes=CHUNK_BYTES):
+    """Blocs de texte brut du fichier du livre, ou de son contenu HTML à défaut"""
+    if book.file:
+        path = book.file.path
+        started = False
+        try:
+            reader = _iter_pdf(path) if path.lower().endswith('.pdf') else _iter_txt(path, chunk_bytes)
+            for chunk in reader:
+                started = True
+                yield chunk
+            return
+        except Exception:
+            if started:
+                raise
+            # Fichier absent ou illisible : fallback sur book.content
+
+    content = book.content or ''
+    for offset in range(0, len(content), chunk_bytes):
+        yield content[offset:offset + chunk_bytes]
+
+
+def _split_point(text):
+    """Position de coupe sûre : juste après le dernier espace, jamais dans une balise ouverte"""
+    cut = len(text)
+    tag_start = text.rfind('<')
+    if tag_start != -1 and len(text) - tag_start < MAX_TAG_CHARS and text.find('>', tag_start) == -1:
+        cut = tag_start
+    space = max(text.rfind(' ', 0, cut), text.rfind('\n', 0, cut), text.rfind('\t', 0, cut))
+    return space + 1 if space >= 0 else cut
+
+
+def _cut_chunks(raw_chunks):
+    """Recoupe les blocs bruts sur des positions sûres (la fin incomplète passe au bloc suivant)"""
+    carry = ''
+    for raw in raw_chunks:
+        text = carry + raw
+        cut = _split_point(text)
+        carry = text[cut:]
+        yield text[:cut]
+    yield carry
+
+
+def normalize_chunks(raw_chunks):
+    """Normalise bloc par bloc : ''.join(blocs) == clean_text(''.join(raw_chunks))"""
+    space = None          # espaces de fin retenus tant qu'on ne sait pas s'ils sont finaux
+    after_space = False   # le bloc précédent se termine par une espace (déjà réduite)
+    for text in _cut_chunks(raw_chunks):
+        # Mêmes étapes que clean_text, la réduction des espaces continuant d'un bloc à l'autre
+        text = WHITESPACE_RE.sub(' ', strip_tags(text))
+        if after_space and text.startswith(' '):
+            text = text[1:]
+        if text:
+            after_space = text.endswith(' ')
+        normalized = NON_TEXT_RE.sub('', text).lower()
+        body = normalized.rstrip()
+        if space is None:
+            body = body.lstrip()
+        if body:
+            yield (space or '') + body
+            space = normalized[len(normalized.rstrip()):]
+        elif space is not None:
+            space += normalized
+
+
+def iter_book_chunks(book, chunk_bytes=CHUNK_BYTES):
+    """Blocs de texte propre d'un livre ; ''.join(blocs) == texte propre complet"""
+    return normalize_chunks(iter_raw_chunks(book, chunk_bytes))
+
+
+def read_book_text(book, max_chars=MAX_ANALYSIS_CHARS):
+    """Lit le texte propre (fichier .txt/.pdf ou contenu HTML nettoyé), limité à max_chars"""
+    parts = []
+    size = 0
+    for chunk in iter_book_chunks(book):
+        if max_chars is not None and size + len(chunk) >= max_chars:
+            parts.append(chunk[:max_chars - size])
+            break
+        parts.append(chunk)
+        size += len(chunk)
+    return ''.join(parts).strip()
+
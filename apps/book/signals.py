@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Envoyé après l'écriture des embeddings d'un livre (bulk_create : pas de post_save).
+# Arguments : book, vector (moyenne normalisée des passages, None si le livre est vide)
+embeddings_updated = Signal()
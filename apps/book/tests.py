@@ -0,0 +1,404 @@
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from difflib import SequenceMatcher
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import embeddings, fingerprint, plagiarism, web_fetch
+from .alignment import align_texts
+from .fingerprint import NUM_BANDS, find_candidates, index_book, load_hashes
+from .models import Book, BookEmbedding, BookFingerprint, FingerprintBand, PlagiarismJob
+from .reader import read_book_text
+from .signals import embeddings_updated
+from .utils import clean_text, compare_one_to_many, ngram_similarity, tfidf_similarity
+
+
+class AlignTextsTests(SimpleTestCase):
+
+    def test_repeated_text_is_counted_once(self):
+        other = ' '.join(f'mot{i}' for i in range(40))
+        text = ' '.join([other] * 3)
+        forward = align_texts(text, other)['score']
+        backward = align_texts(other, text)['score']
+        expected = SequenceMatcher(None, text.split(), other.split(), autojunk=False).ratio()
+        self.assertAlmostEqual(forward, expected)
+        self.assertAlmostEqual(backward, expected)
+        self.assertLessEqual(forward, 1.0)
+
+    def test_identical_and_unrelated_texts(self):
+        text = ' '.join(f'mot{i}' for i in range(40))
+        self.assertEqual(align_texts(text, text)['score'], 1.0)
+        self.assertEqual(align_texts(text, ' '.join(f'autre{i}' for i in range(40)))['score'], 0.0)
+
+
+def paragraph_generator(seed):
+    """Générateur de paragraphes aléatoires dont les mots suivent une loi de Zipf"""
+    rng = random.Random(seed)
+    lexicon = [''.join(rng.choice('abcdefghijlmnoprstuvé') for _ in range(rng.randint(2, 9)))
+               for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(lexicon))]
+    return lambda: ' '.join(rng.choices(lexicon, weights, k=rng.randint(40, 90))) + '.'
+
+
+class FingerprintIndexTests(TestCase):
+
+    def setUp(self):
+        self.paragraph = paragraph_generator(2)
+        self.author = get_user_model().objects.create_user('auteur', password='x')
+
+    def create_book(self, title, paragraphs):
+        return Book.objects.create(
+            title=title, synopsis='-', genre='fantasy', status='en_cours', author=self.author,
+            content=''.join(f'<p>{text}</p>' for text in paragraphs),
+        )
+
+    def test_source_of_a_copied_passage_ranks_first(self):
+        passage = [self.paragraph() for _ in range(3)]
+        source = self.create_book('Source', [self.paragraph() for _ in range(10)] + passage)
+        other = self.create_book('Autre', [self.paragraph() for _ in range(13)])
+        copy = self.create_book('Copie', passage + [self.paragraph() for _ in range(10)])
+        for book in (source, other):
+            index_book(book)
+
+        candidates = find_candidates(index_book(copy))
+        self.assertEqual(candidates[0][0], source.id)
+        self.assertGreater(candidates[0][1], 0.1)
+        self.assertNotIn(other.id, [book_id for book_id, score in candidates if score > 0.05])
+
+        # Après modification, la nouvelle empreinte remplace l'ancienne (hachages et bandes)
+        old = index_book(copy)
+        old_hashes = load_hashes(old)
+        copy.content = ''.join(f'<p>{self.paragraph()}</p>' for _ in range(13))
+        copy.save()
+        new = index_book(copy)
+        self.assertEqual(new.id, old.id)
+        self.assertNotEqual(new.content_hash, old.content_hash)
+        self.assertLess(np.isin(load_hashes(new), old_hashes).mean(), 0.05)
+        self.assertEqual(BookFingerprint.objects.filter(book=copy).count(), 1)
+        self.assertEqual(FingerprintBand.objects.filter(fingerprint=new).count(), NUM_BANDS)
+        self.assertNotIn(source.id, [book_id for book_id, score in find_candidates(new) if score > 0.05])
+
+
+class PlagiarismPathsTests(TestCase):
+    """L'analyse complète et l'analyse incrémentale donnent le même verdict DB"""
+
+    def setUp(self):
+        self.paragraph = paragraph_generator(1)
+        self.author = get_user_model().objects.create_user('auteur', password='x')
+        self.source = [self.paragraph() for _ in range(30)]
+        index_book(self.create_book('Source', self.source))
+
+    def create_book(self, title, paragraphs):
+        return Book.objects.create(
+            title=title, synopsis='-', genre='fantasy', status='en_cours', author=self.author,
+            content=''.join(f'<p>{text}</p>' for text in paragraphs),
+        )
+
+    def test_same_verdict(self):
+        with mock.patch.object(plagiarism, 'check_web_plagiarism', return_value=[]):
+            for copied, expected in ((3, None), (12, 'notice'), (30, 'plagiat')):
+                paragraphs = self.source[:copied] + [self.paragraph() for _ in range(30 - copied)]
+                book = self.create_book(f'Copie {copied}', paragraphs)
+                full = plagiarism.analyze_book(book)
+                incremental = plagiarism.analyze_book_incremental(book)
+                self.assertEqual(plagiarism.db_verdict(full), expected, full['db_max_sim'])
+                self.assertEqual(plagiarism.db_verdict(incremental), expected, incremental['db_max_sim'])
+
+    def test_incremental_save_hashes_only_changed_paragraphs(self):
+        paragraphs = self.source[:20] + [self.paragraph() for _ in range(10)]
+        book = self.create_book('Copie', paragraphs)
+        with mock.patch.object(plagiarism, 'check_web_plagiarism', return_value=[]):
+            first = plagiarism.analyze_book_incremental(book)
+            edited = self.paragraph()
+            book.content = ''.join(f'<p>{text}</p>' for text in paragraphs[:-1] + [edited])
+            book.save()
+            with mock.patch.object(fingerprint, 'iter_book_chunks', side_effect=AssertionError("texte relu")), \
+                    mock.patch.object(fingerprint, 'kgram_hashes', wraps=fingerprint.kgram_hashes) as hashed:
+                second = plagiarism.analyze_book_incremental(book)
+        self.assertEqual([call.args[0] for call in hashed.call_args_list], [edited])
+        self.assertEqual(second['paragraphs_checked'], 1)
+        self.assertEqual(plagiarism.db_verdict(second), plagiarism.db_verdict(first))
+        self.assertAlmostEqual(second['db_max_sim'], first['db_max_sim'], delta=0.05)
+        self.assertTrue(all(p['similarity'] > plagiarism.INCREMENTAL_SIMILARITY_NOTICE * 100
+                            for p in second['passages']))
+        self.assertEqual(second['similar_title'], 'Source')
+
+
+class StubEmbeddingModel:
+    """Modèle factice : vecteur déterministe par passage, compte les passages encodés"""
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.encoded = []
+
+    def encode(self, chunks, batch_size=32, normalize_embeddings=True):
+        self.encoded.extend(chunks)
+        vectors = np.array([
+            np.random.default_rng(int(embeddings._hash(chunk)[:8], 16)).normal(size=self.dim) for chunk in chunks
+        ])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class EmbedBookTests(TestCase):
+
+    def setUp(self):
+        self.model = StubEmbeddingModel()
+        patcher = mock.patch.object(embeddings, 'embedding_model', self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = get_user_model().objects.create_user('auteur', password='x')
+        self.sent = []
+        receiver = lambda sender, book, vector, **kwargs: self.sent.append((book.id, vector))
+        embeddings_updated.connect(receiver)
+        self.addCleanup(embeddings_updated.disconnect, receiver)
+        paragraph = paragraph_generator(3)
+        self.text = ' '.join(paragraph() for _ in range(12))
+
+    def create_book(self, title):
+        return Book.objects.create(title=title, synopsis='-', genre='fantasy', status='en_cours',
+                                   author=self.author)
+
+    def test_vectors_are_reused_by_content_hash(self):
+        chunks = embeddings.chunk_text(self.text)
+        self.assertGreater(len(chunks), 2)
+        book = self.create_book('Un')
+        first = embeddings.embed_book(book, self.text)
+        self.assertEqual(self.model.encoded, chunks)
+        self.assertEqual(BookEmbedding.objects.filter(book=book).count(), len(chunks))
+
+        # Même texte sauvegardé à nouveau : rien n'est encodé, vecteurs relus (float16)
+        second = embeddings.embed_book(book, self.text)
+        self.assertEqual(len(self.model.encoded), len(chunks))
+        self.assertEqual(second.dtype, np.float32)
+        np.testing.assert_allclose(second, first, atol=1e-3)
+
+        # Autre livre avec le même texte : vecteurs repris du premier
+        other = self.create_book('Deux')
+        np.testing.assert_allclose(embeddings.embed_book(other, self.text), first, atol=1e-3)
+        self.assertEqual(len(self.model.encoded), len(chunks))
+
+        # Texte ajouté : seuls les passages nouveaux (dont le dernier, prolongé) sont encodés
+        edited = embeddings.chunk_text(self.text + ' ' + 'un passage ajouté à la fin du livre ' * 5)
+        embeddings.embed_book(book, ' '.join(edited))
+        new_chunks = [chunk for chunk in edited if chunk not in chunks]
+        self.assertTrue(0 < len(new_chunks) < len(edited))
+        self.assertEqual(self.model.encoded[len(chunks):], new_chunks)
+
+        # Le signal porte le vecteur moyen du livre, sauf quand les vecteurs stockés sont réutilisés tels quels
+        self.assertEqual([book_id for book_id, _ in self.sent], [book.id, other.id, book.id])
+        np.testing.assert_allclose(self.sent[0][1], embeddings.mean_vector(first), atol=1e-6)
+
+    def test_book_without_text_sends_no_vector(self):
+        book = self.create_book('Vide')
+        self.assertEqual(len(embeddings.embed_book(book, '')), 0)
+        self.assertEqual(self.sent, [(book.id, None)])
+        self.assertEqual(self.model.encoded, [])
+
+
+class CompareOneToManyTests(SimpleTestCase):
+
+    def test_batch_matches_pairwise_scores(self):
+        paragraph = paragraph_generator(5)
+        source = [paragraph() for _ in range(10)]
+        text = ' '.join(source)
+        candidates = [' '.join(source[:copied] + [paragraph() for _ in range(10 - copied)])
+                      for copied in range(0, 11, 2)]
+        candidates += [paragraph(), text.upper(), '', '!!!']
+        scores = compare_one_to_many(text, candidates, with_sequence=False, with_embeddings=False)
+        self.assertEqual(scores.shape, (len(candidates), 4))
+        np.testing.assert_allclose(scores[:, 1], [tfidf_similarity(text, c) for c in candidates], atol=1e-9)
+        np.testing.assert_allclose(scores[:, 3], [ngram_similarity(text, c) for c in candidates], atol=1e-9)
+        self.assertTrue((np.diff(scores[:6, 1]) > 0).all())   # plus de texte copié, score plus haut
+
+
+class ReadBookTextTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = get_user_model().objects.create_user('auteur', password='x')
+
+    def create_book(self, data):
+        return Book.objects.create(title='Livre', synopsis='-', genre='fantasy', status='en_cours',
+                                   author=self.author, content='<p>Texte du contenu</p>',
+                                   file=SimpleUploadedFile('livre.txt', data))
+
+    def test_utf8_file_is_read(self):
+        book = self.create_book('Texte du fichier, été'.encode('utf-8'))
+        self.assertEqual(read_book_text(book), clean_text('Texte du fichier, été'))
+
+    def test_file_not_in_utf8_falls_back_to_content(self):
+        book = self.create_book('Texte du fichier, été'.encode('latin-1'))
+        self.assertEqual(read_book_text(book), clean_text(book.content))
+
+
+class PlagiarismJobTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user('auteur', password='x')
+        self.book = Book.objects.create(title='Livre', synopsis='-', genre='fantasy', status='en_cours',
+                                        author=self.author, content='<p>' + 'texte original ' * 20 + '</p>')
+
+    def test_enqueue_reuses_the_pending_job(self):
+        job = plagiarism.enqueue_plagiarism_check(self.book, self.author, incremental=True)
+        again = plagiarism.enqueue_plagiarism_check(self.book, self.author, incremental=True)
+        self.assertEqual(again.id, job.id)
+        self.assertTrue(again.incremental)
+        # Une demande complète rend le job en attente complet
+        full = plagiarism.enqueue_plagiarism_check(self.book, self.author)
+        self.assertEqual(full.id, job.id)
+        job.refresh_from_db()
+        self.assertFalse(job.incremental)
+        self.assertEqual(PlagiarismJob.objects.count(), 1)
+
+        # Une fois le job réservé, une nouvelle sauvegarde crée un nouveau job
+        self.assertEqual(plagiarism.claim_next_job().id, job.id)
+        self.assertNotEqual(plagiarism.enqueue_plagiarism_check(self.book, self.author).id, job.id)
+
+    def test_second_pending_job_is_rejected(self):
+        PlagiarismJob.objects.create(book=self.book)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PlagiarismJob.objects.create(book=self.book)
+
+    def test_claim_and_run(self):
+        job = plagiarism.enqueue_plagiarism_check(self.book, self.author)
+        claimed = plagiarism.claim_next_job()
+        self.assertEqual((claimed.id, claimed.status), (job.id, 'running'))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertIsNone(plagiarism.claim_next_job())
+
+        result = {'too_short': False, 'method': 'full', 'db_max_sim': 0.9, 'similar_title': 'Source',
+                  'passages': [], 'web_matches': []}
+        with mock.patch.object(plagiarism, 'analyze_book', return_value=result):
+            done = plagiarism.run_job(claimed)
+        self.assertEqual(done.status, 'done')
+        self.assertEqual(PlagiarismJob.objects.get(id=job.id).result, result)
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.plagiat_local)
+        self.assertFalse(self.book.plagiat_web)
+
+        plagiarism.enqueue_plagiarism_check(self.book, self.author)
+        with mock.patch.object(plagiarism, 'analyze_book', side_effect=ValueError('illisible')), \
+                self.assertLogs(plagiarism.logger, 'ERROR'):
+            failed = plagiarism.run_job(plagiarism.claim_next_job())
+        self.assertEqual((failed.status, failed.error), ('failed', 'illisible'))
+        self.assertIsNotNone(failed.finished_at)
+
+    def test_requeue_stale_jobs(self):
+        old = timezone.now() - timedelta(hours=1)
+        stale = PlagiarismJob.objects.create(book=self.book, status='running', started_at=old)
+        recent = PlagiarismJob.objects.create(book=self.book, status='running', started_at=timezone.now())
+        self.assertEqual(plagiarism.requeue_stale_jobs(timedelta(minutes=30)), 1)
+        stale.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((stale.status, stale.started_at), ('pending', None))
+        self.assertEqual(recent.status, 'running')
+
+        # Le livre a déjà un job en attente : le job interrompu est abandonné à son profit
+        PlagiarismJob.objects.filter(id=recent.id).update(started_at=old)
+        self.assertEqual(plagiarism.requeue_stale_jobs(timedelta(minutes=30)), 0)
+        recent.refresh_from_db()
+        self.assertEqual(recent.status, 'failed')
+        self.assertEqual(PlagiarismJob.objects.filter(book=self.book, status='pending').count(), 1)
+
+    def test_status_endpoint(self):
+        job = plagiarism.enqueue_plagiarism_check(self.book, self.author)
+        url = reverse('plagiarism_job_status', args=[job.id])
+
+        other = get_user_model().objects.create_user('autre', password='x')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).json(), {'id': job.id, 'status': 'pending'})
+
+        job.status = 'done'
+        job.result = {'too_short': False, 'method': 'full', 'db_max_sim': 0.1, 'similar_title': '',
+                      'passages': [{'text': 'extrait', 'words': 12}], 'web_matches': []}
+        job.save()
+        data = self.client.get(url).json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['passages'], job.result['passages'])
+        self.assertEqual(data['messages'], plagiarism.plagiarism_messages(job.result))
+
+        PlagiarismJob.objects.filter(id=job.id).update(status='failed')
+        self.assertEqual(self.client.get(url).json()['messages'][0]['tags'], 'warning')
+
+
+class StubSession:
+    """Session HTTP factice : enregistre l'hôte et l'instant de chaque appel"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        with self._lock:
+            self.calls.append((url, time.monotonic()))
+        if url == web_fetch.GOOGLE_SEARCH_URL:
+            return mock.Mock(status_code=200, json=lambda: {'items': [{'link': 'https://a.example/page'}]})
+        return mock.Mock(status_code=200, text=f'<p>page {url}</p>')
+
+
+@override_settings(CACHES=dict(settings.CACHES, plagiarism={
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'plagiarism-tests',
+}))
+class WebFetchTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['plagiarism'].clear()
+        self.session = StubSession()
+        self.interval = 0.05
+        for target, value in (('get_session', lambda: self.session),
+                              ('rate_limiter', web_fetch.HostRateLimiter(self.interval))):
+            patcher = mock.patch.object(web_fetch, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fetch_all(self, urls):
+        return web_fetch.run_concurrently(lambda url: web_fetch.fetch_page_text(url, str.upper), urls)
+
+    def test_pages_are_rate_limited_per_host_then_cached(self):
+        urls = [f'https://{host}.example/{i}' for host in 'ab' for i in range(4)]
+        start = time.monotonic()
+        texts = self.fetch_all(urls)
+        elapsed = time.monotonic() - start
+        self.assertEqual(texts, [f'<P>PAGE {url.upper()}</P>' for url in urls])   # ordre conservé
+
+        for host in 'ab':
+            times = sorted(at for url, at in self.session.calls if url.startswith(f'https://{host}.'))
+            self.assertEqual(len(times), 4)
+            self.assertTrue(all(later - earlier >= self.interval * 0.9
+                                for earlier, later in zip(times, times[1:])))
+        # Les deux hôtes avancent en parallèle : pas 7 intervalles à la suite
+        self.assertLess(elapsed, self.interval * 6)
+
+        # Deuxième vérification : tout vient du cache
+        self.assertEqual(self.fetch_all(urls), texts)
+        self.assertEqual(len(self.session.calls), len(urls))
+
+    def test_same_sentence_is_searched_once(self):
+        sentence = '"une phrase recherchée deux fois"'
+        first = web_fetch.search_google(sentence, 'cle', 'moteur')
+        second = web_fetch.search_google(sentence, 'cle', 'moteur')
+        self.assertEqual(first, [{'link': 'https://a.example/page'}])
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.session.calls), 1)
+        web_fetch.search_google('"une autre phrase"', 'cle', 'moteur')
+        self.assertEqual(len(self.session.calls), 2)
@@ -10,6 +10,7 @@ urlpatterns = [
     path('<int:id>/editor/', views.book_editor, name='book_editor'),  # Éditeur de texte
     path('test/', views.test_view, name='book_test'),
     path('plagiarism-test/', views.plagiarism_test, name='plagiarism_test'),  
+    path('plagiarism/jobs/<int:job_id>/', views.plagiarism_job_status, name='plagiarism_job_status'),
     path('download-examples/', views.download_example_books, name='download_example_books'),  
     
     path('api/ai/correct-grammar/', ai_views.correct_grammar, name='ai_correct_grammar'),
@@ -1,19 +1,16 @@
 import re
-import requests
 from bs4 import BeautifulSoup
 from nltk.tokenize import sent_tokenize
 import nltk
 from difflib import SequenceMatcher
 from django.utils.html import strip_tags
-import urllib.parse
-import random
-import time
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import os
+from .alignment import alignment_similarity
+from .web_fetch import run_concurrently, search_google, search_bing, fetch_page_text
 
 # === CONFIG ===
 nltk.download('punkt', quiet=True)
@@ -26,23 +23,28 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', 'AIzaSyD6UdQVEI-oksSgZU2azISTYO8K3Q
 GOOGLE_CSE_ID = os.getenv('GOOGLE_CSE_ID', '93c28cbfa63ad47c3')
 
 
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
-]
 
 # --- Utility Functions ---
 def sequence_similarity(text1, text2):
     return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
 
+WHITESPACE_RE = re.compile(r'\s+')
+NON_TEXT_RE = re.compile(r'[^\w\s.,!?;:\-\'"]')
+
 def clean_text(text):
     if not text:
         return ""
     text = strip_tags(text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s.,!?;:\-\'"]', '', text)
+    text = WHITESPACE_RE.sub(' ', text)
+    text = NON_TEXT_RE.sub('', text)
     return text.strip().lower()
 
+BLOCK_END_RE = re.compile(r'</(?:p|div|h[1-6]|li|blockquote|pre)>|<br\s*/?>|\n', re.IGNORECASE)
+
+def split_paragraphs(html):
+    """Paragraphes nettoyés d'un contenu HTML (éditeur) ou d'un texte brut"""
+    return [p for p in (clean_text(part) for part in BLOCK_END_RE.split(html or '')) if p]
+
 def extract_key_sentences(text, num_sentences=3):
     """Extract most meaningful sentences for plagiarism checking"""
     sentences = sent_tokenize(text)
@@ -67,6 +69,27 @@ def tfidf_similarity(text1, text2):
     except:
         return 0.0
 
+_HASH_BASE = np.uint64(1000003)
+_HASH_MASK = np.uint64(0xFFFFFFFF)
+
+def kgram_hashes(text, k):
+    """Hachages 32 bits de tous les n-grammes de caractères (hachage glissant vectorisé)"""
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint32)
+
+    with np.errstate(over='ignore'):
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            h = h * _HASH_BASE + codes[j:j + n]
+        # Mélange des bits avant de garder les 32 bits de poids fort
+        h ^= h >> np.uint64(29)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(32)
+    return (h & _HASH_MASK).astype(np.uint32)
+
+
 def ngram_similarity(text1, text2, n=5):
     text1 = clean_text(text1)
     text2 = clean_text(text2)
@@ -105,6 +128,100 @@ def embedding_similarity(text1, text2):
     
     return cosine_similarity(emb1, emb2)[0][0]
 
+# === BATCH SCORING ===
+SCORE_COLUMNS = ('sequence', 'tfidf', 'embedding', 'ngram')
+PAIR_IDF_SINGLE = 1 + np.log(3 / 2)   # IDF lissé d'un terme présent dans un seul des deux textes
+
+def compare_one_to_many(text, candidates, n=5, batch_size=32, with_sequence=True, with_embeddings=True):
+    """
+    Compare un texte à plusieurs candidats en une passe.
+    Retourne une matrice NumPy (len(candidates) x 4), colonnes dans l'ordre de SCORE_COLUMNS.
+    """
+    scores = np.zeros((len(candidates), len(SCORE_COLUMNS)), dtype=np.float64)
+    if not candidates or not text:
+        return scores
+
+    # TF-IDF : un seul vectoriseur pour tout le lot. L'IDF reste celui de chaque paire, comme
+    # tfidf_similarity : 1 pour un terme des deux textes, PAIR_IDF_SINGLE pour un terme d'un
+    # seul. Produit scalaire et normes de chaque paire s'en déduisent par trois produits creux.
+    try:
+        counts = CountVectorizer().fit_transform([text] + list(candidates)).astype(np.float64).tocsr()
+    except ValueError:
+        pass  # vocabulaire vide
+    else:
+        query, others = counts[0], counts[1:]
+        query_sq, others_sq = query.multiply(query), others.multiply(others)
+        weight = PAIR_IDF_SINGLE ** 2 - 1
+        dot = (others @ query.T).toarray().ravel()
+        query_norm = ((weight + 1) * query_sq.sum()
+                      - weight * ((others > 0).astype(np.float64) @ query_sq.T).toarray().ravel())
+        others_norm = ((weight + 1) * np.asarray(others_sq.sum(axis=1)).ravel()
+                       - weight * (others_sq @ (query > 0).astype(np.float64).T).toarray().ravel())
+        norms = np.sqrt(query_norm * others_norm)
+        scores[:, 1] = np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+
+    # N-grammes de caractères : Jaccard sur les ensembles de n-grammes hachés
+    cleaned = [clean_text(t) for t in [text] + list(candidates)]
+    if len(cleaned[0]) >= n:
+        query_ngrams = np.unique(kgram_hashes(cleaned[0], n))
+        for i, candidate in enumerate(cleaned[1:]):
+            ngrams = np.unique(kgram_hashes(candidate, n))
+            if len(ngrams) == 0:
+                continue
+            shared = np.isin(ngrams, query_ngrams, assume_unique=True).sum()
+            scores[i, 3] = shared / (len(ngrams) + len(query_ngrams) - shared)
+
+    if with_embeddings and embedding_model is not None:
+        encoded = embedding_model.encode(cleaned, batch_size=batch_size, normalize_embeddings=True)
+        scores[:, 2] = encoded[1:] @ encoded[0]
+
+    if with_sequence:
+        scores[:, 0] = [alignment_similarity(text, candidate) for candidate in candidates]
+
+    return scores
+
+# === WEB PLAGIARISM: SHARED HELPERS ===
+def _key_sentences(text):
+    """Phrases à rechercher sur le web (nettoyées, 30 caractères minimum)"""
+    sentences = [clean_text(s) for s in extract_key_sentences(clean_text(text), 3)]
+    return [s for s in sentences if len(s) >= 30]
+
+def _best_page_match(clean_sentence, page_text):
+    """Meilleure phrase de la page pour une phrase recherchée -> (similarité, extrait)"""
+    page_sentences = [s for s in sent_tokenize(page_text)[:200] if len(s) >= 20]  # 200 premières phrases
+    if not page_sentences:
+        return 0.0, ""
+
+    cleaned = [clean_text(s) for s in page_sentences]
+    scores = compare_one_to_many(clean_sentence, cleaned, with_sequence=False)
+    scores[:, 0] = [sequence_similarity(clean_sentence, s) for s in cleaned]
+    if embedding_model is None:
+        scores = scores[:, [0, 1, 3]]
+
+    averages = scores.mean(axis=1)
+    best = int(averages.argmax())
+    return float(averages[best]), page_sentences[best][:300]
+
+def _score_pages(to_fetch, threshold, label):
+    """Télécharge les pages en parallèle (cache + limite par hôte) puis les compare"""
+    urls = list(dict.fromkeys(url for _, url, _ in to_fetch))
+    pages = dict(zip(urls, run_concurrently(lambda url: fetch_page_text(url, clean_text), urls)))
+
+    web_matches = []
+    for clean_sentence, url_page, title in to_fetch:
+        max_sim, best_snippet = _best_page_match(clean_sentence, pages[url_page])
+        logger.debug(f"[{label}] {title[:50]}... similarité max: {max_sim*100:.1f}%")
+        if max_sim >= threshold:
+            logger.info(f"[{label}] Correspondance : {url_page} ({max_sim*100:.1f}%)")
+            web_matches.append({
+                'sentence': clean_sentence[:200],
+                'similarity': round(max_sim * 100, 2),
+                'url': url_page,
+                'title': title,
+                'snippet': best_snippet
+            })
+    return web_matches
+
 # === IMPROVED WEB PLAGIARISM WITH GOOGLE API ===
 def check_web_plagiarism_google_api(text, threshold=0.75):
     """
@@ -112,128 +229,49 @@ def check_web_plagiarism_google_api(text, threshold=0.75):
     Get your API key from: https://console.developers.google.com/
     Get your CSE ID from: https://programmablesearchengine.google.com/
     """
-    print(f"🎯 [PLAGIAT-GOOGLE-API] Début analyse")
-    
+    logger.debug("[PLAGIAT-GOOGLE-API] Début analyse")
+
     if not GOOGLE_API_KEY or GOOGLE_API_KEY == 'YOUR_API_KEY':
-        print("❌ [PLAGIAT-GOOGLE-API] API key manquante!")
+        logger.warning("[PLAGIAT-GOOGLE-API] Clé d'API manquante")
         return []
     
-    clean_text_content = clean_text(text)
-    sentences = extract_key_sentences(clean_text_content, 3)
-    
+    sentences = _key_sentences(text)
+
+    # Recherches exactes en parallèle (top 5 résultats, réponses en cache)
+    results = run_concurrently(
+        lambda sentence: search_google(f'"{sentence}"', GOOGLE_API_KEY, GOOGLE_CSE_ID, num=5),
+        sentences
+    )
+
     web_matches = []
-    session = requests.Session()
-    
-    for i, sentence in enumerate(sentences):
-        clean_sentence = clean_text(sentence)
-        if len(clean_sentence) < 30:
-            continue
-
-        print(f"🔎 [PLAGIAT-GOOGLE-API] Recherche {i+1}/3: '{clean_sentence[:60]}...'")
-        
-        # Use Google Custom Search API
-        api_url = "https://www.googleapis.com/customsearch/v1"
-        params = {
-            'key': GOOGLE_API_KEY,
-            'cx': GOOGLE_CSE_ID,
-            'q': f'"{clean_sentence}"',  # Exact match
-            'num': 5  # Get top 5 results
-        }
-        
-        try:
-            time.sleep(1)  # Rate limiting
-            response = session.get(api_url, params=params, timeout=10)
-            
-            if response.status_code != 200:
-                print(f"❌ [PLAGIAT-GOOGLE-API] Erreur API: {response.status_code}")
+    to_fetch = []
+    for clean_sentence, items in zip(sentences, results):
+        logger.debug(f"[PLAGIAT-GOOGLE-API] '{clean_sentence[:60]}...' : {len(items)} résultat(s)")
+        for item in items:
+            url_page = item.get('link')
+            title = item.get('title', 'Sans titre')
+            snippet = item.get('snippet', '')
+            if not url_page:
                 continue
-            
-            data = response.json()
-            items = data.get('items', [])
-            print(f"📈 [PLAGIAT-GOOGLE-API] Résultats trouvés: {len(items)}")
-            
-            for item in items:
-                url_page = item.get('link')
-                title = item.get('title', 'Sans titre')
-                snippet = item.get('snippet', '')
-                
-                if not url_page:
-                    continue
-                
-                print(f"🔗 [PLAGIAT-GOOGLE-API] Test: {title[:50]}...")
-                
-                # Check snippet first for quick match
-                snippet_sim = sequence_similarity(clean_sentence, clean_text(snippet))
-                
-                if snippet_sim >= threshold:
-                    print(f"🚨 [PLAGIAT-GOOGLE-API] MATCH dans snippet! {snippet_sim*100:.1f}%")
-                    web_matches.append({
-                        'sentence': clean_sentence[:200],
-                        'similarity': round(snippet_sim * 100, 2),
-                        'url': url_page,
-                        'title': title,
-                        'snippet': snippet[:300]
-                    })
-                    continue
-                
-                # Fetch full page for deeper analysis
-                try:
-                    time.sleep(random.uniform(1, 2))
-                    headers = {'User-Agent': random.choice(USER_AGENTS)}
-                    page_resp = session.get(url_page, headers=headers, timeout=15)
-                    
-                    if page_resp.status_code != 200:
-                        continue
-                    
-                    page_text = clean_text(page_resp.text)
-                    page_sentences = sent_tokenize(page_text)
-                    
-                    max_sim = 0
-                    best_snippet = ""
-                    
-                    for page_sent in page_sentences[:200]:  # Check first 200 sentences
-                        if len(page_sent) < 20:
-                            continue
-                        
-                        clean_page_sent = clean_text(page_sent)
-                        
-                        # Calculate multiple similarity scores
-                        scores = [
-                            sequence_similarity(clean_sentence, clean_page_sent),
-                            tfidf_similarity(clean_sentence, clean_page_sent),
-                            ngram_similarity(clean_sentence, clean_page_sent, n=5)
-                        ]
-                        
-                        if embedding_model:
-                            scores.append(embedding_similarity(clean_sentence, clean_page_sent))
-                        
-                        avg_sim = sum(scores) / len(scores)
-                        
-                        if avg_sim > max_sim:
-                            max_sim = avg_sim
-                            best_snippet = page_sent[:300]
-                    
-                    print(f"📊 [PLAGIAT-GOOGLE-API] Similarité max: {max_sim*100:.1f}%")
-                    
-                    if max_sim >= threshold:
-                        print(f"🚨 [PLAGIAT-GOOGLE-API] MATCH! {max_sim*100:.1f}%")
-                        web_matches.append({
-                            'sentence': clean_sentence[:200],
-                            'similarity': round(max_sim * 100, 2),
-                            'url': url_page,
-                            'title': title,
-                            'snippet': best_snippet
-                        })
-                
-                except Exception as e:
-                    print(f"❌ [PLAGIAT-GOOGLE-API] Erreur page: {e}")
-                    continue
-        
-        except Exception as e:
-            print(f"❌ [PLAGIAT-GOOGLE-API] Erreur recherche: {e}")
-            continue
-    
-    print(f"🏁 [PLAGIAT-GOOGLE-API] Fin: {len(web_matches)} match(s)")
+
+            # Check snippet first for quick match
+            snippet_sim = sequence_similarity(clean_sentence, clean_text(snippet))
+            if snippet_sim >= threshold:
+                logger.info(f"[PLAGIAT-GOOGLE-API] Correspondance dans l'extrait : {url_page} ({snippet_sim*100:.1f}%)")
+                web_matches.append({
+                    'sentence': clean_sentence[:200],
+                    'similarity': round(snippet_sim * 100, 2),
+                    'url': url_page,
+                    'title': title,
+                    'snippet': snippet[:300]
+                })
+                continue
+
+            # Fetch full page for deeper analysis
+            to_fetch.append((clean_sentence, url_page, title))
+
+    web_matches += _score_pages(to_fetch, threshold, 'PLAGIAT-GOOGLE-API')
+    logger.info(f"[PLAGIAT-GOOGLE-API] Fin : {len(web_matches)} correspondance(s)")
     return web_matches
 
 
@@ -242,129 +280,35 @@ def check_web_plagiarism_bing(text, threshold=0.75):
     """
     Improved Bing scraping with better filtering and error handling
     """
-    print(f"🎯 [PLAGIAT-BING] Début analyse")
-    
-    clean_text_content = clean_text(text)
-    sentences = extract_key_sentences(clean_text_content, 3)
-    
-    web_matches = []
-    session = requests.Session()
-    retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504, 429])
-    session.mount('http://', HTTPAdapter(max_retries=retries))
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    
-    for i, sentence in enumerate(sentences):
-        clean_sentence = clean_text(sentence)
-        if len(clean_sentence) < 30:
-            continue
-
-        print(f"🔎 [PLAGIAT-BING] Recherche {i+1}/3: '{clean_sentence[:60]}...'")
-        
-        # Search with exact phrase
-        query = urllib.parse.quote(f'"{clean_sentence}"')
-        url = f"https://www.bing.com/search?q={query}&setlang=en"
-        
-        headers = {
-            'User-Agent': random.choice(USER_AGENTS),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://www.bing.com/'
-        }
-
-        try:
-            time.sleep(random.uniform(2, 4))
-            response = session.get(url, headers=headers, timeout=30)
-            
-            if response.status_code != 200:
-                print(f"❌ [PLAGIAT-BING] Erreur: {response.status_code}")
+    logger.debug("[PLAGIAT-BING] Début analyse")
+
+    sentences = _key_sentences(text)
+
+    # Search with exact phrase
+    pages = run_concurrently(lambda sentence: search_bing(f'"{sentence}"'), sentences)
+
+    # Filter out irrelevant results (Google, Wikipedia about search engines, etc.)
+    blacklist = ['google.com', 'wikipedia.org/wiki/Google', 'bing.com', 'yahoo.com']
+    to_fetch = []
+    for clean_sentence, html in zip(sentences, pages):
+        soup = BeautifulSoup(html, 'html.parser')
+        filtered_results = []
+        for result in soup.find_all('li', class_='b_algo')[:10]:
+            link_tag = result.find('h2').find('a') if result.find('h2') else None
+            if not link_tag:
                 continue
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = soup.find_all('li', class_='b_algo')
-            
-            # Filter out irrelevant results (Google, Wikipedia about search engines, etc.)
-            filtered_results = []
-            blacklist = ['google.com', 'wikipedia.org/wiki/Google', 'bing.com', 'yahoo.com']
-            
-            for result in results[:10]:
-                link_tag = result.find('h2').find('a') if result.find('h2') else None
-                if not link_tag:
-                    continue
-                
-                url_page = link_tag.get('href', '')
-                if any(blocked in url_page.lower() for blocked in blacklist):
-                    continue
-                
-                filtered_results.append(result)
-            
-            print(f"📈 [PLAGIAT-BING] Résultats valides: {len(filtered_results)}")
-            
-            if len(filtered_results) == 0:
-                print(f"⚠️ [PLAGIAT-BING] Aucun résultat pertinent pour cette phrase")
+            url_page = link_tag.get('href', '')
+            if not url_page or any(blocked in url_page.lower() for blocked in blacklist):
                 continue
-            
-            for result in filtered_results[:5]:
-                link_tag = result.find('h2').find('a')
-                url_page = link_tag.get('href')
-                title = link_tag.get_text().strip()
-                
-                print(f"🔗 [PLAGIAT-BING] Test: {title[:60]}...")
-
-                try:
-                    time.sleep(random.uniform(1, 2))
-                    page_resp = session.get(url_page, headers=headers, timeout=20)
-                    
-                    if page_resp.status_code != 200:
-                        continue
-
-                    page_text = clean_text(page_resp.text)
-                    page_sentences = sent_tokenize(page_text)
-                    
-                    max_sim = 0
-                    best_snippet = ""
-                    
-                    for page_sent in page_sentences[:200]:
-                        if len(page_sent) < 20:
-                            continue
-                        
-                        clean_page_sent = clean_text(page_sent)
-                        
-                        scores = [
-                            sequence_similarity(clean_sentence, clean_page_sent),
-                            tfidf_similarity(clean_sentence, clean_page_sent),
-                            ngram_similarity(clean_sentence, clean_page_sent, n=5)
-                        ]
-                        
-                        if embedding_model:
-                            scores.append(embedding_similarity(clean_sentence, clean_page_sent))
-                        
-                        avg_sim = sum(scores) / len(scores)
-                        
-                        if avg_sim > max_sim:
-                            max_sim = avg_sim
-                            best_snippet = page_sent[:300]
-
-                    print(f"📊 [PLAGIAT-BING] Similarité max: {max_sim*100:.1f}%")
-                    
-                    if max_sim >= threshold:
-                        print(f"🚨 [PLAGIAT-BING] MATCH! {max_sim*100:.1f}%")
-                        web_matches.append({
-                            'sentence': clean_sentence[:200],
-                            'similarity': round(max_sim * 100, 2),
-                            'url': url_page,
-                            'title': title,
-                            'snippet': best_snippet
-                        })
-                    
-                except Exception as e:
-                    print(f"❌ [PLAGIAT-BING] Erreur page: {e}")
-                    continue
-                    
-        except Exception as e:
-            print(f"❌ [PLAGIAT-BING] Erreur recherche: {e}")
-            continue
-
-    print(f"🏁 [PLAGIAT-BING] Fin: {len(web_matches)} match(s)")
+
+            filtered_results.append((clean_sentence, url_page, link_tag.get_text().strip()))
+
+        logger.debug(f"[PLAGIAT-BING] '{clean_sentence[:60]}...' : {len(filtered_results)} résultat(s) valide(s)")
+        to_fetch += filtered_results[:5]
+
+    web_matches = _score_pages(to_fetch, threshold, 'PLAGIAT-BING')
+    logger.info(f"[PLAGIAT-BING] Fin : {len(web_matches)} correspondance(s)")
     return web_matches
 
 
@@ -376,5 +320,5 @@ def check_web_plagiarism(text, threshold=0.75, use_google_api=True):
     if use_google_api and GOOGLE_API_KEY and GOOGLE_API_KEY != 'YOUR_API_KEY':
         return check_web_plagiarism_google_api(text, threshold)
     else:
-        print("⚠️ Google API non configurée, utilisation de Bing scraping...")
+        logger.info("Google API non configurée, utilisation de Bing scraping")
         return check_web_plagiarism_bing(text, threshold)
\ No newline at end of file
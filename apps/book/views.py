@@ -5,7 +5,7 @@ from django.http import HttpResponse, JsonResponse
 
 from apps.booksRecommendation.views import get_book_recommendations
 from apps.cart.models import UserLibrary
-from .models import Book
+from .models import Book, PlagiarismJob
 from .forms import BookForm
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -19,15 +19,20 @@ import requests
 from django.core.files.base import ContentFile
 from .utils import (
     sequence_similarity, tfidf_similarity, 
-    ngram_similarity, embedding_similarity, clean_text, check_web_plagiarism
+    ngram_similarity, embedding_similarity, clean_text, check_web_plagiarism,
+    compare_one_to_many, SCORE_COLUMNS
 )
 from django.utils.html import strip_tags
 import re
 import os
 from .utils import sequence_similarity, tfidf_similarity, embedding_similarity, ngram_similarity
+from .fingerprint import index_book
+from .reader import read_book_text
+from .plagiarism import enqueue_plagiarism_check, plagiarism_messages
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from apps.booksRecommendation.models import UserInteraction
+from apps.booksRecommendation.events import record_event
+from apps.booksRecommendation.models import InteractionEvent
 from django.db.models import Q
 
 
@@ -51,67 +56,6 @@ def book_list(request):
     return render(request, 'book/book_list.html', {'books': books})
 
 
-def read_book_text(book):
-        """Lit le texte propre (fichier .txt ou contenu HTML nettoyé)"""
-        # 1. Essayer le fichier .txt
-        if book.file:
-            try:
-                with open(book.file.path, 'r', encoding='utf-8') as f:
-                    return clean_text(f.read())
-            except:
-                pass
-
-        # 2. Sinon, fallback sur book.content (HTML)
-        return clean_text(book.content)
-
-def check_plagiarism_on_save(book, request):
-    test_text = read_book_text(book)
-    if len(test_text) < 100:
-        messages.info(request, "Contenu trop court pour analyse.")
-        return
-
-    # 1. Plagiat dans la DB
-    existing_books = Book.objects.exclude(id=book.id).filter(author=book.author)
-    db_max_sim = 0
-    similar_title = ""
-    high_db_plagiarism = False
-
-    for other in existing_books:
-        other_text = read_book_text(other)
-        if len(other_text) < 50:
-            continue
-        scores = [
-            sequence_similarity(test_text, other_text),
-            tfidf_similarity(test_text, other_text),
-            embedding_similarity(test_text, other_text),
-            ngram_similarity(test_text, other_text, n=5)
-        ]
-        avg = sum(scores) / len(scores)
-        if avg > db_max_sim:
-            db_max_sim = avg
-            similar_title = other.title
-        if avg > 0.75:
-            high_db_plagiarism = True
-            break  # On arrête dès qu'on a un plagiat fort
-
-    # 2. Plagiat sur le web
-    web_matches = []
-    try:
-        web_matches = check_web_plagiarism(test_text)
-    except Exception as e:
-        print(f"Erreur web: {e}")
-
-    # 3. UN SEUL MESSAGE FINAL
-    if high_db_plagiarism:
-        msg = f"Plagiat DB détecté avec « {similar_title} » ({round(db_max_sim*100,1)}%)"
-        if web_matches:
-            msg += f" | Web: {len(web_matches)} match(s)"
-        messages.warning(request, msg)
-    elif web_matches:
-        msg = f"Plagiat web détecté ({len(web_matches)} phrase(s)) | DB: {round(db_max_sim*100,1)}%"
-        messages.warning(request, msg)
-    else:
-        messages.success(request, f"Sauvegardé ! DB: {round(db_max_sim*100,1)}% | Web: OK")
 # Ajouter un livre
 @login_required
 def book_create(request):
@@ -147,7 +91,8 @@ def book_update(request, id):
     if request.method == 'POST':
         form = BookForm(request.POST, request.FILES, instance=book)  # Ajout de request.FILES
         if form.is_valid():
-            form.save()
+            book = form.save()
+            index_book(book)
             messages.success(request, "Livre modifié avec succès !")
             return redirect('book_list')
     else:
@@ -298,19 +243,15 @@ def plagiarism_test(request):
 
     test_book = books.last()
     test_text = read_book_text(test_book)
-    other_books = books.exclude(id=test_book.id)
+    other_books = list(books.exclude(id=test_book.id))
+    scores = compare_one_to_many(test_text, [read_book_text(book) for book in other_books])
     results = []
 
-    for book in other_books:
-        book_text = read_book_text(book)
-        results.append({
-            "book_id": book.id,
-            "book_title": book.title,
-            "sequence_similarity": round(sequence_similarity(test_text, book_text), 2),
-            "tfidf_similarity": round(tfidf_similarity(test_text, book_text), 2),
-            "embedding_similarity": round(embedding_similarity(test_text, book_text), 2),
-            "ngram_similarity": round(ngram_similarity(test_text, book_text), 2)
-        })
+    for book, row in zip(other_books, scores):
+        result = {"book_id": book.id, "book_title": book.title}
+        for column, value in zip(SCORE_COLUMNS, row):
+            result[f"{column}_similarity"] = round(float(value), 2)
+        results.append(result)
 
     return JsonResponse({
         "test_book": {"id": test_book.id, "title": test_book.title},
@@ -318,20 +259,23 @@ def plagiarism_test(request):
     })
 
 
-def read_book_content(file_field):
-    
-    if not file_field:
-        return "Aucun fichier disponible."
+# Suivi d'une analyse de plagiat (appelé en polling par l'éditeur)
+@login_required
+@require_http_methods(["GET"])
+def plagiarism_job_status(request, job_id):
+    job = get_object_or_404(PlagiarismJob.objects.select_related('book'), id=job_id)
+    book = job.book
+    if not request.user.is_staff and request.user != book.author and request.user not in book.collaborators.all():
+        return JsonResponse({'error': 'Accès refusé'}, status=403)
 
-    file_path = file_field.path
-    if not os.path.exists(file_path):
-        return "Fichier introuvable."
+    data = {'id': job.id, 'status': job.status}
+    if job.status == 'done':
+        data['messages'] = plagiarism_messages(job.result)
+        data['passages'] = job.result.get('passages', [])
+    elif job.status == 'failed':
+        data['messages'] = [{'text': "L'analyse de plagiat a échoué.", 'tags': 'warning'}]
+    return JsonResponse(data)
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except Exception as e:
-        return f"Erreur lors de la lecture du fichier : {e}"
 
 # Éditeur de texte pour le livre
 # views.py → book_editor
@@ -359,65 +303,26 @@ def book_editor(request, id):
             book.file.save(filename, ContentFile(content.encode('utf-8')), save=False)
         book.save()
 
-        # Vérification plagiat
-        check_plagiarism_on_save(book, request)
+        # Vérification plagiat (asynchrone)
+        job = check_plagiarism_on_save(book, request, incremental=True)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             storage = messages.get_messages(request)
             message_list = [{'text': str(m), 'tags': m.tags} for m in storage]
-            return JsonResponse({'success': True, 'messages': message_list})
+            return JsonResponse({'success': True, 'messages': message_list, 'plagiarism_job': job.id})
 
         return redirect('book_list')
 
     return render(request, 'book/book_editor.html', {'book': book})
 
 
-def check_plagiarism_on_save(book, request):
-    test_text = read_book_text(book)
-    if len(test_text) < 100:
-        messages.info(request, "Contenu trop court pour analyse.")
-        return
-
-    # 1. Plagiat dans la DB
-    existing_books = Book.objects.exclude(id=book.id).filter(author=book.author)
-    db_max_sim = 0
-    similar_title = ""
-
-    for other in existing_books:
-        other_text = read_book_text(other)
-        if len(other_text) < 50:
-            continue
-        scores = [
-            sequence_similarity(test_text, other_text),
-            tfidf_similarity(test_text, other_text),
-            embedding_similarity(test_text, other_text),
-            ngram_similarity(test_text, other_text, n=5)
-        ]
-        avg = sum(scores) / len(scores)
-        if avg > db_max_sim:
-            db_max_sim = avg
-            similar_title = other.title
-
-    # 2. Plagiat sur le web
-    web_matches = []
-    try:
-        web_matches = check_web_plagiarism(test_text)
-    except:
-        pass  # En cas d'erreur réseau
-
-    # 3. Messages
-    if db_max_sim > 0.75:
-        messages.warning(request, f"Plagiat DB détecté avec « {similar_title} » ({round(db_max_sim*100,1)}%)")
-    elif db_max_sim > 0.5:
-        messages.info(request, f"Similarité DB : {round(db_max_sim*100,1)}% avec « {similar_title} »")
-
-    if web_matches:
-        for match in web_matches[:2]:  # Max 2 alertes
-            messages.warning(request, f"Plagiat web détecté : « {match['sentence'][:60]}... » → {match['url']} ({match['similarity']}%)")
-    else:
-        messages.success(request, f"Sauvegardé ! DB: {round(db_max_sim*100,1)}% | Web: OK")
-    
-    return render(request, 'book/book_editor.html', {'book': book})
+def check_plagiarism_on_save(book, request, incremental=False):
+    """Met l'analyse de plagiat en file d'attente : le worker écrit le résultat"""
+    job = enqueue_plagiarism_check(book, request.user, incremental=incremental)
+    messages.info(request, "Analyse de plagiat lancée en arrière-plan.")
+    return job
+
+
 @login_required
 def getAllFinishedBooks(request):
     finished_books = Book.objects.filter(status__in=['termine', 'archive'])
@@ -438,9 +343,7 @@ def getAllFinishedBooks(request):
 def add_to_favorites(request, book_id):
     book = get_object_or_404(Book, id=book_id)
     book.favorites.add(request.user)
-    interaction, _ = UserInteraction.objects.get_or_create(user=request.user, book=book)
-    interaction.favorited = True
-    interaction.save()
+    record_event(request.user.id, book.id, InteractionEvent.FAVORITE)
     return JsonResponse({"success": True})
 @login_required
 @require_http_methods(["GET"])
@@ -464,6 +367,7 @@ def view_favorites(request):
 def remove_from_favorites(request, book_id):
     book = get_object_or_404(Book, id=book_id)
     book.favorites.remove(request.user)
+    record_event(request.user.id, book.id, InteractionEvent.UNFAVORITE)
     return JsonResponse({"success": True})
 @login_required
 @require_http_methods(["GET"])
@@ -473,6 +377,8 @@ def check_is_favorite(request, book_id):
     return JsonResponse({"is_favorite": is_favorite})
 def book_detail(request, book_id):
     book = get_object_or_404(Book, id=book_id)
+    if request.user.is_authenticated:
+        record_event(request.user.id, book.id, InteractionEvent.VIEW)
     recommended_books = get_book_recommendations(book_id, top_n=5)
     
     return render(request, 'book/book_detail.html', {
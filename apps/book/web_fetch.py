@@ -0,0 +1,172 @@
+"""
+Récupération HTTP pour la détection de plagiat web.
+
+- une session partagée avec pool de connexions et relances automatiques ;
+- une limite de débit par hôte (remplace les time.sleep fixes) ;
+- un cache disque (alias de cache `plagiarism`) des réponses de recherche et
+  du texte des pages, avec TTL : une phrase déjà vérifiée ne refait aucun appel ;
+- une exécution concurrente bornée par un pool de threads.
+
+Les URL des moteurs de recherche sont configurables pour pouvoir pointer vers
+un serveur de test local.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from decouple import config
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_SEARCH_URL = config('GOOGLE_SEARCH_URL', default='https://www.googleapis.com/customsearch/v1')
+BING_SEARCH_URL = config('BING_SEARCH_URL', default='https://www.bing.com/search')
+MAX_WORKERS = config('WEB_FETCH_WORKERS', default=8, cast=int)
+HOST_INTERVAL = config('WEB_FETCH_HOST_INTERVAL', default=1.0, cast=float)  # secondes entre 2 appels au même hôte
+SEARCH_TIMEOUT = 10
+PAGE_TIMEOUT = 15
+MAX_PAGE_CHARS = 500000
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
+]
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Session HTTP partagée par tous les threads (pool de connexions keep-alive)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504, 429])
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=retries)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+class HostRateLimiter:
+    """Impose un intervalle minimal entre deux requêtes vers le même hôte"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+rate_limiter = HostRateLimiter(HOST_INTERVAL)
+
+
+def _cache():
+    return caches['plagiarism']
+
+
+def _key(prefix, value):
+    return f"{prefix}:{hashlib.sha1(value.encode('utf-8')).hexdigest()}"
+
+
+def _browser_headers():
+    return {
+        'User-Agent': random.choice(USER_AGENTS),
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+    }
+
+
+def search_google(query, api_key, cse_id, num=5):
+    """Résultats (items) de Google Custom Search pour une requête, mis en cache"""
+    key = _key('google', f"{cse_id}|{num}|{query}")
+    items = _cache().get(key)
+    if items is not None:
+        return items
+
+    rate_limiter.wait(GOOGLE_SEARCH_URL)
+    params = {'key': api_key, 'cx': cse_id, 'q': query, 'num': num}
+    try:
+        response = get_session().get(GOOGLE_SEARCH_URL, params=params, timeout=SEARCH_TIMEOUT)
+    except requests.RequestException as e:
+        logger.warning(f"Recherche Google impossible : {e}")
+        return []
+    if response.status_code != 200:
+        logger.warning(f"Recherche Google en erreur : {response.status_code}")
+        return []
+
+    items = response.json().get('items', [])
+    _cache().set(key, items)
+    return items
+
+
+def search_bing(query):
+    """HTML de la page de résultats Bing pour une requête, mis en cache"""
+    key = _key('bing', query)
+    html = _cache().get(key)
+    if html is not None:
+        return html
+
+    rate_limiter.wait(BING_SEARCH_URL)
+    headers = dict(_browser_headers(), Referer='https://www.bing.com/')
+    try:
+        response = get_session().get(
+            BING_SEARCH_URL, params={'q': query, 'setlang': 'en'}, headers=headers, timeout=SEARCH_TIMEOUT
+        )
+    except requests.RequestException as e:
+        logger.warning(f"Recherche Bing impossible : {e}")
+        return ''
+    if response.status_code != 200:
+        logger.warning(f"Recherche Bing en erreur : {response.status_code}")
+        return ''
+
+    _cache().set(key, response.text)
+    return response.text
+
+
+def fetch_page_text(url, clean):
+    """Texte nettoyé d'une page (cache par URL) ; '' si la page est inaccessible"""
+    key = _key('page', url)
+    text = _cache().get(key)
+    if text is not None:
+        return text
+
+    try:
+        rate_limiter.wait(url)
+        response = get_session().get(url, headers=_browser_headers(), timeout=PAGE_TIMEOUT)
+    except requests.RequestException as e:
+        logger.info(f"Page inaccessible {url}: {e}")
+        return ''
+    if response.status_code != 200:
+        return ''
+
+    text = clean(response.text[:MAX_PAGE_CHARS])
+    _cache().set(key, text)
+    return text
+
+
+def run_concurrently(func, items, max_workers=MAX_WORKERS):
+    """Applique func à chaque élément en parallèle (ordre conservé)"""
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(func, items))
@@ -0,0 +1,53 @@
+"""
+Recommandations par genre : affinités précalculées (UserGenreAffinity, tenues
+à jour par rollup_interactions) et requête de candidats classée.
+
+Le nombre de requêtes ne dépend pas de l'historique de l'utilisateur : une
+lecture de ses scores, puis une requête paginée (comptage + page) où le
+classement est calculé par la base (CASE sur le genre, puis popularité).
+"""
+from django.core.paginator import Paginator
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Value, When
+from django.db.models.functions import Coalesce
+
+from apps.book.models import Book
+from .interactions import WEIGHTS
+from .models import UserGenreAffinity, UserInteraction
+
+PAGE_SIZE = 10
+
+
+def genre_scores(user_id):
+    """{genre: score} de l'utilisateur ; vide s'il n'a encore aucune interaction agrégée"""
+    return UserGenreAffinity.objects.filter(user_id=user_id).values_list('scores', flat=True).first() or {}
+
+
+def ranked_candidates(user_id, scores):
+    """Livres des genres appréciés que l'utilisateur n'a pas encore vus, du plus au moins pertinent"""
+    if not scores:
+        return Book.objects.none()
+    affinity = Case(
+        *[When(genre=genre, then=Value(float(score))) for genre, score in scores.items()],
+        default=Value(0.0), output_field=FloatField(),
+    )
+    popularity = Coalesce(
+        F('popularity__views') * WEIGHTS['viewed']
+        + F('popularity__carts') * WEIGHTS['added_to_cart']
+        + F('popularity__favorites') * WEIGHTS['favorited'],
+        0,
+    )
+    seen = UserInteraction.objects.filter(user_id=user_id, book_id=OuterRef('pk'))
+    return (
+        Book.objects.filter(genre__in=list(scores))
+        .filter(~Exists(seen))
+        .defer('content')   # texte intégral inutile pour une liste
+        .annotate(affinity=affinity, popularity_score=popularity)
+        .order_by('-affinity', '-popularity_score', '-id')
+    )
+
+
+def recommended_page(user_id, page=1, per_page=PAGE_SIZE):
+    """Page de recommandations par genre et genres préférés, en un nombre fixe de requêtes"""
+    scores = genre_scores(user_id)
+    favorite_genres = sorted(scores, key=scores.get, reverse=True)
+    return Paginator(ranked_candidates(user_id, scores), per_page).get_page(page), favorite_genres
@@ -0,0 +1,300 @@
+"""
+Index de plus proches voisins (similarité cosinus) pour les livres et les utilisateurs.
+
+Deux implémentations interchangeables (RECOMMENDER_ANN_BACKEND) :
+- `exact`  : produit scalaire avec tous les vecteurs ;
+- `ivf`    : fichier inversé. Les vecteurs sont répartis entre des centroïdes
+  (k-means sphérique) et une recherche ne parcourt que les `nprobe` listes
+  les plus proches. Tant que l'index est trop petit pour être entraîné, la
+  recherche est exacte.
+
+Index utilisés :
+- `books` : moyenne des embeddings de chaque livre (apps.book.embeddings) ;
+- `users` : facteurs ALS normalisés, publiés à chaque entraînement.
+
+Un nouvel encodage ou une suppression ne fait qu'inscrire l'identifiant dans
+la file AnnUpdate ; la commande `update_ann_index` applique la file par lots
+(l'index est relu et réécrit une fois par lot). Le k-means n'est relancé que
+par cette commande ou par `rebuild_ann_index`, jamais dans une requête.
+"""
+import os
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from apps.book.embeddings import book_vectors
+from .models import AnnUpdate
+from .storage import CachedFile, atomic_path, data_path, file_lock
+
+MIN_TRAIN_SIZE = 2048   # en dessous : recherche exacte
+NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 256     # points échantillonnés par centroïde pour l'entraînement
+RETRAIN_GROWTH = 4      # réentraîne quand l'index a été multiplié par ce facteur
+INDEXES = ('books', 'users')
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _top(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class ExactIndex:
+    """Recherche exhaustive : référence pour mesurer le rappel des autres index"""
+
+    backend = 'exact'
+
+    def __init__(self, dim=0):
+        self.dim = dim
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, vectors):
+        """Ajoute ou remplace les vecteurs (normalisés) des identifiants donnés"""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize(vectors)
+        if len(self) == 0:
+            self.dim = vectors.shape[1]
+        self.remove(ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.vectors = np.vstack([self.vectors.reshape(-1, self.dim), vectors])
+        return len(self) - len(ids)   # position du premier ajout
+
+    def remove(self, ids):
+        keep = ~np.isin(self.ids, ids)
+        if not keep.all():
+            self._keep(keep)
+
+    def needs_training(self):
+        return False
+
+    def _keep(self, keep):
+        self.ids, self.vectors = self.ids[keep], self.vectors[keep]
+
+    def candidates(self, query):
+        return slice(None)
+
+    def search(self, query, k=10, exclude=()):
+        """(ids, scores) des k vecteurs les plus proches de `query`"""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize(query)[0]
+        rows = np.arange(len(self))[self.candidates(query)]
+        if len(exclude):
+            rows = rows[~np.isin(self.ids[rows], exclude)]
+        scores = self.vectors[rows] @ query
+        top = _top(scores, k)
+        return self.ids[rows[top]], scores[top]
+
+    def arrays(self):
+        return {'ids': self.ids, 'vectors': self.vectors}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls(arrays['vectors'].shape[1])
+        index.ids, index.vectors = arrays['ids'], arrays['vectors']
+        return index
+
+
+class IVFIndex(ExactIndex):
+    """Fichier inversé sur centroïdes k-means ; exact tant qu'il n'est pas entraîné"""
+
+    backend = 'ivf'
+
+    def __init__(self, dim=0, nprobe=NPROBE):
+        super().__init__(dim)
+        self.nprobe = nprobe
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+
+    def add(self, ids, vectors):
+        """Ajoute les vecteurs à la liste de leur centroïde ; n'entraîne jamais (voir needs_training)"""
+        first = super().add(ids, vectors)
+        added = self.vectors[first:]
+        if self.centroids is None:
+            self.assignments = np.zeros(len(self), dtype=np.int32)
+        else:
+            self.assignments = np.concatenate([self.assignments, self._assign(added)])
+        return first
+
+    def needs_training(self):
+        if self.centroids is None:
+            return len(self) >= MIN_TRAIN_SIZE
+        return len(self) >= RETRAIN_GROWTH * self.trained_size
+
+    def _keep(self, keep):
+        super()._keep(keep)
+        self.assignments = self.assignments[keep]
+
+    def _assign(self, vectors, centroids=None):
+        centroids = self.centroids if centroids is None else centroids
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 8192):   # borne la matrice de scores temporaire
+            block = vectors[start:start + 8192]
+            assignments[start:start + 8192] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def train(self, n_lists=None, seed=0):
+        """k-means sphérique sur un échantillon, puis réaffectation de tous les vecteurs"""
+        if len(self) < MIN_TRAIN_SIZE:
+            self.centroids = None
+            self.assignments = np.zeros(len(self), dtype=np.int32)
+            return
+        rng = np.random.default_rng(seed)
+        n_lists = n_lists or int(np.clip(np.sqrt(len(self)), 1, 4096))
+        sample_size = min(len(self), n_lists * KMEANS_SAMPLE)
+        sample = self.vectors[rng.choice(len(self), size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            sums[empty] = sample[rng.choice(sample_size, size=empty.sum())]   # réensemencement
+            centroids = normalize(sums)
+        self.centroids = centroids
+        self.assignments = self._assign(self.vectors)
+        self.trained_size = len(self)
+
+    def candidates(self, query):
+        if self.centroids is None:
+            return slice(None)
+        probe = _top(self.centroids @ query, self.nprobe)
+        return np.isin(self.assignments, probe)
+
+    def arrays(self):
+        arrays = super().arrays()
+        arrays.update(assignments=self.assignments, trained_size=self.trained_size, nprobe=self.nprobe)
+        if self.centroids is not None:
+            arrays['centroids'] = self.centroids
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = super().from_arrays(arrays)
+        index.assignments = arrays['assignments']
+        index.trained_size = int(arrays['trained_size'])
+        index.nprobe = int(arrays['nprobe'])
+        index.centroids = arrays['centroids'] if 'centroids' in arrays else None
+        return index
+
+
+BACKENDS = {ExactIndex.backend: ExactIndex, IVFIndex.backend: IVFIndex}
+
+
+def _file_name(name):
+    return f"ann-{name}.npz"
+
+
+def _load(path):
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    return BACKENDS[str(arrays.pop('backend'))].from_arrays(arrays)
+
+
+_cached = {}
+
+
+def get_index(name):
+    """Index `name` tel que publié (rechargé quand le fichier change), ou None"""
+    if name not in _cached:
+        _cached[name] = CachedFile(_file_name(name), _load)
+    return _cached[name].get()
+
+
+def new_index():
+    return BACKENDS[settings.RECOMMENDER_ANN_BACKEND]()
+
+
+def save_index(name, index):
+    with atomic_path(_file_name(name)) as path:
+        np.savez(path, backend=index.backend, **index.arrays())
+
+
+def build_index(name, ids, vectors, read_at=None):
+    """
+    Remplace entièrement l'index `name`. Les inscriptions de la file
+    antérieures à `read_at` (lecture des vecteurs) sont déjà prises en compte.
+    """
+    index = new_index()
+    if len(ids):
+        index.add(ids, vectors)
+        if index.needs_training():   # l'IVF s'entraîne dès MIN_TRAIN_SIZE vecteurs
+            index.train()
+    with file_lock(_file_name(name)):
+        save_index(name, index)
+        if read_at is not None:
+            AnnUpdate.objects.filter(index=name, queued_at__lt=read_at).delete()
+    return index
+
+
+def queue_update(name, ids, deleted=False):
+    """Inscrit des identifiants dans la file de l'index `name` (une requête, upsert)"""
+    AnnUpdate.objects.bulk_create(
+        [AnnUpdate(index=name, item_id=item_id, deleted=deleted) for item_id in ids],
+        update_conflicts=True, unique_fields=['index', 'item_id'], update_fields=['deleted', 'queued_at'],
+    )
+
+
+def apply_pending(batch_size=1000):
+    """
+    Applique un lot de la file AnnUpdate à chaque index. L'index est relu depuis
+    le fichier (copie privée : l'objet partagé de get_index n'est jamais
+    modifié), mis à jour, réentraîné si besoin puis réécrit une fois. Les
+    vecteurs des livres sont relus depuis leurs embeddings ; un livre sans
+    embedding est retiré. Retourne le nombre d'inscriptions traitées.
+    """
+    total = 0
+    for name in INDEXES:
+        with file_lock(_file_name(name)):
+            pending = list(AnnUpdate.objects.filter(index=name).order_by('queued_at')[:batch_size])
+            if not pending:
+                continue
+            path = data_path(_file_name(name))
+            index = _load(path) if os.path.exists(path) else new_index()
+            removed = [update.item_id for update in pending if update.deleted]
+            ids, vectors = [], None
+            if name == 'books':
+                wanted = [update.item_id for update in pending if not update.deleted]
+                ids, vectors = book_vectors(wanted)
+                removed += sorted(set(wanted) - set(ids))   # livre supprimé ou sans texte entre-temps
+            index.remove(removed)
+            if len(ids):
+                index.add(ids, vectors)
+            if index.needs_training():
+                index.train()
+            save_index(name, index)
+            # Un identifiant réinscrit pendant le lot (queued_at plus récent) reste dans la file
+            done = Q()
+            for update in pending:
+                done |= Q(item_id=update.item_id, queued_at=update.queued_at)
+            AnnUpdate.objects.filter(done, index=name).delete()
+        total += len(pending)
+    return total
+
+
+def similar_book_ids(book_id, top_n=5):
+    """Livres dont l'embedding est le plus proche de celui de book_id (index `books`)"""
+    index = get_index('books')
+    if index is None:
+        return []
+    position = np.flatnonzero(index.ids == book_id)
+    if len(position) == 0:
+        return []
+    ids, _ = index.search(index.vectors[position[0]], k=top_n, exclude=[book_id])
+    return ids.tolist()
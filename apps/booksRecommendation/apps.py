@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class BooksRecommendationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.booksRecommendation'  # <-- correspond à INSTALLED_APPS
+
+    def ready(self):
+        import apps.booksRecommendation.signals
@@ -0,0 +1,119 @@
+"""
+Recommandations « utilisateurs proches » (filtrage collaboratif k-NN).
+
+Le modèle NearestNeighbors est entraîné hors requête par la commande
+`train_user_recommender` (planifiée) et persisté avec la matrice d'entraînement.
+Une requête ne fait que charger le modèle (une fois par processus, rechargé
+quand le fichier change), lire les interactions de l'utilisateur et
+interroger ses voisins. Quand l'index ANN `users` (facteurs ALS) contient
+l'utilisateur, les voisins y sont cherchés au lieu d'un parcours exhaustif.
+"""
+import logging
+import pickle
+
+import numpy as np
+from scipy import sparse
+from sklearn.neighbors import NearestNeighbors
+
+from apps.book.models import Book
+from . import ann
+from .interactions import compact, interaction_weight, rebuild_matrix, WEIGHTS
+from .models import UserInteraction
+from .storage import CachedFile, save_pickle
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'user_knn.pkl'
+N_NEIGHBORS = 20
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+_model = CachedFile(MODEL_NAME, _load_pickle)
+
+
+def train_user_model(rebuild=False):
+    """Compacte (ou reconstruit) la matrice d'interactions puis entraîne et sauvegarde le modèle"""
+    interactions = rebuild_matrix() if rebuild else compact()
+    if interactions.matrix.shape[0] == 0:
+        return None
+    model = NearestNeighbors(metric='cosine', algorithm='brute')
+    model.fit(interactions.matrix)
+    save_pickle(MODEL_NAME, {
+        'model': model,
+        'user_ids': interactions.user_ids,
+        'book_ids': interactions.book_ids,
+        'matrix': interactions.matrix,
+    })
+    return interactions
+
+
+def user_vector(user_id, book_ids):
+    """Interactions actuelles de l'utilisateur (en base), projetées sur les livres du modèle"""
+    favorites = set(Book.favorites.through.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    weights = {book_id: WEIGHTS['favorited'] for book_id in favorites}
+    for book_id, viewed, added_to_cart, favorited in UserInteraction.objects.filter(user_id=user_id).values_list(
+        'book_id', 'viewed', 'added_to_cart', 'favorited'
+    ):
+        weights[book_id] = interaction_weight(viewed, added_to_cart, favorited or book_id in favorites)
+
+    seen = np.array(list(weights), dtype=np.int64)
+    values = np.array(list(weights.values()), dtype=np.float32)
+    columns = np.searchsorted(book_ids, seen)
+    known = (columns < len(book_ids)) & (book_ids[np.minimum(columns, len(book_ids) - 1)] == seen)
+    vector = sparse.csr_matrix(
+        (values[known], (np.zeros(known.sum(), dtype=np.int64), columns[known])),
+        shape=(1, len(book_ids)),
+    )
+    return vector, columns[known]
+
+
+def neighbor_scores(matrix, neighbors, similarity):
+    """Score de chaque livre : somme des poids des voisins pondérée par leur similarité"""
+    return np.asarray(matrix[neighbors].T @ similarity).ravel()
+
+
+def _ann_neighbors(user_id, user_ids, n_neighbors):
+    """Lignes du modèle des voisins trouvés dans l'index `users`, ou (None, None)"""
+    index = ann.get_index('users')
+    if index is None:
+        return None, None
+    position = np.flatnonzero(index.ids == user_id)
+    if len(position) == 0:
+        return None, None
+    ids, scores = index.search(index.vectors[position[0]], k=n_neighbors, exclude=[user_id])
+    rows = np.searchsorted(user_ids, ids)
+    known = (rows < len(user_ids)) & (user_ids[np.minimum(rows, len(user_ids) - 1)] == ids) & (scores > 0)
+    return rows[known], scores[known]
+
+
+def recommend_for_user(user_id, top_n=5, n_neighbors=N_NEIGHBORS):
+    bundle = _model.get()
+    if bundle is None:
+        logger.info("Modèle k-NN absent : lancer train_user_recommender")
+        return []
+    user_ids, book_ids = bundle['user_ids'], bundle['book_ids']
+    if len(book_ids) == 0:
+        return []
+
+    vector, seen = user_vector(user_id, book_ids)
+    if vector.nnz == 0:
+        return []
+
+    neighbors, similarity = _ann_neighbors(user_id, user_ids, n_neighbors)
+    if neighbors is None:
+        n = min(n_neighbors + 1, len(user_ids))
+        distances, indices = bundle['model'].kneighbors(vector, n_neighbors=n)
+        others = user_ids[indices[0]] != user_id
+        neighbors = indices[0][others][:n_neighbors]
+        similarity = 1 - distances[0][others][:n_neighbors]
+
+    scores = neighbor_scores(bundle['matrix'], neighbors, similarity)
+    scores[seen] = 0
+    top = [i for i in np.argsort(-scores, kind='stable')[:top_n] if scores[i] > 0]
+    ids = [int(book_ids[i]) for i in top]
+    books = Book.objects.in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books]
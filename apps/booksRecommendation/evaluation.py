@@ -0,0 +1,274 @@
+"""
+Évaluation hors ligne des moteurs de recommandation (commande evaluate_recommenders).
+
+Les interactions (base de données ou jeu synthétique) sont coupées dans le
+temps : tout ce qui précède le quantile `1 - test_fraction` des dates sert à
+l'entraînement, les livres découverts ensuite par un utilisateur forment sa
+vérité terrain. Chaque moteur est entraîné sur la partie ancienne puis
+interrogé utilisateur par utilisateur (les livres déjà vus sont exclus).
+
+Mesures : précision@k, rappel@k, couverture du catalogue, temps
+d'entraînement, latence par requête (moyenne, p95), pic mémoire (tracemalloc).
+"""
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+from sklearn.neighbors import NearestNeighbors
+
+from apps.book.models import Book
+from .collaborative import N_NEIGHBORS, neighbor_scores
+from .interactions import WEIGHTS, interaction_weight
+from .models import UserInteraction
+from .similarity import SimilarityStore
+from .train_recommender import ALPHA, FACTORS, ITERATIONS, REGULARIZATION, fit_als
+
+
+class Dataset:
+    """Interactions horodatées (indices compacts) et description des livres"""
+
+    def __init__(self, users, books, weights, times, n_users, book_genres, content=None):
+        self.users = users              # indice utilisateur de chaque interaction
+        self.books = books              # indice livre de chaque interaction
+        self.weights = weights
+        self.times = times              # secondes
+        self.n_users = n_users
+        self.book_genres = book_genres  # indice de genre de chaque livre
+        self.content = content          # csr (livres x termes) normalisé, ou None
+
+    @property
+    def n_books(self):
+        return len(self.book_genres)
+
+    def split(self, test_fraction=0.2):
+        """(matrice d'entraînement csr, {utilisateur: livres à retrouver})"""
+        cutoff = np.quantile(self.times, 1 - test_fraction)
+        past = self.times < cutoff
+        train = sparse.coo_matrix(
+            (self.weights[past], (self.users[past], self.books[past])),
+            shape=(self.n_users, self.n_books), dtype=np.float32,
+        ).tocsr()
+        train.data = np.minimum(train.data, sum(WEIGHTS.values()))   # doublons : poids cumulés bornés
+
+        truth = {}
+        for user, book in zip(self.users[~past], self.books[~past]):
+            truth.setdefault(int(user), set()).add(int(book))
+        seen_users = np.diff(train.indptr) > 0
+        truth = {
+            user: books - set(train.indices[train.indptr[user]:train.indptr[user + 1]])
+            for user, books in truth.items() if seen_users[user]
+        }
+        return train, {user: books for user, books in truth.items() if books}
+
+
+def synthetic_dataset(rng, n_users=2000, n_books=5000, n_genres=15, per_user=30, n_clusters=20, days=60):
+    """
+    Jeu synthétique : chaque utilisateur appartient à un groupe de goûts ;
+    70 % de ses interactions portent sur les livres de son groupe, le reste sur
+    tout le catalogue, toujours selon une popularité de Zipf. Les genres et le
+    texte des livres sont corrélés à leur groupe.
+    """
+    book_clusters = rng.integers(n_clusters, size=n_books)
+    cluster_genres = rng.integers(n_genres, size=n_clusters)
+    book_genres = np.where(rng.random(n_books) < 0.7, cluster_genres[book_clusters], rng.integers(n_genres, size=n_books))
+    popularity = 1 / rng.permutation(np.arange(1, n_books + 1)) ** 0.8
+    members = [np.flatnonzero(book_clusters == c) for c in range(n_clusters)]
+    member_p = [popularity[m] / popularity[m].sum() for m in members]
+    global_p = popularity / popularity.sum()
+
+    user_clusters = rng.integers(n_clusters, size=n_users)
+    counts = np.maximum(1, rng.poisson(per_user, size=n_users))
+    users = np.repeat(np.arange(n_users), counts)
+    books = np.empty(len(users), dtype=np.int64)
+    position = 0
+    for user, count in enumerate(counts):
+        cluster = user_clusters[user]
+        local = rng.random(count) < 0.7
+        n_local = int(local.sum())
+        if len(members[cluster]):
+            books[position:position + n_local] = rng.choice(members[cluster], size=n_local, p=member_p[cluster])
+        else:
+            books[position:position + n_local] = rng.choice(n_books, size=n_local, p=global_p)
+        books[position + n_local:position + count] = rng.choice(n_books, size=count - n_local, p=global_p)
+        position += count
+    weights = rng.choice([WEIGHTS['viewed'], WEIGHTS['added_to_cart'], WEIGHTS['favorited']],
+                         size=len(users), p=[0.7, 0.2, 0.1]).astype(np.float32)
+    times = rng.uniform(0, days * 86400, size=len(users))
+
+    # Texte : 40 termes du genre, 40 du groupe, 20 au hasard
+    vocabulary = 500
+    genre_terms = book_genres[:, None] * vocabulary + rng.integers(vocabulary, size=(n_books, 40))
+    cluster_terms = (n_genres + book_clusters[:, None]) * vocabulary + rng.integers(vocabulary, size=(n_books, 40))
+    noise_terms = rng.integers((n_genres + n_clusters) * vocabulary, size=(n_books, 20))
+    columns = np.hstack([genre_terms, cluster_terms, noise_terms])
+    content = sparse.csr_matrix(
+        (rng.random(columns.size, dtype=np.float32), columns.ravel(), np.arange(0, columns.size + 1, columns.shape[1])),
+        shape=(n_books, (n_genres + n_clusters) * vocabulary),
+    )
+    content.sum_duplicates()
+    content = sparse.csr_matrix(content.multiply(1 / np.sqrt(content.multiply(content).sum(axis=1))))
+    return Dataset(users, books, weights, times, n_users, book_genres, content.astype(np.float32))
+
+
+def database_dataset():
+    """Interactions enregistrées (UserInteraction, datée de la première interaction) et favoris"""
+    catalog = list(Book.objects.order_by('id').values_list('id', 'genre'))
+    book_ids = [book_id for book_id, _ in catalog]
+    genres = [genre for _, genre in catalog]
+    book_index = {book_id: i for i, book_id in enumerate(book_ids)}
+    genre_index = {genre: i for i, genre in enumerate(sorted(set(genres)))}
+
+    favorites = set(Book.favorites.through.objects.values_list('user_id', 'book_id').iterator(chunk_size=5000))
+    rows = []
+    for user_id, book_id, viewed, added_to_cart, favorited, timestamp in UserInteraction.objects.values_list(
+        'user_id', 'book_id', 'viewed', 'added_to_cart', 'favorited', 'timestamp'
+    ).iterator(chunk_size=5000):
+        favorited = favorited or (user_id, book_id) in favorites
+        favorites.discard((user_id, book_id))
+        rows.append((user_id, book_id, interaction_weight(viewed, added_to_cart, favorited), timestamp.timestamp()))
+    start = min((row[3] for row in rows), default=0)
+    rows.extend((user_id, book_id, WEIGHTS['favorited'], start) for user_id, book_id in favorites)  # non datés
+
+    user_ids = sorted({row[0] for row in rows})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    rows = [row for row in rows if row[1] in book_index]
+    users = np.array([user_index[row[0]] for row in rows], dtype=np.int64)
+    books = np.array([book_index[row[1]] for row in rows], dtype=np.int64)
+    weights = np.array([row[2] for row in rows], dtype=np.float32)
+    times = np.array([row[3] for row in rows], dtype=np.float64)
+    book_genres = np.array([genre_index[genre] for genre in genres], dtype=np.int64)
+
+    content = None
+    store = SimilarityStore.load()
+    if store is not None:
+        positions = np.array([book_index.get(int(book_id), -1) for book_id in store.ids])
+        known = positions >= 0
+        mapping = sparse.csr_matrix(
+            (np.ones(known.sum(), dtype=np.float32), (positions[known], np.flatnonzero(known))),
+            shape=(len(book_ids), len(store.ids)),
+        )
+        content = (mapping @ store.matrix).tocsr()
+    return Dataset(users, books, weights, times, len(user_ids), book_genres, content)
+
+
+class Engine:
+    name = ''
+
+    def fit(self, train, dataset):
+        self.train = train
+
+    def scores(self, user):
+        raise NotImplementedError
+
+
+class ContentEngine(Engine):
+    """TF-IDF : profil = somme pondérée des vecteurs des livres vus"""
+    name = 'content'
+
+    def fit(self, train, dataset):
+        super().fit(train, dataset)
+        self.content = dataset.content
+        self.by_term = dataset.content.T.tocsr()
+
+    def scores(self, user):
+        profile = self.train[user] @ self.content
+        return np.asarray((self.by_term[profile.indices].T @ profile.data)).ravel()
+
+
+class KNNEngine(Engine):
+    """Utilisateurs proches (cosinus, recherche exhaustive), comme collaborative.py"""
+    name = 'knn'
+
+    def fit(self, train, dataset):
+        super().fit(train, dataset)
+        self.model = NearestNeighbors(metric='cosine', algorithm='brute').fit(train)
+
+    def scores(self, user):
+        n = min(N_NEIGHBORS + 1, self.train.shape[0])
+        distances, indices = self.model.kneighbors(self.train[user], n_neighbors=n)
+        others = indices[0] != user
+        return neighbor_scores(self.train, indices[0][others][:N_NEIGHBORS], 1 - distances[0][others][:N_NEIGHBORS])
+
+
+class ALSEngine(Engine):
+    """Facteurs latents (train_recommender.py)"""
+    name = 'als'
+
+    def fit(self, train, dataset):
+        super().fit(train, dataset)
+        self.user_factors, self.item_factors = fit_als(
+            train, factors=FACTORS, regularization=REGULARIZATION, iterations=ITERATIONS, alpha=ALPHA
+        )
+
+    def scores(self, user):
+        return self.item_factors @ self.user_factors[user]
+
+
+class GenreEngine(Engine):
+    """Affinité de genre puis popularité, comme affinity.ranked_candidates"""
+    name = 'genre'
+
+    def fit(self, train, dataset):
+        super().fit(train, dataset)
+        self.book_genres = dataset.book_genres
+        one_hot = sparse.csr_matrix(
+            (np.ones(dataset.n_books, dtype=np.float32), (np.arange(dataset.n_books), dataset.book_genres)),
+        )
+        self.affinity = (train @ one_hot).toarray()
+        popularity = np.asarray(train.sum(axis=0)).ravel()
+        self.popularity = popularity / (popularity.max() + 1)   # < 1 : départage à affinité égale
+
+    def scores(self, user):
+        return self.affinity[user][self.book_genres] + self.popularity
+
+
+class PopularityEngine(Engine):
+    """Référence : les livres les plus populaires pour tous"""
+    name = 'popular'
+
+    def fit(self, train, dataset):
+        super().fit(train, dataset)
+        self.popularity = np.asarray(train.sum(axis=0)).ravel()
+
+    def scores(self, user):
+        return self.popularity.copy()
+
+
+ENGINES = {engine.name: engine for engine in (ContentEngine, KNNEngine, ALSEngine, GenreEngine, PopularityEngine)}
+
+
+def evaluate(engine, train, truth, dataset, k=10):
+    """Entraîne puis interroge un moteur ; retourne un dict de mesures"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine.fit(train, dataset)
+    train_seconds = time.perf_counter() - start
+
+    latencies, precisions, recalls = [], [], []
+    recommended = set()
+    for user, expected in truth.items():
+        start = time.perf_counter()
+        scores = engine.scores(user)
+        scores[train.indices[train.indptr[user]:train.indptr[user + 1]]] = -np.inf
+        count = min(k, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.isfinite(scores[top]) & (scores[top] > 0)]
+        latencies.append(time.perf_counter() - start)
+
+        hits = len(expected.intersection(top.tolist()))
+        precisions.append(hits / k)
+        recalls.append(hits / len(expected))
+        recommended.update(top.tolist())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'precision': float(np.mean(precisions)) if precisions else 0.0,
+        'recall': float(np.mean(recalls)) if recalls else 0.0,
+        'coverage': len(recommended) / max(dataset.n_books, 1),
+        'train_seconds': train_seconds,
+        'latency_ms': float(np.mean(latencies)) * 1000 if latencies else 0.0,
+        'p95_ms': float(np.percentile(latencies, 95)) * 1000 if latencies else 0.0,
+        'peak_mb': peak / 1e6,
+    }
@@ -0,0 +1,82 @@
+"""
+Enregistrement des interactions sous forme d'événements (journal en ajout seul).
+
+Une vue ou un clic n'écrit rien pendant la requête : l'événement est mis en
+mémoire et le tampon est écrit en un seul bulk_create quand il est plein, au
+plus tard FLUSH_INTERVAL secondes après le premier événement, et à l'arrêt du
+processus. Les agrégats (UserInteraction, affinités, popularité) sont
+calculés par rollup.py.
+"""
+import atexit
+import logging
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections
+from django.utils import timezone
+
+from apps.book.models import Book
+from .models import InteractionEvent
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 500
+FLUSH_INTERVAL = 5.0   # secondes
+
+_buffer = []
+_lock = threading.Lock()
+_timer = None
+
+
+def record_event(user_id, book_id, kind):
+    """Ajoute un événement au tampon du processus"""
+    global _timer
+    event = InteractionEvent(user_id=user_id, book_id=book_id, kind=kind, created_at=timezone.now())
+    with _lock:
+        _buffer.append(event)
+        full = len(_buffer) >= FLUSH_SIZE
+        if not full and _timer is None:
+            _timer = threading.Timer(FLUSH_INTERVAL, _flush_in_background)
+            _timer.daemon = True
+            _timer.start()
+    if full:
+        _flush_safely()
+
+
+def flush():
+    """Écrit les événements en attente ; retourne leur nombre"""
+    global _timer
+    with _lock:
+        events = _buffer[:]
+        _buffer.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    if not events:
+        return 0
+    try:
+        InteractionEvent.objects.bulk_create(events, batch_size=FLUSH_SIZE)
+    except IntegrityError:
+        # Un livre ou un utilisateur supprimé entre-temps fait échouer tout le lot : on écarte ses événements
+        books = set(Book.objects.filter(id__in={e.book_id for e in events}).values_list('id', flat=True))
+        users = set(get_user_model().objects.filter(id__in={e.user_id for e in events}).values_list('id', flat=True))
+        events = [event for event in events if event.book_id in books and event.user_id in users]
+        InteractionEvent.objects.bulk_create(events, batch_size=FLUSH_SIZE)
+    return len(events)
+
+
+def _flush_safely():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Échec de l'écriture des événements d'interaction")
+
+
+def _flush_in_background():
+    try:
+        _flush_safely()
+    finally:
+        connections.close_all()   # connexion propre à ce thread
+
+
+atexit.register(flush)
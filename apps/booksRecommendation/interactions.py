@@ -0,0 +1,144 @@
+"""
+Matrice creuse utilisateurs x livres des interactions, persistée sur disque.
+
+- base : CSR (interactions.npz) + identifiants compacts des lignes/colonnes ;
+- deltas : chaque interaction enregistrée (vue, panier, favori) ajoute une
+  ligne « user book poids » à interactions.delta, sans relire la matrice ;
+- compaction : fusion des deltas dans la base (avant chaque entraînement).
+
+Poids d'une interaction : vue = 1, panier = 2, favori = 3 (cumulés).
+"""
+import os
+
+import numpy as np
+from scipy import sparse
+
+from apps.book.models import Book
+from .models import UserInteraction
+from .storage import atomic_path, data_path, file_lock
+
+WEIGHTS = {'viewed': 1, 'added_to_cart': 2, 'favorited': 3}
+MATRIX_NAME = 'interactions.npz'
+DELTA_NAME = 'interactions.delta'
+
+
+def interaction_weight(viewed=False, added_to_cart=False, favorited=False):
+    return (
+        WEIGHTS['viewed'] * bool(viewed)
+        + WEIGHTS['added_to_cart'] * bool(added_to_cart)
+        + WEIGHTS['favorited'] * bool(favorited)
+    )
+
+
+class InteractionMatrix:
+    """CSR (utilisateurs x livres) avec les identifiants triés de chaque axe"""
+
+    def __init__(self, user_ids, book_ids, matrix):
+        self.user_ids = user_ids
+        self.book_ids = book_ids
+        self.matrix = matrix
+
+    @classmethod
+    def from_triples(cls, users, books, weights):
+        """Construit la matrice ; pour un même couple, le dernier poids l'emporte"""
+        users = np.asarray(users, dtype=np.int64)
+        books = np.asarray(books, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        if len(users):
+            keys = (users << 32) | books
+            _, last = np.unique(keys[::-1], return_index=True)
+            keep = len(keys) - 1 - last
+            keep = keep[weights[keep] > 0]
+            users, books, weights = users[keep], books[keep], weights[keep]
+        user_ids, rows = np.unique(users, return_inverse=True)
+        book_ids, columns = np.unique(books, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (weights, (rows, columns)), shape=(len(user_ids), len(book_ids)), dtype=np.float32
+        )
+        return cls(user_ids, book_ids, matrix)
+
+    def triples(self):
+        coo = self.matrix.tocoo()
+        return self.user_ids[coo.row], self.book_ids[coo.col], coo.data
+
+    def save(self):
+        with atomic_path(MATRIX_NAME) as path:
+            np.savez(
+                path, user_ids=self.user_ids, book_ids=self.book_ids, data=self.matrix.data,
+                indices=self.matrix.indices, indptr=self.matrix.indptr,
+            )
+
+    @classmethod
+    def load_base(cls):
+        path = data_path(MATRIX_NAME)
+        if not os.path.exists(path):
+            return cls.from_triples([], [], [])
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']),
+                shape=(len(data['user_ids']), len(data['book_ids'])),
+            )
+            return cls(data['user_ids'], data['book_ids'], matrix)
+
+
+def record_interaction(user_id, book_id, weight):
+    """Ajoute le nouveau poids d'un couple (utilisateur, livre) au fichier de deltas"""
+    record_interactions([(user_id, book_id, weight)])
+
+
+def record_interactions(triples):
+    """Version groupée : une seule ouverture du fichier pour des triplets (user, book, poids)"""
+    with file_lock(MATRIX_NAME), open(data_path(DELTA_NAME), 'a') as f:
+        f.writelines(f"{user_id} {book_id} {weight}\n" for user_id, book_id, weight in triples)
+
+
+def _read_deltas():
+    path = data_path(DELTA_NAME)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.loadtxt(path, dtype=np.int64, ndmin=2)
+
+
+def compact():
+    """Fusionne les deltas dans la matrice de base ; retourne la matrice à jour"""
+    with file_lock(MATRIX_NAME):
+        base = InteractionMatrix.load_base()
+        deltas = _read_deltas()
+        if len(deltas) == 0:
+            return base
+        users, books, weights = base.triples()
+        merged = InteractionMatrix.from_triples(
+            np.concatenate([users, deltas[:, 0]]),
+            np.concatenate([books, deltas[:, 1]]),
+            np.concatenate([weights, deltas[:, 2]]),
+        )
+        merged.save()
+        open(data_path(DELTA_NAME), 'w').close()
+    return merged
+
+
+def rebuild_matrix():
+    """Reconstruit la matrice depuis la base de données (favoris M2M compris)"""
+    favorites = set(Book.favorites.through.objects.values_list('user_id', 'book_id').iterator(chunk_size=5000))
+
+    users, books, weights = [], [], []
+    for user_id, book_id, viewed, added_to_cart, favorited in UserInteraction.objects.values_list(
+        'user_id', 'book_id', 'viewed', 'added_to_cart', 'favorited'
+    ).iterator(chunk_size=5000):
+        favorited = favorited or (user_id, book_id) in favorites
+        favorites.discard((user_id, book_id))
+        users.append(user_id)
+        books.append(book_id)
+        weights.append(interaction_weight(viewed, added_to_cart, favorited))
+
+    # Favoris enregistrés sans UserInteraction
+    for user_id, book_id in favorites:
+        users.append(user_id)
+        books.append(book_id)
+        weights.append(WEIGHTS['favorited'])
+
+    with file_lock(MATRIX_NAME):
+        matrix = InteractionMatrix.from_triples(users, books, weights)
+        matrix.save()
+        open(data_path(DELTA_NAME), 'w').close()
+    return matrix
@@ -0,0 +1,62 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.booksRecommendation.evaluation import ENGINES, database_dataset, evaluate, synthetic_dataset
+
+
+class Command(BaseCommand):
+    help = "Évalue hors ligne les moteurs de recommandation (qualité, temps, mémoire) sur un découpage temporel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--test-fraction', type=float, default=0.2,
+                            help="Part la plus récente des interactions utilisée comme vérité terrain")
+        parser.add_argument('--max-users', type=int, default=1000,
+                            help="Utilisateurs évalués au plus (tirés au hasard)")
+        parser.add_argument('--synthetic', action='store_true',
+                            help="Jeu synthétique au lieu des interactions enregistrées")
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--genres', type=int, default=15)
+        parser.add_argument('--per-user', type=int, default=30, help="Interactions moyennes par utilisateur")
+        parser.add_argument('--clusters', type=int, default=20, help="Groupes de goûts du jeu synthétique")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        if options['synthetic']:
+            dataset = synthetic_dataset(
+                rng, n_users=options['users'], n_books=options['books'], n_genres=options['genres'],
+                per_user=options['per_user'], n_clusters=options['clusters'],
+            )
+        else:
+            dataset = database_dataset()
+        if len(dataset.times) == 0:
+            self.stdout.write("Aucune interaction à évaluer")
+            return
+
+        train, truth = dataset.split(options['test_fraction'])
+        if len(truth) > options['max_users']:
+            users = rng.choice(sorted(truth), size=options['max_users'], replace=False)
+            truth = {int(user): truth[user] for user in users}
+        self.stdout.write(
+            f"{dataset.n_users} utilisateur(s), {dataset.n_books} livre(s), {train.nnz} interaction(s) "
+            f"d'entraînement, {len(truth)} utilisateur(s) évalué(s)"
+        )
+
+        k = options['k']
+        self.stdout.write(
+            f"{'moteur':>8} {'précision@' + str(k):>13} {'rappel@' + str(k):>10} {'couverture':>11} "
+            f"{'entraînement':>13} {'latence (ms)':>13} {'p95 (ms)':>9} {'pic (Mo)':>9}"
+        )
+        for name in options['engines']:
+            if name == 'content' and dataset.content is None:
+                self.stdout.write(f"{name:>8} ignoré : lancer rebuild_book_similarity pour les vecteurs TF-IDF")
+                continue
+            result = evaluate(ENGINES[name](), train, truth, dataset, k=k)
+            self.stdout.write(
+                f"{name:>8} {result['precision']:>13.4f} {result['recall']:>10.4f} {result['coverage']:>11.3f} "
+                f"{result['train_seconds']:>12.2f}s {result['latency_ms']:>13.2f} {result['p95_ms']:>9.2f} "
+                f"{result['peak_mb']:>9.1f}"
+            )
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.book.embeddings import book_vectors
+from apps.book.models import Book
+from apps.booksRecommendation import ann
+from apps.booksRecommendation.train_recommender import _factors
+
+BATCH_SIZE = 1000
+
+
+def synthetic_vectors(rng, size, dim, noise=2.0, clusters=200):
+    """Vecteurs normalisés regroupés autour de `clusters` centres (comme des embeddings) ; `noise` les disperse"""
+    centers = ann.normalize(rng.normal(size=(clusters, dim)))
+    labels = rng.integers(clusters, size=size)
+    return ann.normalize(centers[labels] + rng.normal(scale=noise / np.sqrt(dim), size=(size, dim)))
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les index ANN (livres, utilisateurs) ; --synthetic pour mesurer le rappel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', choices=('books', 'users', 'all'), default='all')
+        parser.add_argument('--synthetic', type=int, nargs='+',
+                            help="Compare IVF et recherche exacte sur N vecteurs synthétiques (n'écrit rien)")
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--noise', type=float, default=2.0)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--nprobe', type=int, nargs='+', default=[ann.NPROBE])
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            return self.benchmark(options)
+
+        if options['index'] in ('books', 'all'):
+            read_at = timezone.now()
+            ids, vectors = [], []
+            book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+            for start in range(0, len(book_ids), BATCH_SIZE):
+                batch_ids, matrix = book_vectors(book_ids[start:start + BATCH_SIZE])
+                ids.extend(batch_ids)
+                vectors.extend(matrix)
+            index = ann.build_index('books', ids, vectors, read_at=read_at)
+            self.stdout.write(f"[books] {len(index)} livre(s) indexé(s)")
+
+        if options['index'] in ('users', 'all'):
+            model = _factors.get()
+            if model is None:
+                self.stdout.write("[users] Facteurs ALS absents : lancer train_user_recommender --engine als")
+            else:
+                index = ann.build_index('users', model['user_ids'], model['user_factors'])
+                self.stdout.write(f"[users] {len(index)} utilisateur(s) indexé(s)")
+
+    def benchmark(self, options):
+        rng = np.random.default_rng(options['seed'])
+        k = options['k']
+        self.stdout.write(
+            f"{'vecteurs':>9} {'nprobe':>7} {'construction':>13} {'exact (ms)':>11} "
+            f"{'ivf (ms)':>9} {'rappel@' + str(k):>10}"
+        )
+        for size in options['synthetic']:
+            vectors = synthetic_vectors(rng, size, options['dim'], options['noise'])
+            ids = np.arange(size)
+            queries = rng.choice(size, size=min(size, options['queries']), replace=False)
+
+            exact = ann.ExactIndex()
+            exact.add(ids, vectors)
+            start = time.perf_counter()
+            truth = [set(exact.search(vectors[q], k, exclude=[q])[0].tolist()) for q in queries]
+            exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+            start = time.perf_counter()
+            ivf = ann.IVFIndex()
+            ivf.add(ids, vectors)
+            ivf.train()
+            build_seconds = time.perf_counter() - start
+
+            for nprobe in options['nprobe']:
+                ivf.nprobe = nprobe
+                start = time.perf_counter()
+                found = [set(ivf.search(vectors[q], k, exclude=[q])[0].tolist()) for q in queries]
+                ivf_ms = (time.perf_counter() - start) / len(queries) * 1000
+                recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+                self.stdout.write(
+                    f"{size:>9} {nprobe:>7} {build_seconds:>12.1f}s {exact_ms:>11.2f} "
+                    f"{ivf_ms:>9.2f} {recall:>10.3f}"
+                )
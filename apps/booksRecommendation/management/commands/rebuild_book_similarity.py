@@ -0,0 +1,75 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from apps.booksRecommendation.similarity import (
+    MAX_TERMS, N_FEATURES, TOP_K, rebuild_all, top_neighbors
+)
+
+
+def synthetic_matrix(rng, size, vocabulary=50000):
+    """Vecteurs normalisés de MAX_TERMS termes tirés selon une loi de Zipf"""
+    columns = np.empty((size, MAX_TERMS), dtype=np.int32)
+    for row in range(size):
+        terms = np.unique(rng.zipf(1.3, MAX_TERMS * 2) % vocabulary)[:MAX_TERMS]
+        columns[row, :len(terms)] = terms
+        columns[row, len(terms):] = vocabulary + row % 1000 + np.arange(MAX_TERMS - len(terms))
+    values = rng.random((size, MAX_TERMS), dtype=np.float32)
+    values /= np.linalg.norm(values, axis=1, keepdims=True)
+    indptr = np.arange(0, size * MAX_TERMS + 1, MAX_TERMS)
+    matrix = sparse.csr_matrix((values.ravel(), columns.ravel(), indptr), shape=(size, N_FEATURES))
+    matrix.sum_duplicates()
+    return matrix
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table des livres similaires (BookSimilarity) ; --synthetic pour mesurer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--synthetic', type=int, nargs='+',
+                            help="Mesure mémoire/latence sur N livres synthétiques (n'écrit rien)")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            return self.benchmark(options['synthetic'], options['top_k'], options['seed'])
+
+        start = time.perf_counter()
+        store = rebuild_all(k=options['top_k'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(store.ids)} livre(s) traités en {time.perf_counter() - start:.1f}s"
+        ))
+
+    def benchmark(self, sizes, k, seed):
+        rng = np.random.default_rng(seed)
+        self.stdout.write(
+            f"{'livres':>8} {'vecteurs (Mo)':>14} {'reconstruction':>15} {'pic (Mo)':>9} "
+            f"{'maj 1 livre (ms)':>17} {'ancien NxN (Mo)':>16}"
+        )
+        for size in sizes:
+            matrix = synthetic_matrix(rng, size)
+            vectors_mb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1e6
+
+            positions = np.arange(size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            top_neighbors(matrix, matrix, positions, k)
+            rebuild_seconds = time.perf_counter() - start
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+
+            # Mise à jour incrémentale : scores d'un livre contre tous + top-K
+            sample = rng.choice(size, size=min(size, 50), replace=False)
+            start = time.perf_counter()
+            for position in sample:
+                top_neighbors(matrix[[position]], matrix, [position], k)
+            update_ms = (time.perf_counter() - start) / len(sample) * 1000
+
+            self.stdout.write(
+                f"{size:>8} {vectors_mb:>14.1f} {rebuild_seconds:>14.1f}s {peak_mb:>9.1f} "
+                f"{update_ms:>17.1f} {size * size * 8 / 1e6:>16.0f}"
+            )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.booksRecommendation.rollup import rebuild_aggregates, rollup
+
+
+class Command(BaseCommand):
+    help = "Agrège le journal des interactions (UserInteraction, affinités de genre, popularité) ; à planifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recalcule entièrement affinités et popularité")
+        parser.add_argument('--every', type=float,
+                            help="Agrège en boucle toutes les N minutes")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            users, books = rebuild_aggregates()
+            self.stdout.write(f"Agrégats reconstruits : {users} utilisateur(s), {books} livre(s)")
+        while True:
+            start = time.perf_counter()
+            count = rollup()
+            self.stdout.write(f"{count} événement(s) agrégé(s) en {time.perf_counter() - start:.2f}s")
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
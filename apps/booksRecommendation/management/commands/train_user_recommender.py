@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.booksRecommendation.collaborative import train_user_model
+from apps.booksRecommendation.train_recommender import (
+    ALPHA, FACTORS, ITERATIONS, REGULARIZATION, train_als_model
+)
+
+ENGINES = ('knn', 'als')
+
+
+class Command(BaseCommand):
+    help = "Entraîne le modèle de recommandation utilisateur (à planifier)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', choices=ENGINES + ('all',),
+                            help="Moteur à entraîner (défaut : RECOMMENDER_ENGINE)")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Reconstruit la matrice d'interactions depuis la base au lieu des deltas")
+        parser.add_argument('--every', type=float,
+                            help="Réentraîne en boucle toutes les N minutes")
+        parser.add_argument('--factors', type=int, default=FACTORS)
+        parser.add_argument('--iterations', type=int, default=ITERATIONS)
+        parser.add_argument('--regularization', type=float, default=REGULARIZATION)
+        parser.add_argument('--alpha', type=float, default=ALPHA)
+
+    def handle(self, *args, **options):
+        engine = options['engine'] or settings.RECOMMENDER_ENGINE
+        engines = ENGINES if engine == 'all' else (engine,)
+        rebuild = options['rebuild']
+        while True:
+            for name in engines:
+                start = time.perf_counter()
+                if name == 'als':
+                    interactions = train_als_model(
+                        rebuild=rebuild, factors=options['factors'], iterations=options['iterations'],
+                        regularization=options['regularization'], alpha=options['alpha'],
+                    )
+                else:
+                    interactions = train_user_model(rebuild=rebuild)
+                rebuild = False   # la matrice est à jour pour le moteur suivant
+                if interactions is None:
+                    self.stdout.write(f"[{name}] Aucune interaction : modèle non entraîné")
+                    continue
+                users, books = interactions.matrix.shape
+                self.stdout.write(
+                    f"[{name}] Modèle entraîné : {users} utilisateur(s), {books} livre(s), "
+                    f"{interactions.matrix.nnz} interaction(s) en {time.perf_counter() - start:.2f}s"
+                )
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
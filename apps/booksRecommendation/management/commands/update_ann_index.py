@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.booksRecommendation.ann import apply_pending
+
+
+class Command(BaseCommand):
+    help = "Applique la file des vecteurs modifiés ou supprimés aux index ANN ; à planifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Inscriptions appliquées par écriture de l'index")
+        parser.add_argument('--every', type=float,
+                            help="Traite la file en boucle toutes les N minutes")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            total = 0
+            while True:
+                count = apply_pending(batch_size=options['batch_size'])
+                total += count
+                if count < options['batch_size']:
+                    break
+            self.stdout.write(f"{total} vecteur(s) mis à jour en {time.perf_counter() - start:.2f}s")
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.booksRecommendation.similarity import TOP_K, apply_pending
+
+
+class Command(BaseCommand):
+    help = "Applique la file des livres modifiés aux voisins précalculés (BookSimilarity) ; à planifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Livres appliqués par écriture du store")
+        parser.add_argument('--every', type=float,
+                            help="Traite la file en boucle toutes les N minutes")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            total = 0
+            while True:
+                count = apply_pending(k=options['top_k'], batch_size=options['batch_size'])
+                total += count
+                if count < options['batch_size']:
+                    break
+            self.stdout.write(f"{total} livre(s) mis à jour en {time.perf_counter() - start:.2f}s")
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.booksRecommendation.rollup import checkpoint_locked
+from apps.booksRecommendation.trending import compact, update_scores
+
+
+class Command(BaseCommand):
+    help = "Compacte les tranches d'activité et recalcule les scores des livres tendance ; à planifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float,
+                            help="Recalcule en boucle toutes les N minutes")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            with checkpoint_locked():   # exclut un rollup en cours sur les mêmes tranches
+                merged, expired = compact()
+                active = update_scores()
+            self.stdout.write(
+                f"{merged} tranche(s) horaire(s) compactée(s), {expired} expirée(s), "
+                f"{active} livre(s) actif(s) en {time.perf_counter() - start:.2f}s"
+            )
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 01:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0012_bookparagraph'),
+        ('booksRecommendation', '0002_alter_userinteraction_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='book.book')),
+                ('similar_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book')),
+            ],
+            options={
+                'ordering': ['book', 'rank'],
+                'unique_together': {('book', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('authentication', '0001_initial'),
+        ('book', '0012_bookparagraph'),
+        ('booksRecommendation', '0003_booksimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPopularity',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='book.book')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('carts', models.PositiveIntegerField(default=0)),
+                ('favorites', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserGenreAffinity',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='genre_affinity', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('scores', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InteractionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('view', 'Vue'), ('cart', 'Ajout au panier'), ('favorite', 'Ajout aux favoris'), ('unfavorite', 'Retrait des favoris')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-18 02:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_book_genre_index'),
+        ('booksRecommendation', '0004_interaction_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookpopularity',
+            name='purchases',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookpopularity',
+            name='trending',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='interactionevent',
+            name='kind',
+            field=models.CharField(choices=[('view', 'Vue'), ('cart', 'Ajout au panier'), ('favorite', 'Ajout aux favoris'), ('unfavorite', 'Retrait des favoris'), ('purchase', 'Achat')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='BookActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Heure'), ('day', 'Jour')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('carts', models.PositiveIntegerField(default=0)),
+                ('favorites', models.PositiveIntegerField(default=0)),
+                ('purchases', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookactivity',
+            index=models.Index(fields=['period', 'start'], name='booksRecomm_period_6acdd8_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookactivity',
+            unique_together={('book', 'period', 'start')},
+        ),
+    ]
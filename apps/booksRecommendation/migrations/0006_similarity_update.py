@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksRecommendation', '0005_book_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityUpdate',
+            fields=[
+                ('book_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('deleted', models.BooleanField(default=False)),
+                ('dependents', models.JSONField(default=list)),
+                ('queued_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
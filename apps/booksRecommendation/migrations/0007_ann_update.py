@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksRecommendation', '0006_similarity_update'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.CharField(max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('queued_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('index', 'item_id')},
+            },
+        ),
+    ]
@@ -15,3 +15,123 @@ class UserInteraction(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.book.title}"
+
+
+class BookSimilarity(models.Model):
+    """Voisins les plus proches (contenu + genre) de chaque livre, précalculés"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similarities')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('book', 'rank')  # index utilisé par book_detail
+        ordering = ['book', 'rank']
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.similar_book_id} ({self.score:.3f})"
+
+
+class InteractionEvent(models.Model):
+    """Journal des interactions (ajout seul) ; agrégé par la commande rollup_interactions"""
+    VIEW = 'view'
+    CART = 'cart'
+    FAVORITE = 'favorite'
+    UNFAVORITE = 'unfavorite'
+    PURCHASE = 'purchase'
+    KIND_CHOICES = [
+        (VIEW, 'Vue'),
+        (CART, 'Ajout au panier'),
+        (FAVORITE, 'Ajout aux favoris'),
+        (UNFAVORITE, 'Retrait des favoris'),
+        (PURCHASE, 'Achat'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.book_id}"
+
+
+class RollupCheckpoint(models.Model):
+    """Dernier événement agrégé par chaque traitement"""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
+class UserGenreAffinity(models.Model):
+    """Score de chaque genre pour un utilisateur (somme des poids de ses interactions)"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='genre_affinity')
+    scores = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} {self.scores}"
+
+
+class BookPopularity(models.Model):
+    """Compteurs d'interactions d'un livre"""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    views = models.PositiveIntegerField(default=0)
+    carts = models.PositiveIntegerField(default=0)
+    favorites = models.PositiveIntegerField(default=0)
+    purchases = models.PositiveIntegerField(default=0)
+    trending = models.FloatField(default=0, db_index=True)  # score décroissant avec le temps (trending.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.book_id}: {self.views} vues, {self.carts} paniers, {self.favorites} favoris"
+
+
+class BookActivity(models.Model):
+    """Interactions d'un livre par heure (récentes) ou par jour (après compaction)"""
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [(HOUR, 'Heure'), (DAY, 'Jour')]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    carts = models.PositiveIntegerField(default=0)
+    favorites = models.PositiveIntegerField(default=0)
+    purchases = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('book', 'period', 'start')
+        indexes = [models.Index(fields=['period', 'start'])]  # compaction et calcul des scores
+
+    def __str__(self):
+        return f"{self.book_id} {self.period} {self.start:%Y-%m-%d %H:%M}"
+
+
+class SimilarityUpdate(models.Model):
+    """Livre dont le vecteur et les voisins sont à recalculer (file traitée par update_book_similarity)"""
+    book_id = models.BigIntegerField(primary_key=True)   # pas de clé étrangère : le livre peut être supprimé
+    deleted = models.BooleanField(default=False)
+    dependents = models.JSONField(default=list)   # livres qui avaient le livre supprimé pour voisin
+    queued_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.book_id}{' (supprimé)' if self.deleted else ''}"
+
+
+class AnnUpdate(models.Model):
+    """Vecteur à insérer ou retirer d'un index ANN (file traitée par update_ann_index)"""
+    index = models.CharField(max_length=20)          # 'books' ou 'users'
+    item_id = models.BigIntegerField()                # pas de clé étrangère : l'objet peut être supprimé
+    deleted = models.BooleanField(default=False)
+    queued_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('index', 'item_id')
+
+    def __str__(self):
+        return f"{self.index}:{self.item_id}{' (supprimé)' if self.deleted else ''}"
@@ -0,0 +1,218 @@
+"""
+Agrégation du journal InteractionEvent (commande rollup_interactions).
+
+Chaque lot d'événements postérieurs au point de reprise met à jour, dans une
+seule transaction :
+- UserInteraction (drapeaux vue / panier / favori), en bulk_create/bulk_update ;
+- UserGenreAffinity : variation du poids de chaque couple reportée sur le genre du livre ;
+- BookPopularity : vues, ajouts au panier, nombre de favoris, achats ;
+- BookActivity : tranches horaires des livres tendance (trending.py) ;
+- le point de reprise (RollupCheckpoint), verrouillé pendant le lot.
+Les nouveaux poids sont ensuite ajoutés aux deltas de la matrice d'interactions.
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.book.models import Book
+from apps.cart.models import OrderItem
+from .events import FLUSH_INTERVAL
+from .interactions import interaction_weight, record_interactions
+from .models import BookPopularity, InteractionEvent, RollupCheckpoint, UserGenreAffinity, UserInteraction
+from .trending import add_to_buckets, update_scores
+
+BATCH_SIZE = 5000
+CHECKPOINT = 'interactions'
+# Marge au-delà de FLUSH_INTERVAL : l'identifiant d'un événement est attribué
+# à l'insertion mais n'est visible qu'au commit du bulk_create (lent sous
+# charge), et created_at vient de l'horloge du serveur web, pas de celle du
+# rollup. Couvre un bulk_create lent et un décalage d'horloge de quelques
+# dizaines de secondes.
+MAX_WRITE_LAG = timedelta(seconds=55)
+# Un événement est écrit au plus FLUSH_INTERVAL s après sa création, visible au
+# plus MAX_WRITE_LAG plus tard : au-delà, aucun identifiant plus petit ne peut
+# encore apparaître.
+SETTLE_DELAY = timedelta(seconds=FLUSH_INTERVAL) + MAX_WRITE_LAG
+
+FLAGS = {
+    InteractionEvent.VIEW: ('viewed', True),
+    InteractionEvent.CART: ('added_to_cart', True),
+    InteractionEvent.FAVORITE: ('favorited', True),
+    InteractionEvent.UNFAVORITE: ('favorited', False),
+}
+FLAG_FIELDS = ['viewed', 'added_to_cart', 'favorited']
+
+
+def _weight(interaction):
+    return interaction_weight(interaction.viewed, interaction.added_to_cart, interaction.favorited)
+
+
+def _flags(interaction):
+    return tuple(getattr(interaction, field) for field in FLAG_FIELDS)
+
+
+def _apply_batch(events):
+    """Applique un lot d'événements (id, user, book, kind) ; retourne les nouveaux poids"""
+    changes = {}
+    counters = defaultdict(Counter)
+    for _, user_id, book_id, kind, _ in events:
+        counters[book_id][kind] += 1
+        if kind in FLAGS:   # un achat ne change pas les drapeaux
+            field, value = FLAGS[kind]
+            changes.setdefault((user_id, book_id), {})[field] = value
+
+    user_ids = {user_id for user_id, _ in changes}
+    book_ids = {book_id for _, book_id in changes}
+    existing = {
+        (interaction.user_id, interaction.book_id): interaction
+        for interaction in UserInteraction.objects.filter(user_id__in=user_ids, book_id__in=book_ids)
+    }
+    genres = dict(Book.objects.filter(id__in=book_ids).values_list('id', 'genre'))
+
+    created, updated, weights = [], [], []
+    genre_deltas = defaultdict(Counter)
+    favorite_deltas = Counter()
+    for (user_id, book_id), fields in changes.items():
+        interaction = existing.get((user_id, book_id))
+        if interaction is None:
+            interaction = UserInteraction(user_id=user_id, book_id=book_id)
+            created.append(interaction)
+        before, old_weight = _flags(interaction), _weight(interaction)
+        for field, value in fields.items():
+            setattr(interaction, field, value)
+        if _flags(interaction) == before:
+            continue
+        if interaction.pk:
+            updated.append(interaction)
+        new_weight = _weight(interaction)
+        weights.append((user_id, book_id, new_weight))
+        genre_deltas[user_id][genres.get(book_id)] += new_weight - old_weight
+        favorite_deltas[book_id] += int(interaction.favorited) - int(before[2])
+
+    created = [interaction for interaction in created if _flags(interaction) != (False, False, False)]
+    UserInteraction.objects.bulk_create(created, batch_size=1000)
+    UserInteraction.objects.bulk_update(updated, FLAG_FIELDS, batch_size=1000)
+    _update_affinities(genre_deltas)
+    _update_popularity(counters, favorite_deltas)
+    add_to_buckets(events)
+    return weights
+
+
+def _update_affinities(genre_deltas):
+    now = timezone.now()
+    affinities = UserGenreAffinity.objects.in_bulk(list(genre_deltas))
+    created, updated = [], []
+    for user_id, deltas in genre_deltas.items():
+        affinity = affinities.get(user_id)
+        if affinity is None:
+            affinity = UserGenreAffinity(user_id=user_id, scores={})
+            created.append(affinity)
+        else:
+            updated.append(affinity)
+        for genre, delta in deltas.items():
+            if genre is None:
+                continue
+            score = affinity.scores.get(genre, 0) + delta
+            if score > 0:
+                affinity.scores[genre] = score
+            else:
+                affinity.scores.pop(genre, None)
+        affinity.updated_at = now
+    UserGenreAffinity.objects.bulk_create(created, batch_size=1000)
+    UserGenreAffinity.objects.bulk_update(updated, ['scores', 'updated_at'], batch_size=1000)
+
+
+def _update_popularity(counters, favorite_deltas):
+    now = timezone.now()
+    book_ids = set(counters) & set(Book.objects.filter(id__in=counters).values_list('id', flat=True))
+    rows = BookPopularity.objects.in_bulk(list(book_ids))
+    created, updated = [], []
+    for book_id in book_ids:
+        popularity = rows.get(book_id)
+        if popularity is None:
+            popularity = BookPopularity(book_id=book_id)
+            created.append(popularity)
+        else:
+            updated.append(popularity)
+        popularity.views += counters[book_id][InteractionEvent.VIEW]
+        popularity.carts += counters[book_id][InteractionEvent.CART]
+        popularity.favorites = max(0, popularity.favorites + favorite_deltas[book_id])
+        popularity.purchases += counters[book_id][InteractionEvent.PURCHASE]
+        popularity.updated_at = now
+    BookPopularity.objects.bulk_create(created, batch_size=1000)
+    BookPopularity.objects.bulk_update(
+        updated, ['views', 'carts', 'favorites', 'purchases', 'updated_at'], batch_size=1000
+    )
+
+
+@contextmanager
+def checkpoint_locked():
+    """Transaction tenant le verrou du point de reprise : aucun rollup ne tourne en parallèle"""
+    RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    with transaction.atomic():
+        yield RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+
+
+def rollup(batch_size=BATCH_SIZE):
+    """Agrège les événements non traités ; retourne leur nombre"""
+    total = 0
+    while True:
+        settled = timezone.now() - SETTLE_DELAY
+        with checkpoint_locked() as checkpoint:
+            events = list(
+                InteractionEvent.objects.filter(id__gt=checkpoint.last_event_id)
+                .order_by('id').values_list('id', 'user_id', 'book_id', 'kind', 'created_at')[:batch_size]
+            )
+            # S'arrête au premier événement trop récent : un plus ancien peut encore être en cours d'écriture
+            recent = next((i for i, event in enumerate(events) if event[4] > settled), len(events))
+            events = events[:recent]
+            if not events:
+                return total
+            weights = _apply_batch(events)
+            checkpoint.last_event_id = events[-1][0]
+            checkpoint.save(update_fields=['last_event_id'])
+        record_interactions(weights)
+        total += len(events)
+        if recent < batch_size:
+            return total
+
+
+def rebuild_aggregates():
+    """Recalcule affinités et popularité depuis UserInteraction et le journal déjà agrégé"""
+    rollup()
+    with checkpoint_locked() as checkpoint:
+
+        scores = defaultdict(Counter)
+        for user_id, genre, viewed, added_to_cart, favorited in UserInteraction.objects.values_list(
+            'user_id', 'book__genre', 'viewed', 'added_to_cart', 'favorited'
+        ).iterator(chunk_size=5000):
+            scores[user_id][genre] += interaction_weight(viewed, added_to_cart, favorited)
+
+        counts = InteractionEvent.objects.filter(id__lte=checkpoint.last_event_id).values('book_id').annotate(
+            views=Count('id', filter=Q(kind=InteractionEvent.VIEW)),
+            carts=Count('id', filter=Q(kind=InteractionEvent.CART)),
+        )
+        popularity = {row['book_id']: BookPopularity(book_id=row['book_id'], views=row['views'], carts=row['carts'])
+                      for row in counts}
+        favorites = Book.favorites.through.objects.values('book_id').annotate(n=Count('user_id'))
+        for row in favorites:
+            popularity.setdefault(row['book_id'], BookPopularity(book_id=row['book_id'])).favorites = row['n']
+        # Achats : les commandes font foi (y compris celles antérieures au journal)
+        last_event = InteractionEvent.objects.filter(id=checkpoint.last_event_id).values_list('created_at', flat=True)
+        purchases = OrderItem.objects.filter(order__created_at__lte=last_event.first() or timezone.now())
+        for row in purchases.values('book_id').annotate(n=Count('id')):
+            popularity.setdefault(row['book_id'], BookPopularity(book_id=row['book_id'])).purchases = row['n']
+
+        UserGenreAffinity.objects.all().delete()
+        UserGenreAffinity.objects.bulk_create([
+            UserGenreAffinity(user_id=user_id, scores={genre: score for genre, score in genres.items() if score > 0})
+            for user_id, genres in scores.items()
+        ], batch_size=1000)
+        BookPopularity.objects.all().delete()
+        BookPopularity.objects.bulk_create(popularity.values(), batch_size=1000)
+        update_scores()   # les lignes recréées repartent d'un score de tendance nul
+    return len(scores), len(popularity)
@@ -0,0 +1,69 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.book.models import Book
+from apps.book.signals import embeddings_updated
+from . import ann
+from .interactions import interaction_weight, record_interaction
+from .models import BookSimilarity, UserInteraction
+from .similarity import queue_removal, queue_update
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_FIELDS = {'content', 'file', 'genre'}
+
+
+def _run_safely(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Échec de la mise à jour des recommandations (%s)", func.__name__)
+
+
+@receiver(post_save, sender=Book)
+def update_similarities_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Inscrit le livre dans la file des voisins à recalculer, si son texte a pu changer"""
+    if raw or (update_fields is not None and not SIMILARITY_FIELDS & set(update_fields)):
+        return
+    queue_update(instance.id)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_similarity_dependents(sender, instance, **kwargs):
+    instance._similarity_dependents = list(
+        BookSimilarity.objects.filter(similar_book=instance).values_list('book_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Book)
+def update_similarities_on_delete(sender, instance, **kwargs):
+    book_id = instance.id
+    queue_removal(book_id, getattr(instance, '_similarity_dependents', []))
+    ann.queue_update('books', [book_id], deleted=True)
+
+
+@receiver(embeddings_updated)
+def index_book_embedding(sender, book, vector, **kwargs):
+    """Inscrit le livre dans la file de l'index ANN (retiré s'il n'a plus de texte)"""
+    ann.queue_update('books', [book.id], deleted=vector is None)
+
+
+@receiver(post_delete, sender=get_user_model())
+def remove_user_vector(sender, instance, **kwargs):
+    ann.queue_update('users', [instance.id], deleted=True)
+
+
+@receiver(post_save, sender=UserInteraction)
+def record_interaction_on_save(sender, instance, raw=False, **kwargs):
+    """Reporte le nouveau poids du couple (utilisateur, livre) dans la matrice d'interactions"""
+    if raw:
+        return
+    args = (
+        instance.user_id, instance.book_id,
+        interaction_weight(instance.viewed, instance.added_to_cart, instance.favorited),
+    )
+    transaction.on_commit(lambda: _run_safely(record_interaction, *args))
@@ -0,0 +1,354 @@
+"""
+Similarité livre-livre précalculée pour les recommandations de book_detail.
+
+Chaque livre est représenté par un vecteur TF-IDF haché (HashingVectorizer,
+pas de vocabulaire à conserver), réduit à ses MAX_TERMS termes les plus forts
+et normalisé. Les vecteurs sont stockés sur disque (.npz dans
+RECOMMENDER_DATA_DIR) et les TOP_K voisins de chaque livre dans la table
+BookSimilarity : l'affichage d'un livre ne fait plus qu'une requête indexée.
+
+- reconstruction complète : commande `rebuild_book_similarity` ;
+- mise à jour incrémentale : la sauvegarde d'un livre ne fait qu'inscrire son
+  id dans la file SimilarityUpdate ; la commande `update_book_similarity`
+  applique la file par lots. Seuls les livres dont le texte a changé et ceux
+  dont ils entrent (ou sortent) du top-K sont recalculés, et le store n'est
+  réécrit qu'une fois par lot. Les IDF ne sont recalculés que par la
+  reconstruction complète.
+"""
+import hashlib
+import logging
+import os
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from apps.book.models import Book
+from apps.book.reader import read_book_text
+from .models import BookSimilarity, SimilarityUpdate
+from .storage import atomic_path, data_path, file_lock
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 18
+TOP_K = 10
+MAX_TERMS = 100        # termes conservés par livre
+TEXT_CHARS = 100000    # texte lu par livre
+BLOCK_SIZE = 256       # lignes calculées à la fois (mémoire : BLOCK_SIZE x nb livres float32)
+FEW_QUERIES = 16       # en dessous : produit direct avec les requêtes densifiées
+STORE_NAME = 'book_similarity.npz'
+
+_vectorizer = HashingVectorizer(
+    n_features=N_FEATURES, stop_words='english', alternate_sign=False, norm=None
+)
+
+
+def book_document(book):
+    """Texte représentant un livre : contenu + genre"""
+    return f"{read_book_text(book, max_chars=TEXT_CHARS)} {book.genre}"
+
+
+def document_digest(document):
+    return hashlib.sha1(document.encode('utf-8')).hexdigest()
+
+
+def term_counts(documents):
+    """Fréquences sous-linéaires (1 + log tf) des termes hachés"""
+    counts = _vectorizer.transform(documents).astype(np.float32)
+    np.log(counts.data, out=counts.data)
+    counts.data += 1
+    return counts.tocsr()
+
+
+def document_frequencies(counts):
+    return np.bincount(counts.indices, minlength=N_FEATURES).astype(np.int32)
+
+
+def weight_rows(counts, df, n_docs, max_terms=MAX_TERMS):
+    """TF-IDF, réduit aux max_terms plus forts poids par ligne, normalisé L2 (csr float32)"""
+    idf = (np.log((1 + n_docs) / (1 + df.astype(np.float64))) + 1).astype(np.float32)
+    weighted = counts.multiply(idf).tocsr()
+    data, indices, indptr = [], [], [0]
+    for row in range(weighted.shape[0]):
+        start, end = weighted.indptr[row], weighted.indptr[row + 1]
+        values, columns = weighted.data[start:end], weighted.indices[start:end]
+        if len(values) > max_terms:
+            keep = np.argpartition(values, -max_terms)[-max_terms:]
+            values, columns = values[keep], columns[keep]
+        norm = np.sqrt(np.dot(values, values)) or 1.0
+        data.append(values / norm)
+        indices.append(columns)
+        indptr.append(indptr[-1] + len(values))
+    return sparse.csr_matrix(
+        (np.concatenate(data) if data else np.empty(0, np.float32),
+         np.concatenate(indices) if indices else np.empty(0, np.int32),
+         np.array(indptr)),
+        shape=(weighted.shape[0], N_FEATURES), dtype=np.float32,
+    )
+
+
+def top_neighbors(queries, matrix, exclude, k=TOP_K, block_size=BLOCK_SIZE):
+    """
+    k plus proches lignes de `matrix` pour chaque ligne de `queries` (produit scalaire).
+    `exclude[i]` est la ligne à ignorer pour la requête i (elle-même) ou -1.
+    Retourne (indices, scores) de forme (nb requêtes, k) ; les cases vides valent -1 / 0.
+    """
+    n_queries, n_rows = queries.shape[0], matrix.shape[0]
+    indices = np.full((n_queries, k), -1, dtype=np.int64)
+    scores = np.zeros((n_queries, k), dtype=np.float32)
+    # Beaucoup de requêtes : matrice indexée par terme, seuls les termes des requêtes sont lus
+    by_term = matrix.T.tocsr() if n_queries > FEW_QUERIES else None
+    for start in range(0, n_queries, block_size):
+        stop = min(start + block_size, n_queries)
+        block_queries = queries[start:stop]
+        if by_term is None:
+            block = matrix @ block_queries.toarray().T
+        else:
+            terms = np.unique(block_queries.indices)
+            block = by_term[terms].T @ block_queries[:, terms].toarray().T
+        block = np.ascontiguousarray(block.T)   # (requêtes x livres), produit creux x dense
+        rows = np.arange(stop - start)
+        excluded = np.asarray(exclude[start:stop])
+        block[rows[excluded >= 0], excluded[excluded >= 0]] = 0
+        kk = min(k, n_rows)
+        if kk == 0:
+            continue
+        best = np.argpartition(-block, kk - 1, axis=1)[:, :kk] if n_rows > kk else np.tile(np.arange(n_rows), (stop - start, 1))
+        best_scores = np.take_along_axis(block, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best[best_scores <= 0] = -1
+        indices[start:stop, :kk] = best
+        scores[start:stop, :kk] = np.maximum(best_scores, 0)
+    return indices, scores
+
+
+class SimilarityStore:
+    """Vecteurs des livres + statistiques nécessaires aux mises à jour incrémentales"""
+
+    def __init__(self, ids, digests, matrix, df, n_docs, thresholds):
+        self.ids = ids                  # id du livre de chaque ligne
+        self.digests = digests          # sha1 du document de chaque ligne
+        self.matrix = matrix            # csr (livres x N_FEATURES)
+        self.df = df                    # fréquences documentaires
+        self.n_docs = n_docs
+        self.thresholds = thresholds    # score du k-ième voisin (0 si moins de k voisins)
+
+    def position(self, book_id):
+        found = np.nonzero(self.ids == book_id)[0]
+        return int(found[0]) if len(found) else None
+
+    @staticmethod
+    def path():
+        return data_path(STORE_NAME)
+
+    @classmethod
+    def load(cls):
+        path = cls.path()
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']), shape=(len(data['ids']), N_FEATURES)
+            )
+            return cls(data['ids'], data['digests'], matrix, data['df'], int(data['n_docs']), data['thresholds'])
+
+    def save(self):
+        with atomic_path(STORE_NAME) as path:
+            np.savez(
+                path, ids=self.ids, digests=self.digests, data=self.matrix.data,
+                indices=self.matrix.indices, indptr=self.matrix.indptr, df=self.df,
+                n_docs=self.n_docs, thresholds=self.thresholds,
+            )
+
+
+def _save_neighbors(store, positions, indices, scores):
+    """Remplace les voisins des livres aux `positions` et met à jour leurs seuils"""
+    book_ids = [int(store.ids[p]) for p in positions]
+    rows = []
+    for book_id, neighbors, neighbor_scores in zip(book_ids, indices, scores):
+        rank = 0
+        for neighbor, score in zip(neighbors, neighbor_scores):
+            if neighbor < 0:
+                break
+            rows.append(BookSimilarity(
+                book_id=book_id, similar_book_id=int(store.ids[neighbor]), rank=rank, score=float(score)
+            ))
+            rank += 1
+    with transaction.atomic():
+        BookSimilarity.objects.filter(book_id__in=book_ids).delete()
+        BookSimilarity.objects.bulk_create(rows, batch_size=1000)
+    store.thresholds[positions] = np.where(indices[:, -1] >= 0, scores[:, -1], 0)
+
+
+def rebuild_all(k=TOP_K, log=None):
+    """Recalcule les vecteurs et les voisins de tous les livres (deux lectures des textes)"""
+    log = log or (lambda message: None)
+    started_at = timezone.now()
+    books = Book.objects.only('id', 'genre', 'file', 'content').order_by('id')
+
+    # 1. Fréquences documentaires
+    df = np.zeros(N_FEATURES, dtype=np.int32)
+    ids, digests = [], []
+    for book in books.iterator(chunk_size=200):
+        document = book_document(book)
+        df += document_frequencies(term_counts([document]))
+        ids.append(book.id)
+        digests.append(document_digest(document))
+    log(f"{len(ids)} livre(s) lus")
+
+    # 2. Vecteurs TF-IDF réduits (texte relu livre par livre)
+    positions = {book_id: i for i, book_id in enumerate(ids)}
+    rows = [sparse.csr_matrix((1, N_FEATURES), dtype=np.float32)] * len(ids)  # livre supprimé entre-temps : vecteur vide
+    for book in books.iterator(chunk_size=200):
+        if book.id in positions:
+            rows[positions[book.id]] = weight_rows(term_counts([book_document(book)]), df, len(ids))
+    matrix = sparse.vstack(rows, format='csr') if rows else sparse.csr_matrix((0, N_FEATURES), dtype=np.float32)
+    store = SimilarityStore(
+        np.array(ids, dtype=np.int64), np.array(digests, dtype='S40'), matrix, df, len(ids),
+        np.zeros(len(ids), dtype=np.float32),
+    )
+
+    # 3. Voisins, par blocs
+    positions = np.arange(len(ids))
+    with file_lock(STORE_NAME):
+        for start in range(0, len(ids), BLOCK_SIZE * 4):
+            block = positions[start:start + BLOCK_SIZE * 4]
+            indices, scores = top_neighbors(matrix[block], matrix, block, k)
+            _save_neighbors(store, block, indices, scores)
+        BookSimilarity.objects.exclude(book_id__in=Book.objects.values('id')).delete()
+        store.save()
+        # Les livres inscrits avant la relecture des textes sont à jour
+        SimilarityUpdate.objects.filter(queued_at__lt=started_at).delete()
+    log(f"Voisins calculés pour {len(ids)} livre(s)")
+    return store
+
+
+def _queue(update):
+    """Une requête (upsert) ; queued_at est renouvelé si le livre est déjà dans la file"""
+    SimilarityUpdate.objects.bulk_create(
+        [update], update_conflicts=True, unique_fields=['book_id'],
+        update_fields=['deleted', 'dependents', 'queued_at'],
+    )
+
+
+def queue_update(book_id):
+    """Inscrit un livre modifié dans la file (dans la transaction de la sauvegarde)"""
+    _queue(SimilarityUpdate(book_id=book_id))
+
+
+def queue_removal(book_id, dependents):
+    """Inscrit un livre supprimé et les livres qui l'avaient pour voisin"""
+    _queue(SimilarityUpdate(book_id=book_id, deleted=True, dependents=list(dependents)))
+
+
+def _replace_rows(matrix, vectors):
+    """`matrix` dont les lignes {position: vecteur} sont remplacées (sans copie ligne à ligne)"""
+    positions = sorted(vectors)
+    keep = np.ones(matrix.shape[0], dtype=np.float32)
+    keep[positions] = 0
+    placement = sparse.csr_matrix(
+        (np.ones(len(positions), dtype=np.float32), (positions, np.arange(len(positions)))),
+        shape=(matrix.shape[0], len(positions)),
+    )
+    new_rows = sparse.vstack([vectors[p] for p in positions], format='csr')
+    return (sparse.diags(keep) @ matrix + placement @ new_rows).tocsr()
+
+
+def apply_pending(k=TOP_K, batch_size=500):
+    """
+    Applique un lot de la file SimilarityUpdate : le store est chargé et
+    réécrit une fois par lot, pas une fois par sauvegarde. Retourne le nombre
+    de livres traités.
+    """
+    with file_lock(STORE_NAME):
+        pending = list(SimilarityUpdate.objects.order_by('queued_at')[:batch_size])
+        if not pending:
+            return 0
+        store = SimilarityStore.load()
+        if store is not None:
+            _apply(store, pending, k)
+            store.save()
+        # Un livre réinscrit pendant le lot (queued_at plus récent) reste dans la file
+        done = Q()
+        for update in pending:
+            done |= Q(book_id=update.book_id, queued_at=update.queued_at)
+        SimilarityUpdate.objects.filter(done).delete()
+    return len(pending)
+
+
+def _apply(store, pending, k):
+    affected = set()
+
+    # 1. Livres supprimés
+    removed = {update.book_id for update in pending if update.deleted}
+    dependents = {book_id for update in pending if update.deleted for book_id in update.dependents}
+    if removed:
+        keep = ~np.isin(store.ids, list(removed))
+        store.ids, store.digests, store.thresholds = store.ids[keep], store.digests[keep], store.thresholds[keep]
+        store.matrix = store.matrix[keep]
+
+    # 2. Livres modifiés dont le texte a changé (nouveaux livres ajoutés en fin de store)
+    books = Book.objects.filter(id__in=[u.book_id for u in pending if not u.deleted]).only(
+        'id', 'genre', 'file', 'content'
+    )
+    changed, added = {}, []
+    for book in books:
+        document = book_document(book)
+        digest = document_digest(document).encode()
+        position = store.position(book.id)
+        if position is not None and store.digests[position] == digest:
+            continue
+        counts = term_counts([document])
+        if position is None:
+            store.df += document_frequencies(counts)
+            store.n_docs += 1
+            position = len(store.ids) + len(added)
+            added.append((book.id, digest))
+        else:
+            store.digests[position] = digest
+        changed[position] = counts
+    if added:
+        store.ids = np.append(store.ids, [book_id for book_id, _ in added])
+        store.digests = np.append(store.digests, np.array([digest for _, digest in added], dtype='S40'))
+        store.thresholds = np.append(store.thresholds, np.zeros(len(added), dtype=np.float32))
+        store.matrix = sparse.vstack(
+            [store.matrix, sparse.csr_matrix((len(added), N_FEATURES), dtype=np.float32)], format='csr'
+        )
+    if changed:
+        vectors = {position: weight_rows(counts, store.df, store.n_docs) for position, counts in changed.items()}
+        store.matrix = _replace_rows(store.matrix, vectors)
+
+        # Livres concernés : ceux dont un livre modifié entre dans le top-K, et ceux qui l'avaient déjà
+        for position, vector in vectors.items():
+            scores = (vector @ store.matrix.T).toarray()[0]
+            scores[position] = 0
+            affected.update(np.nonzero(scores > store.thresholds)[0].tolist())
+        dependents.update(
+            BookSimilarity.objects.filter(similar_book_id__in=[int(store.ids[p]) for p in changed])
+            .values_list('book_id', flat=True)
+        )
+        affected.update(changed)
+
+    affected.update(p for p in map(store.position, dependents) if p is not None)
+    if affected:
+        _recompute(store, sorted(affected), k)
+
+
+def _recompute(store, positions, k):
+    positions = np.array(positions, dtype=np.int64)
+    indices, scores = top_neighbors(store.matrix[positions], store.matrix, positions, k)
+    _save_neighbors(store, positions, indices, scores)
+
+
+def similar_books(book_id, top_n=5):
+    """Livres les plus proches de book_id : une seule requête sur l'index (book, rank)"""
+    return [
+        similarity.similar_book
+        for similarity in BookSimilarity.objects.filter(book_id=book_id)
+        .select_related('similar_book').order_by('rank')[:top_n]
+    ]
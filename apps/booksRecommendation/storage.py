@@ -0,0 +1,68 @@
+"""
+Fichiers de données des recommandations (RECOMMENDER_DATA_DIR).
+
+Les écritures passent par un fichier temporaire puis os.replace : un lecteur
+ne voit jamais un fichier partiel. Les mises à jour lecture-modification-
+écriture se font sous un verrou inter-processus (flock).
+"""
+import fcntl
+import os
+import pickle
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+def data_path(name):
+    return os.path.join(settings.RECOMMENDER_DATA_DIR, name)
+
+
+@contextmanager
+def file_lock(name):
+    """Verrou exclusif associé au fichier `name`"""
+    os.makedirs(settings.RECOMMENDER_DATA_DIR, exist_ok=True)
+    with open(data_path(name + '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_path(name):
+    """Chemin temporaire à remplir ; remplace `name` à la sortie du bloc"""
+    path = data_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    root, extension = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{extension}"   # np.savez ajoute .npz s'il manque
+    yield tmp_path
+    os.replace(tmp_path, path)
+
+
+def save_pickle(name, value):
+    with atomic_path(name) as path, open(path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class CachedFile:
+    """Objet chargé depuis un fichier, rechargé seulement quand le fichier change"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._mtime = None
+        self._value = None
+
+    def get(self):
+        try:
+            stat = os.stat(data_path(self.name))
+        except FileNotFoundError:
+            return None
+        # os.replace installe toujours un nouvel inode : deux écritures dans le même
+        # tic d'horloge (même mtime) sont quand même distinguées
+        mtime = (stat.st_mtime_ns, stat.st_ino)
+        if mtime != self._mtime:
+            self._value = self.loader(data_path(self.name))
+            self._mtime = mtime
+        return self._value
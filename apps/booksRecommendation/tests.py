@@ -1,3 +1,429 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.book.models import Book, BookEmbedding
+from apps.book.signals import embeddings_updated
+from . import ann, events, interactions, train_recommender, trending
+from .affinity import PAGE_SIZE, genre_scores, ranked_candidates
+from .evaluation import synthetic_dataset
+from .interactions import InteractionMatrix, interaction_weight
+from .management.commands.rebuild_ann_index import synthetic_vectors
+from .models import (
+    AnnUpdate, BookActivity, BookPopularity, BookSimilarity, InteractionEvent, SimilarityUpdate, UserGenreAffinity,
+    UserInteraction,
+)
+from .rollup import SETTLE_DELAY, rollup
+from .similarity import SimilarityStore, apply_pending, rebuild_all
+from .storage import data_path
+
+
+def use_data_dir(test_case):
+    """RECOMMENDER_DATA_DIR temporaire pour la durée du test"""
+    data_dir = tempfile.TemporaryDirectory()
+    test_case.addCleanup(data_dir.cleanup)
+    settings_override = override_settings(RECOMMENDER_DATA_DIR=data_dir.name)
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+
+
+def small_dataset(seed=0):
+    """Petit jeu synthétique d'evaluation.py (60 utilisateurs, 120 livres)"""
+    return synthetic_dataset(np.random.default_rng(seed), n_users=60, n_books=120, per_user=8, n_clusters=4)
+
+
+class SimilarityQueueTests(TestCase):
+
+    def setUp(self):
+        use_data_dir(self)
+        self.author = get_user_model().objects.create_user('auteur', password='x')
+
+    def create_book(self, title, content):
+        return Book.objects.create(title=title, synopsis='-', genre='fantasy', status='termine',
+                                   author=self.author, content=content)
+
+    def neighbors(self, book):
+        return list(BookSimilarity.objects.filter(book=book).values_list('similar_book__title', flat=True))
+
+    def test_saves_are_queued_then_applied_in_batch(self):
+        dragon = self.create_book('Dragon', 'dragon castle knight sword dragon fire')
+        self.create_book('Sea', 'ocean ship sailor storm wave harbour')
+        rebuild_all()
+        self.assertFalse(SimilarityUpdate.objects.exists())
+        stored_at = SimilarityStore.load().ids.tolist()
+
+        knight = self.create_book('Knight', 'knight sword castle dragon battle')
+        sailor = self.create_book('Sailor', 'sailor ship ocean harbour')
+        # La sauvegarde n'écrit que la file, pas le store
+        self.assertEqual(SimilarityUpdate.objects.count(), 2)
+        self.assertEqual(SimilarityStore.load().ids.tolist(), stored_at)
+
+        self.assertEqual(apply_pending(), 2)
+        self.assertFalse(SimilarityUpdate.objects.exists())
+        self.assertEqual(self.neighbors(knight)[0], 'Dragon')
+        self.assertEqual(self.neighbors(sailor)[0], 'Sea')
+        self.assertIn('Knight', self.neighbors(dragon))
+
+        knight.delete()
+        self.assertEqual(apply_pending(), 1)
+        self.assertNotIn(knight.id, SimilarityStore.load().ids.tolist())
+        self.assertNotIn('Knight', self.neighbors(dragon))
+
+
+class IVFIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = synthetic_vectors(rng, 3000, 32, noise=1.0, clusters=50)
+        self.ids = np.arange(len(self.vectors))
+        self.queries = rng.choice(len(self.vectors), size=100, replace=False)
+        self.ivf = ann.IVFIndex()
+        self.ivf.add(self.ids, self.vectors)
+        self.assertTrue(self.ivf.needs_training())
+        self.ivf.train()
+
+    def test_recall_against_exact_search(self):
+        exact = ann.ExactIndex()
+        exact.add(self.ids, self.vectors)
+        recall = np.mean([
+            len(set(exact.search(self.vectors[q], 10, exclude=[q])[0].tolist())
+                & set(self.ivf.search(self.vectors[q], 10, exclude=[q])[0].tolist())) / 10
+            for q in self.queries
+        ])
+        self.assertGreaterEqual(recall, 0.9)
+
+    def test_insert_and_delete_keep_the_trained_lists(self):
+        centroids = self.ivf.centroids
+        new_ids = np.arange(10000, 10010)
+        added = synthetic_vectors(np.random.default_rng(1), 11, 32, noise=1.0)
+        self.ivf.add(new_ids, added[:10])
+        self.ivf.add([5], added[10])   # remplacement d'un vecteur existant
+        self.assertIs(self.ivf.centroids, centroids)   # pas de réentraînement à l'insertion
+        self.assertFalse(self.ivf.needs_training())
+        self.assertEqual(len(self.ivf.assignments), len(self.ivf))
+        self.assertEqual(len(self.ivf), 3010)
+        for item_id, vector in zip([*new_ids, 5], added):
+            self.assertEqual(self.ivf.search(vector, 1)[0].tolist(), [item_id])
+
+        self.ivf.remove(new_ids[:5])
+        self.assertEqual(len(self.ivf.assignments), len(self.ivf))
+        for item_id, vector in zip(new_ids, added):
+            self.assertEqual(item_id in self.ivf.search(vector, 1)[0], item_id in new_ids[5:])
+
+        # Après suppression, chaque vecteur reste dans la liste de son centroïde le plus proche
+        expected = np.argmax(self.ivf.vectors @ centroids.T, axis=1)
+        np.testing.assert_array_equal(self.ivf.assignments, expected)
+
+
+@override_settings(RECOMMENDER_ANN_BACKEND='exact')
+class AnnQueueTests(TestCase):
+
+    def setUp(self):
+        use_data_dir(self)
+        self.author = get_user_model().objects.create_user('auteur', password='x')
+
+    def create_book(self, title, vector):
+        book = Book.objects.create(title=title, synopsis='-', genre='fantasy', status='termine',
+                                   author=self.author)
+        vector = ann.normalize(vector)[0]
+        BookEmbedding.objects.create(book=book, position=0, content_hash=title,
+                                     vector=vector.astype(np.float16).tobytes())
+        embeddings_updated.send(sender=Book, book=book, vector=vector)
+        return book
+
+    def test_updates_are_queued_then_applied_to_a_copy(self):
+        first = self.create_book('Un', [1, 0, 0])
+        second = self.create_book('Deux', [0.9, 0.1, 0])
+        third = self.create_book('Trois', [0, 0, 1])
+        self.assertEqual(AnnUpdate.objects.count(), 3)
+        self.assertIsNone(ann.get_index('books'))   # rien n'est écrit avant le worker
+
+        self.assertEqual(ann.apply_pending(), 3)
+        self.assertFalse(AnnUpdate.objects.exists())
+        index = ann.get_index('books')
+        self.assertEqual(sorted(index.ids.tolist()), sorted([first.id, second.id, third.id]))
+        self.assertEqual(ann.similar_book_ids(first.id, top_n=1), [second.id])
+
+        second.delete()
+        self.assertEqual(AnnUpdate.objects.get().deleted, True)
+        self.assertEqual(ann.apply_pending(), 1)
+        self.assertEqual(len(index), 3)   # l'index déjà servi n'est pas modifié en place
+        self.assertNotIn(second.id, ann.get_index('books').ids.tolist())
+        self.assertEqual(ann.similar_book_ids(first.id, top_n=1), [third.id])
+
+
+class InteractionRollupTests(TestCase):
+
+    def setUp(self):
+        use_data_dir(self)
+        self.addCleanup(events.flush)
+        User = get_user_model()
+        self.reader = User.objects.create_user('lecteur', password='x')
+        self.other = User.objects.create_user('autre', password='x')
+        self.fantasy, self.romance = (
+            Book.objects.create(title=genre, synopsis='-', genre=genre, status='termine', author=self.reader)
+            for genre in ('fantasy', 'romance')
+        )
+
+    def settle(self):
+        InteractionEvent.objects.update(created_at=timezone.now() - SETTLE_DELAY - timedelta(seconds=1))
+
+    def aggregates(self):
+        return (
+            sorted(UserInteraction.objects.values_list('user_id', 'book_id', 'viewed', 'added_to_cart', 'favorited')),
+            sorted(UserGenreAffinity.objects.values_list('user_id', 'scores')),
+            sorted(BookPopularity.objects.values_list('book_id', 'views', 'carts', 'favorites', 'purchases')),
+        )
+
+    def test_events_are_buffered_flushed_and_rolled_up_once(self):
+        events.record_event(self.reader.id, self.fantasy.id, InteractionEvent.VIEW)
+        events.record_event(self.reader.id, self.fantasy.id, InteractionEvent.CART)
+        events.record_event(self.other.id, self.fantasy.id, InteractionEvent.VIEW)
+        events.record_event(self.reader.id, self.romance.id, InteractionEvent.FAVORITE)
+        # Rien n'est écrit pendant la requête ; le minuteur écrira le tampon
+        self.assertFalse(InteractionEvent.objects.exists())
+        self.assertEqual(events._timer.interval, events.FLUSH_INTERVAL)
+        self.assertEqual(events.flush(), 4)
+        self.assertIsNone(events._timer)
+        self.assertEqual(InteractionEvent.objects.count(), 4)
+
+        self.assertEqual(rollup(), 0)   # événements trop récents : un plus ancien peut encore arriver
+        self.settle()
+        self.assertEqual(rollup(), 4)
+        aggregates = self.aggregates()
+        self.assertEqual(rollup(), 0)
+        self.assertEqual(self.aggregates(), aggregates)   # pas de double comptage
+
+        self.assertEqual(aggregates[0], sorted([
+            (self.reader.id, self.fantasy.id, True, True, False),
+            (self.reader.id, self.romance.id, False, False, True),
+            (self.other.id, self.fantasy.id, True, False, False),
+        ]))
+        self.assertEqual(UserGenreAffinity.objects.get(user=self.reader).scores, {
+            'fantasy': interaction_weight(viewed=True, added_to_cart=True),
+            'romance': interaction_weight(favorited=True),
+        })
+        self.assertEqual(aggregates[2], sorted([(self.fantasy.id, 2, 1, 0, 0), (self.romance.id, 0, 0, 1, 0)]))
+
+        # Un nouvel événement après le point de reprise n'est compté qu'une fois
+        events.record_event(self.other.id, self.fantasy.id, InteractionEvent.VIEW)
+        events.flush()
+        self.settle()
+        self.assertEqual(rollup(), 1)
+        self.assertEqual(rollup(), 0)
+        self.assertEqual(BookPopularity.objects.get(book=self.fantasy).views, 3)
+        self.assertEqual(UserInteraction.objects.count(), 3)
+
+    def test_full_buffer_is_written_at_once(self):
+        with mock.patch.object(events, 'FLUSH_SIZE', 3):
+            for _ in range(2):
+                events.record_event(self.reader.id, self.fantasy.id, InteractionEvent.VIEW)
+            self.assertFalse(InteractionEvent.objects.exists())
+            events.record_event(self.reader.id, self.fantasy.id, InteractionEvent.VIEW)
+        self.assertEqual(InteractionEvent.objects.count(), 3)
+        self.assertEqual(events.flush(), 0)
+
+
+class GenreRecommendationQueryTests(TestCase):
+    """Le nombre de requêtes ne dépend pas de la longueur de l'historique"""
+
+    def setUp(self):
+        User = get_user_model()
+        author = User.objects.create_user('auteur', password='x')
+        genres = ['fantasy', 'romance', 'policier']
+        books = [
+            Book.objects.create(title=f'Livre {i}', synopsis='-', genre=genres[i % 3], status='termine',
+                                author=author)
+            for i in range(80)
+        ]
+        self.short = User.objects.create_user('court', password='x')
+        self.long = User.objects.create_user('long', password='x')
+        UserInteraction.objects.create(user=self.short, book=books[0], viewed=True)
+        UserInteraction.objects.bulk_create([
+            UserInteraction(user=self.long, book=book, viewed=True, favorited=i % 2 == 0)
+            for i, book in enumerate(books[:60])
+        ])
+        scores = {'fantasy': 12.0, 'romance': 5.0, 'policier': 1.0}
+        for user in (self.short, self.long):
+            UserGenreAffinity.objects.create(user=user, scores=scores)
+
+    def test_ranked_candidates(self):
+        for user in (self.short, self.long):
+            scores = genre_scores(user.id)
+            with self.assertNumQueries(2):
+                page = Paginator(ranked_candidates(user.id, scores), PAGE_SIZE).get_page(2)
+                self.assertEqual(len(list(page)), PAGE_SIZE)
+
+    def test_view(self):
+        for user in (self.short, self.long):
+            self.client.force_login(user)
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse('recommended_books'), {'page': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['page_obj']), PAGE_SIZE)
+
+
+class InteractionMatrixTests(SimpleTestCase):
+
+    def setUp(self):
+        use_data_dir(self)
+        dataset = small_dataset()
+        self.triples = list(zip(
+            (dataset.users + 1).tolist(), (dataset.books + 1).tolist(), dataset.weights.astype(int).tolist(),
+        ))
+
+    def assertMatrixEqual(self, matrix, expected):
+        np.testing.assert_array_equal(matrix.user_ids, expected.user_ids)
+        np.testing.assert_array_equal(matrix.book_ids, expected.book_ids)
+        np.testing.assert_array_equal(matrix.matrix.toarray(), expected.matrix.toarray())
+
+    def test_deltas_are_merged_into_the_base(self):
+        half = len(self.triples) // 2
+        InteractionMatrix.from_triples(*zip(*self.triples[:half])).save()
+        # Nouveaux couples, poids mis à jour et interaction retirée (poids 0)
+        user_id, book_id, _ = self.triples[0]
+        deltas = self.triples[half:] + [(user_id, book_id, 0), (999, 1, 2)]
+        interactions.record_interactions(deltas[:-1])
+        interactions.record_interaction(*deltas[-1])
+        self.assertEqual(len(InteractionMatrix.load_base().user_ids), len({u for u, _, _ in self.triples[:half]}))
+
+        expected = InteractionMatrix.from_triples(*zip(*(self.triples[:half] + deltas)))
+        merged = interactions.compact()
+        self.assertMatrixEqual(merged, expected)
+        self.assertMatrixEqual(InteractionMatrix.load_base(), expected)
+        self.assertEqual(merged.matrix[np.searchsorted(merged.user_ids, user_id),
+                                      np.searchsorted(merged.book_ids, book_id)], 0)
+        self.assertIn(999, merged.user_ids)
+
+        # Deltas vidés : une seconde compaction ne change rien
+        self.assertMatrixEqual(interactions.compact(), expected)
+
+
+@override_settings(RECOMMENDER_ANN_BACKEND='exact')
+class ALSFactorsTests(TestCase):
+
+    def setUp(self):
+        use_data_dir(self)
+        train, _ = small_dataset().split()
+        self.user_ids = np.arange(1, train.shape[0] + 1) * 10
+        self.book_ids = np.arange(1, train.shape[1] + 1)
+        self.versions = [
+            train_recommender.fit_als(train, factors=8, iterations=3, seed=seed) for seed in range(3)
+        ]
+
+    def expected(self, version, row, n=5):
+        user_factors, item_factors = self.versions[version]
+        scores = item_factors @ user_factors[row]
+        return [int(self.book_ids[i]) for i in np.argsort(-scores, kind='stable')[:n] if scores[i] > 0]
+
+    def published(self):
+        return sorted(name for name in os.listdir(data_path('')) if name.startswith('als-'))
+
+    def test_versions_are_published_then_loaded(self):
+        self.assertEqual(train_recommender.recommend(self.user_ids[0]), [])   # rien de publié
+        user_id = int(self.user_ids[7])
+        for version, (user_factors, item_factors) in enumerate(self.versions):
+            train_recommender.publish_factors(self.user_ids, self.book_ids, user_factors, item_factors)
+            with open(data_path(train_recommender.CURRENT_NAME)) as f:
+                self.assertEqual(f.read(), self.published()[-1])
+            # Le processus déjà chargé bascule sur la nouvelle version
+            self.assertEqual(train_recommender.recommend(user_id), self.expected(version, 7))
+        self.assertEqual(len(self.published()), 2)   # la version précédente est gardée, pas les autres
+        self.assertEqual(sorted(ann.get_index('users').ids.tolist()), self.user_ids.tolist())
+
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        author = get_user_model().objects.create_user('auteur', password='x')
+        dataset = small_dataset()
+        self.books = [
+            Book.objects.create(title=f'Livre {i}', synopsis='-', genre='fantasy', status='termine', author=author)
+            for i in range(dataset.n_books)
+        ]
+        self.now = datetime(2026, 10, 18, 12, 30, tzinfo=dt_timezone.utc)
+        start = self.now - timedelta(days=60)
+        kinds = {1: InteractionEvent.VIEW, 2: InteractionEvent.CART, 3: InteractionEvent.FAVORITE}
+        self.events = [
+            (i, int(user), self.books[book].id, kinds[int(weight)], start + timedelta(seconds=float(seconds)))
+            for i, (user, book, weight, seconds) in enumerate(
+                zip(dataset.users, dataset.books, dataset.weights, dataset.times)
+            )
+        ]
+        trending.add_to_buckets(self.events, now=start)   # tout arrive en tranches horaires
+
+    def expected_scores(self):
+        """Score de chaque livre recalculé événement par événement"""
+        cutoff = trending._hourly_cutoff(self.now)
+        scores = {}
+        for _, _, book_id, kind, created_at in self.events:
+            if created_at >= cutoff:
+                period, bucket = BookActivity.HOUR, created_at.replace(minute=0, second=0, microsecond=0)
+            else:
+                period, bucket = BookActivity.DAY, trending._day_start(created_at)
+                if bucket < self.now - trending.DAILY_RETENTION:
+                    continue
+            age = self.now - bucket - trending.PERIODS[period] / 2
+            weight = trending.TRENDING_WEIGHTS[trending.COUNTERS[kind]]
+            scores[book_id] = scores.get(book_id, 0) + weight * 0.5 ** (age / trending.HALF_LIFE)
+        return scores
+
+    def test_compaction_then_decayed_scores(self):
+        hours = BookActivity.objects.filter(period=BookActivity.HOUR).count()
+        cutoff = trending._hourly_cutoff(self.now)
+        old_hours = BookActivity.objects.filter(period=BookActivity.HOUR, start__lt=cutoff).count()
+        merged, expired = trending.compact(now=self.now)
+        self.assertEqual(merged, old_hours)
+        self.assertGreater(expired, 0)
+        self.assertEqual(BookActivity.objects.filter(period=BookActivity.HOUR).count(), hours - merged)
+        self.assertFalse(BookActivity.objects.filter(period=BookActivity.HOUR, start__lt=cutoff).exists())
+        self.assertFalse(BookActivity.objects.filter(start__lt=self.now - trending.DAILY_RETENTION).exists())
+
+        expected = self.expected_scores()
+        self.assertEqual(trending.update_scores(now=self.now), len(expected))
+        scores = dict(BookPopularity.objects.filter(trending__gt=0).values_list('book_id', 'trending'))
+        self.assertEqual(set(scores), set(expected))
+        for book_id, score in expected.items():
+            self.assertAlmostEqual(scores[book_id], score, places=6)
+        self.assertEqual(
+            list(trending.trending_books().values_list('id', flat=True)),
+            sorted(expected, key=lambda book_id: (-scores[book_id], -book_id)),
+        )
+
+
+class DatasetSplitTests(SimpleTestCase):
+
+    def test_split_does_not_leak_test_interactions(self):
+        dataset = small_dataset()
+        train, truth = dataset.split(test_fraction=0.2)
+        cutoff = np.quantile(dataset.times, 0.8)
+        past = dataset.times < cutoff
+        self.assertEqual(train.shape, (dataset.n_users, dataset.n_books))
+
+        # Entraînement : exactement les couples vus avant la coupure
+        coo = train.tocoo()
+        self.assertEqual(set(zip(coo.row.tolist(), coo.col.tolist())),
+                         set(zip(dataset.users[past].tolist(), dataset.books[past].tolist())))
+        self.assertLessEqual(train.data.max(), sum(interactions.WEIGHTS.values()))   # doublons bornés
+
+        # Vérité : livres découverts après la coupure, jamais présents dans l'entraînement
+        later = set(zip(dataset.users[~past].tolist(), dataset.books[~past].tolist()))
+        self.assertTrue(truth)
+        for user, books in truth.items():
+            seen = set(train.indices[train.indptr[user]:train.indptr[user + 1]].tolist())
+            self.assertTrue(seen)   # utilisateur connu à l'entraînement
+            self.assertTrue(books)
+            self.assertFalse(books & seen)
+            self.assertTrue(all((user, book) in later for book in books))
+        self.assertEqual(
+            {(user, book) for user, books in truth.items() for book in books},
+            {(user, book) for user, book in later if train[user].nnz and not train[user, book]},
+        )
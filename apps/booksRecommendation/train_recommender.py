@@ -1,22 +1,165 @@
-import pandas as pd
-from implicit.als import AlternatingLeastSquares
-from scipy.sparse import coo_matrix
-from apps.book.models import Book, User
-
-def train_als_model():
-    user_book_data = []
-    for user in User.objects.all():
-        for book in user.favorite_books.all():
-            user_book_data.append((user.id, book.id, 1))  # interaction = 1 si favori
-
-    df = pd.DataFrame(user_book_data, columns=["user_id", "book_id", "interaction"])
-
-    # Sparse matrix items × users
-    sparse_matrix = coo_matrix(
-        (df['interaction'], (df['book_id'], df['user_id']))
+"""
+Modèle ALS (moindres carrés alternés, retours implicites) et service associé.
+
+- entraînement sur la matrice d'interactions compacte (interactions.py) : les
+  lignes/colonnes sont des indices 0..n-1, pas les identifiants de la base ;
+- `implicit` est utilisé s'il est installé, sinon une implémentation NumPy ;
+- facteurs sauvegardés en .npy dans un dossier versionné (als-<horodatage>),
+  le fichier `als.current` désigne la version servie ;
+- recommend(user_id, n) : un produit matrice-vecteur avec les facteurs livres.
+  Un utilisateur absent de l'entraînement est projeté à partir de ses
+  interactions actuelles (fold-in).
+- les facteurs utilisateurs alimentent aussi l'index ANN `users` (ann.py),
+  utilisé pour trouver les utilisateurs proches.
+"""
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from apps.book.models import Book
+from . import ann
+from .collaborative import user_vector
+from .interactions import compact, rebuild_matrix
+from .storage import CachedFile, atomic_path, data_path
+
+try:
+    from implicit.als import AlternatingLeastSquares
+except ImportError:
+    AlternatingLeastSquares = None
+
+logger = logging.getLogger(__name__)
+
+FACTORS = 64
+REGULARIZATION = 0.1
+ITERATIONS = 15
+ALPHA = 10.0           # confiance : 1 + ALPHA * poids de l'interaction
+CURRENT_NAME = 'als.current'
+ARRAYS = ('user_ids', 'book_ids', 'user_factors', 'item_factors')
+
+
+def _solve_rows(matrix, fixed, regularization, alpha):
+    """Facteurs optimaux de chaque ligne de `matrix`, les facteurs `fixed` étant figés"""
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors, dtype=fixed.dtype)
+    solved = np.zeros((matrix.shape[0], factors), dtype=fixed.dtype)
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        items = fixed[matrix.indices[start:end]]
+        confidence = alpha * matrix.data[start:end]
+        a = gram + (items.T * confidence) @ items
+        b = items.T @ (1 + confidence)
+        solved[row] = np.linalg.solve(a, b)
+    return solved
+
+
+def als_numpy(matrix, factors=FACTORS, regularization=REGULARIZATION, iterations=ITERATIONS,
+              alpha=ALPHA, seed=0):
+    """ALS implicite (Hu, Koren, Volinsky) sans dépendance : une résolution k x k par ligne"""
+    rng = np.random.default_rng(seed)
+    user_items = matrix.tocsr()
+    item_users = matrix.T.tocsr()
+    user_factors = rng.normal(scale=0.01, size=(matrix.shape[0], factors)).astype(np.float32)
+    item_factors = rng.normal(scale=0.01, size=(matrix.shape[1], factors)).astype(np.float32)
+    for _ in range(iterations):
+        user_factors = _solve_rows(user_items, item_factors, regularization, alpha)
+        item_factors = _solve_rows(item_users, user_factors, regularization, alpha)
+    return user_factors, item_factors
+
+
+def als_implicit(matrix, factors=FACTORS, regularization=REGULARIZATION, iterations=ITERATIONS,
+                 alpha=ALPHA, seed=0):
+    model = AlternatingLeastSquares(
+        factors=factors, regularization=regularization, iterations=iterations, random_state=seed
+    )
+    model.fit((matrix * alpha).tocsr(), show_progress=False)  # utilisateurs x livres (implicit >= 0.5)
+    if hasattr(model, 'to_cpu'):
+        model = model.to_cpu()
+    return np.asarray(model.user_factors, dtype=np.float32), np.asarray(model.item_factors, dtype=np.float32)
+
+
+def fit_als(matrix, **params):
+    """Facteurs (utilisateurs, livres) : `implicit` s'il est installé, sinon NumPy"""
+    train = als_implicit if AlternatingLeastSquares is not None else als_numpy
+    return train(matrix, **params)
+
+
+def train_als_model(rebuild=False, factors=FACTORS, regularization=REGULARIZATION,
+                    iterations=ITERATIONS, alpha=ALPHA):
+    """Entraîne l'ALS sur la matrice d'interactions et publie les facteurs ; retourne la matrice"""
+    interactions = rebuild_matrix() if rebuild else compact()
+    if interactions.matrix.nnz == 0:
+        return None
+    user_factors, item_factors = fit_als(
+        interactions.matrix, factors=factors, regularization=regularization,
+        iterations=iterations, alpha=alpha,
     )
+    publish_factors(interactions.user_ids, interactions.book_ids, user_factors, item_factors)
+    return interactions
+
+
+def publish_factors(user_ids, book_ids, user_factors, item_factors):
+    """Écrit une nouvelle version des facteurs puis bascule `als.current` dessus"""
+    version = f"als-{time.time_ns()}"
+    directory = data_path(version)
+    os.makedirs(directory)
+    arrays = dict(user_ids=user_ids, book_ids=book_ids, user_factors=user_factors, item_factors=item_factors)
+    for name in ARRAYS:
+        np.save(os.path.join(directory, f"{name}.npy"), arrays[name])
+    with atomic_path(CURRENT_NAME) as path, open(path, 'w') as f:
+        f.write(version)
+    ann.build_index('users', user_ids, user_factors)
+
+    # Anciennes versions : gardées une génération pour les processus qui les lisent encore
+    versions = sorted(name for name in os.listdir(data_path('')) if name.startswith('als-'))
+    for old in versions[:-2]:
+        shutil.rmtree(data_path(old), ignore_errors=True)
+
+
+def _load_factors(path):
+    with open(path) as f:
+        directory = data_path(f.read().strip())
+    return {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        for name in ARRAYS
+    }
+
+
+_factors = CachedFile(CURRENT_NAME, _load_factors)
+
+
+def recommend(user_id, n=5, regularization=REGULARIZATION, alpha=ALPHA):
+    """Identifiants des n livres les mieux notés par l'ALS pour cet utilisateur"""
+    model = _factors.get()
+    if model is None:
+        logger.info("Facteurs ALS absents : lancer train_user_recommender --engine als")
+        return []
+    user_ids, book_ids, item_factors = model['user_ids'], model['book_ids'], model['item_factors']
+
+    vector, seen = user_vector(user_id, book_ids)
+    row = np.searchsorted(user_ids, user_id)
+    if row < len(user_ids) and user_ids[row] == user_id:
+        factors = np.asarray(model['user_factors'][row])
+    elif vector.nnz:
+        factors = _solve_rows(vector, np.asarray(item_factors), regularization, alpha)[0]
+    else:
+        return []
+
+    scores = item_factors @ factors
+    scores[seen] = -np.inf
+    count = min(n, len(scores))
+    if count == 0:
+        return []
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [int(book_ids[i]) for i in top if scores[i] > 0]
 
-    model = AlternatingLeastSquares(factors=20, regularization=0.1, iterations=20)
-    model.fit(sparse_matrix)
 
-    return model, sparse_matrix
+def recommend_books(user_id, top_n=5):
+    ids = recommend(user_id, top_n)
+    books = Book.objects.in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books]
@@ -0,0 +1,145 @@
+"""
+Livres tendance : interactions comptées par tranches horaires (BookActivity),
+compactées en tranches journalières, et score à décroissance exponentielle.
+
+- rollup_interactions ajoute chaque lot d'événements aux tranches horaires ;
+- update_trending (horaire) compacte en jours les heures de plus de
+  HOURLY_RETENTION, supprime les jours de plus de DAILY_RETENTION puis
+  recalcule BookPopularity.trending en une requête d'agrégation :
+  somme des interactions pondérées x 0.5 ** (âge de la tranche / HALF_LIFE).
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Sum, Value, When
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from apps.book.models import Book
+from .models import BookActivity, BookPopularity, InteractionEvent, UserInteraction
+
+HALF_LIFE = timedelta(hours=24)
+HOURLY_RETENTION = timedelta(hours=48)
+DAILY_RETENTION = timedelta(days=30)
+PERIODS = {BookActivity.HOUR: timedelta(hours=1), BookActivity.DAY: timedelta(days=1)}
+
+COUNTERS = {
+    InteractionEvent.VIEW: 'views',
+    InteractionEvent.CART: 'carts',
+    InteractionEvent.FAVORITE: 'favorites',
+    InteractionEvent.PURCHASE: 'purchases',
+}
+TRENDING_WEIGHTS = {'views': 1, 'carts': 2, 'favorites': 3, 'purchases': 5}
+
+
+def _day_start(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _hourly_cutoff(now):
+    """Début du premier jour encore tenu en tranches horaires"""
+    return _day_start(now - HOURLY_RETENTION)
+
+
+def add_to_buckets(events, now=None):
+    """Ajoute des événements (id, user, book, kind, created_at) aux tranches ; appelé par le rollup"""
+    cutoff = _hourly_cutoff(now or timezone.now())
+    counts = defaultdict(Counter)
+    for _, _, book_id, kind, created_at in events:
+        if kind not in COUNTERS:
+            continue
+        if created_at >= cutoff:
+            key = (book_id, BookActivity.HOUR, created_at.replace(minute=0, second=0, microsecond=0))
+        else:   # tranche déjà compactée
+            key = (book_id, BookActivity.DAY, _day_start(created_at))
+        counts[key][COUNTERS[kind]] += 1
+    _add_counts(counts)
+
+
+def _add_counts(counts):
+    """Incrémente (ou crée) les tranches {(book, period, start): Counter}"""
+    if not counts:
+        return
+    book_ids = {book_id for book_id, _, _ in counts}
+    existing = {
+        (row.book_id, row.period, row.start): row
+        for row in BookActivity.objects.filter(
+            book_id__in=book_ids, start__in={start for _, _, start in counts}
+        )
+    }
+    live = set(Book.objects.filter(id__in=book_ids).values_list('id', flat=True))
+    created, updated = [], []
+    for key, counter in counts.items():
+        if key[0] not in live:
+            continue
+        row = existing.get(key)
+        if row is None:
+            row = BookActivity(book_id=key[0], period=key[1], start=key[2])
+            created.append(row)
+        else:
+            updated.append(row)
+        for field, count in counter.items():
+            setattr(row, field, getattr(row, field) + count)
+    BookActivity.objects.bulk_create(created, batch_size=1000)
+    BookActivity.objects.bulk_update(updated, list(TRENDING_WEIGHTS), batch_size=1000)
+
+
+def compact(now=None):
+    """Fusionne en jours les tranches horaires anciennes ; supprime les jours trop anciens"""
+    now = now or timezone.now()
+    cutoff = _hourly_cutoff(now)
+    with transaction.atomic():
+        old_hours = BookActivity.objects.filter(period=BookActivity.HOUR, start__lt=cutoff)
+        rows = old_hours.annotate(day=TruncDay('start')).values('book_id', 'day').annotate(
+            **{field: Sum(field) for field in TRENDING_WEIGHTS}
+        )
+        counts = {
+            (row['book_id'], BookActivity.DAY, row['day']): Counter({field: row[field] for field in TRENDING_WEIGHTS})
+            for row in rows
+        }
+        _add_counts(counts)
+        merged = old_hours.delete()[0]
+        expired = BookActivity.objects.filter(period=BookActivity.DAY, start__lt=now - DAILY_RETENTION).delete()[0]
+    return merged, expired
+
+
+def update_scores(now=None):
+    """Recalcule BookPopularity.trending pour tous les livres ; retourne le nombre de livres actifs"""
+    now = now or timezone.now()
+    buckets = BookActivity.objects.values_list('period', 'start').distinct()
+    decay = Case(
+        *[
+            When(period=period, start=start,
+                 then=Value(0.5 ** ((now - start - PERIODS[period] / 2) / HALF_LIFE)))
+            for period, start in buckets
+        ],
+        default=Value(0.0), output_field=FloatField(),
+    )
+    weighted = sum(F(field) * weight for field, weight in TRENDING_WEIGHTS.items())
+    scores = dict(
+        BookActivity.objects.values('book_id')
+        .annotate(score=Sum(weighted * decay, output_field=FloatField()))
+        .values_list('book_id', 'score')
+    )
+
+    with transaction.atomic():
+        BookPopularity.objects.filter(trending__gt=0).update(trending=0)
+        rows = BookPopularity.objects.in_bulk(list(scores))
+        for book_id, score in scores.items():
+            rows.setdefault(book_id, BookPopularity(book_id=book_id)).trending = score
+        BookPopularity.objects.bulk_create(
+            [row for row in rows.values() if row._state.adding], batch_size=1000
+        )
+        BookPopularity.objects.bulk_update(
+            [row for row in rows.values() if not row._state.adding], ['trending'], batch_size=1000
+        )
+    return len(scores)
+
+
+def trending_books(exclude_user=None):
+    """Livres classés par score de tendance décroissant (queryset, à paginer ou découper)"""
+    books = Book.objects.filter(popularity__trending__gt=0).defer('content')
+    if exclude_user is not None:
+        books = books.filter(~Exists(UserInteraction.objects.filter(user=exclude_user, book_id=OuterRef('pk'))))
+    return books.order_by('-popularity__trending', '-id')
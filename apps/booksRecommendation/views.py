@@ -1,121 +1,50 @@
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from apps.book.models import Book
-from .models import UserInteraction
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.neighbors import NearestNeighbors
-import numpy as np
-from django.contrib.auth import get_user_model
-User = get_user_model()
+from .affinity import PAGE_SIZE, recommended_page
+from .ann import similar_book_ids
+from .collaborative import recommend_for_user
+from .similarity import similar_books
+from .train_recommender import recommend_books
+from .trending import trending_books
 @login_required
 def recommended_books(request):
-    user = request.user
-    interactions = UserInteraction.objects.filter(user=user)
-
-    genre_scores = {}
-    for interaction in interactions:
-        points = 0
-        if interaction.viewed:
-            points += 1
-        if interaction.added_to_cart:
-            points += 2
-        if interaction.favorited:
-            points += 3
-        genre = interaction.book.genre
-        genre_scores[genre] = genre_scores.get(genre, 0) + points
-
-    favorite_genres = sorted(genre_scores, key=genre_scores.get, reverse=True)
-
-    recommended_books = Book.objects.filter(
-        genre__in=favorite_genres
-    ).exclude(
-        userinteraction__user=user
-    ).distinct()[:10]
-
+    page, favorite_genres = recommended_page(request.user.id, request.GET.get('page'))
     context = {
-        "recommended_books": recommended_books,
+        "recommended_books": page,
+        "page_obj": page,
         "favorite_genres": favorite_genres,
     }
     return render(request, "booksRecommendation/recommended_books.html", context)
 
 def get_book_recommendations(book_id, top_n=5):
-    # Récupérer tous les livres depuis la base
-    books = Book.objects.all()
-    
-    # Construire un DataFrame
-    df = pd.DataFrame(list(books.values('id', 'title', 'content', 'genre')))
-    
-    # Combiner contenu et genre pour enrichir le texte
-    df['combined'] = df['content'] + ' ' + df['genre']
-    
-    # TF-IDF
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(df['combined'])
-    
-    # Calculer similarité cosine
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-    
-    # Trouver l'index du livre donné
-    idx = df.index[df['id'] == book_id].tolist()[0]
-    
-    # Trier les livres similaires
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    sim_scores = sim_scores[1:top_n+1]  # exclure le livre lui-même
-    
-    # Récupérer les IDs
-    book_indices = [i[0] for i in sim_scores]
-    return Book.objects.filter(id__in=df.iloc[book_indices]['id'].values)
-def build_interaction_matrix():
-    user_book_data = []
-
-    for user in User.objects.all():
-        for book in user.favorite_books.all():
-            user_book_data.append((user.id, book.id, 1))
-
-    # <--- Ajouter le print ici
-    print("User-Book Data:", user_book_data)
-
-    df = pd.DataFrame(user_book_data, columns=['user_id', 'book_id', 'interaction'])
-    if df.empty:
-        return pd.DataFrame()  # Aucun favori
-
-    user_book_matrix = df.pivot(index='user_id', columns='book_id', values='interaction').fillna(0)
-    return user_book_matrix
-
-
-def train_knn_model(user_book_matrix):
-    if user_book_matrix.empty:
-        return None
-
-    model = NearestNeighbors(metric='cosine', algorithm='brute')
-    model.fit(user_book_matrix)
-    return model
+    """
+    Livres similaires précalculés (voir similarity.py et rebuild_book_similarity).
+    Un livre pas encore traité par la reconstruction est servi par l'index ANN des embeddings.
+    """
+    books = similar_books(book_id, top_n=top_n)
+    if books:
+        return books
+    ids = similar_book_ids(book_id, top_n=top_n)
+    found = Book.objects.in_bulk(ids)
+    return [found[i] for i in ids if i in found]
+
+def trending(request):
+    """Livres tendance (score de trending.py), paginés"""
+    page = Paginator(trending_books(), PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, "booksRecommendation/trending.html", {"books": page, "page_obj": page})
 
 def get_user_recommendations(user_id, top_n=5):
-    user_book_matrix = build_interaction_matrix()
-    if user_book_matrix.empty or user_id not in user_book_matrix.index:
-        return []
-
-    model = train_knn_model(user_book_matrix)
-
-    # ne pas dépasser le nombre d'utilisateurs existants
-    n_neighbors = min(top_n + 1, len(user_book_matrix))
-
-    distances, indices = model.kneighbors(
-        [user_book_matrix.loc[user_id].values], n_neighbors=n_neighbors
-    )
-
-    neighbor_ids = [user_book_matrix.index[i] for i in indices[0] if user_book_matrix.index[i] != user_id]
-
-    recommended_books_ids = []
-    for neighbor in neighbor_ids:
-        neighbor_books = user_book_matrix.loc[neighbor]
-        unseen_books = neighbor_books[(neighbor_books > 0) & (user_book_matrix.loc[user_id] == 0)].index.tolist()
-        recommended_books_ids.extend(unseen_books)
-
-    recommended_books_ids = list(dict.fromkeys(recommended_books_ids))[:top_n]
-    return Book.objects.filter(id__in=recommended_books_ids)
-
+    """
+    Recommandations collaboratives servies par le modèle entraîné hors requête (RECOMMENDER_ENGINE).
+    Démarrage à froid (aucun favori, ou rien de recommandé) : livres tendance non encore vus.
+    """
+    books = []
+    if Book.favorites.through.objects.filter(user_id=user_id).exists():
+        if settings.RECOMMENDER_ENGINE == 'als':
+            books = recommend_books(user_id, top_n=top_n)
+        else:
+            books = recommend_for_user(user_id, top_n=top_n)
+    return books or list(trending_books(exclude_user=user_id)[:top_n])
@@ -2,9 +2,9 @@ from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 import stripe
-from apps.book.models import Book
 from apps.cart.models import Cart, CartItem, Order, OrderItem, UserLibrary
-from apps.booksRecommendation.models import UserInteraction
+from apps.booksRecommendation.events import record_event
+from apps.booksRecommendation.models import InteractionEvent
 from core import settings
 stripe.api_key = settings.STRIPE_SECRET_KEY
 @login_required(login_url="/login/")
@@ -30,10 +30,7 @@ def cart_user_view(request):
 def add_to_cart(request, book_id):
     user_cart, _ = Cart.objects.get_or_create(user=request.user)
     cart_item, _ = CartItem.objects.get_or_create(cart=user_cart, book_id=book_id)
-    book = Book.objects.get(id=book_id)
-    interaction, _ = UserInteraction.objects.get_or_create(user=request.user, book=book)
-    interaction.added_to_cart = True
-    interaction.save()
+    record_event(request.user.id, book_id, InteractionEvent.CART)
     return redirect('cart_user_view')
 
 
@@ -105,6 +102,7 @@ def checkout_success(request):
             price=item.book.price
         )
         UserLibrary.objects.get_or_create(user=request.user, book=item.book)
+        record_event(request.user.id, item.book_id, InteractionEvent.PURCHASE)
 
     # Supprimer les items du panier
     cart_items.delete()
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class CollaborationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.collaboration'
+
+    def ready(self):
+        import apps.collaboration.signals
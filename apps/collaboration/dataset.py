@@ -0,0 +1,96 @@
+"""
+Jeu de données des utilisateurs pour ml/ (commande export_user_dataset).
+
+Toutes les colonnes sont calculées par la base en une requête annotée
+(sous-requêtes d'agrégation, compteurs filtrés par statut, genres agrégés
+avec StringAgg sous PostgreSQL) et lues par morceaux avec un curseur serveur.
+
+Export incrémental : avec `since`, seuls les utilisateurs inscrits depuis,
+ou dont un livre écrit / en collaboration ou une réponse a changé depuis, ou
+ajoutés / retirés comme collaborateurs depuis (CollaboratorChange), sont relus ; la commande remplace leurs lignes dans l'export précédent
+(fusion par user_id). Les suppressions ne laissent pas de trace datée : un
+export complet de temps en temps reste nécessaire.
+"""
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from apps.book.models import Book
+from .models import CollaborationResponse, CollaboratorChange
+from .recommender import COUNT_COLUMNS, STATUS_COLUMNS
+
+COLUMNS = ['user_id', 'username', 'nbr_books_authored', 'genres_authored'] + COUNT_COLUMNS[1:]
+CHUNK_SIZE = 2000
+
+
+def _count(queryset, field):
+    """Sous-requête : nombre de lignes de `queryset` rattachées à l'utilisateur par `field`"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _uses_string_agg():
+    return connection.vendor == 'postgresql'
+
+
+def user_rows(since=None):
+    """Queryset des colonnes de COLUMNS (sauf les genres hors PostgreSQL), une ligne par utilisateur"""
+    users = get_user_model().objects.order_by('id')
+    if since is not None:
+        users = users.filter(
+            Q(date_joined__gte=since)
+            | Exists(Book.objects.filter(author=OuterRef('pk'), updated_at__gte=since))
+            | Exists(Book.objects.filter(collaborators=OuterRef('pk'), updated_at__gte=since))
+            | Exists(CollaborationResponse.objects.filter(responder=OuterRef('pk'), updated_at__gte=since))
+            | Exists(CollaboratorChange.objects.filter(user=OuterRef('pk'), changed_at__gte=since))
+        )
+
+    annotations = {
+        'user_id': F('pk'),
+        'nbr_books_authored': _count(Book.objects.all(), 'author'),
+        'nbr_books_collab': _count(Book.collaborators.through.objects.all(), 'user'),
+    }
+    # Les réponses sont la seule jointure : les compteurs par statut ne sont pas multipliés
+    annotations.update({
+        column: Count('collaborationresponse', filter=Q(collaborationresponse__status=status))
+        for status, column in STATUS_COLUMNS.items()
+    })
+    if _uses_string_agg():
+        from django.contrib.postgres.aggregates import StringAgg
+
+        genres = (
+            Book.objects.filter(author=OuterRef('pk')).exclude(genre='').order_by().values('author')
+            .annotate(genres=StringAgg('genre', delimiter=',', distinct=True, ordering='genre')).values('genres')
+        )
+        annotations['genres_authored'] = Coalesce(Subquery(genres), Value(''))
+    return users.annotate(**annotations).values_list(*(
+        column for column in COLUMNS if column != 'genres_authored' or _uses_string_agg()
+    ))
+
+
+def _genres_by_author(user_ids):
+    """{auteur: 'genre1,genre2'} pour un morceau d'utilisateurs (bases sans StringAgg)"""
+    genres = {}
+    for author_id, genre in (
+        Book.objects.filter(author_id__in=user_ids).exclude(genre='')
+        .values_list('author_id', 'genre').distinct().order_by('author_id', 'genre')
+    ):
+        genres.setdefault(author_id, []).append(genre)
+    return {author_id: ','.join(values) for author_id, values in genres.items()}
+
+
+def iter_chunks(since=None, chunk_size=CHUNK_SIZE):
+    """Morceaux de lignes (tuples dans l'ordre de COLUMNS), lus avec un curseur serveur"""
+    rows = iter(user_rows(since).iterator(chunk_size=chunk_size))
+    genre_position = COLUMNS.index('genres_authored')
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        if not _uses_string_agg():
+            genres = _genres_by_author([row[0] for row in chunk])
+            chunk = [row[:genre_position] + (genres.get(row[0], ''),) + row[genre_position:] for row in chunk]
+        yield chunk
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.collaboration.recommender import TOP_K, build_index
+
+
+class Command(BaseCommand):
+    help = "Recalcule les collaborateurs recommandés (profils proches) ; à planifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--every', type=float,
+                            help="Recalcule en boucle toutes les N minutes")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            count = build_index(k=options['top_k'])
+            self.stdout.write(f"{count} utilisateur(s) indexé(s) en {time.perf_counter() - start:.2f}s")
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
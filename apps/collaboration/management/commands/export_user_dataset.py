@@ -0,0 +1,147 @@
+import csv
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.collaboration.dataset import CHUNK_SIZE, COLUMNS, iter_chunks
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+def _read_watermark(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _read_csv(path, chunk_size):
+    """Lignes d'un export CSV existant (user_id converti pour la fusion)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        if next(reader, None) != COLUMNS:
+            raise CommandError(f"{path} n'a pas les colonnes attendues : relancer un export complet")
+        for row in reader:
+            yield (int(row[0]),) + tuple(row[1:])
+
+
+def _read_parquet(path, chunk_size):
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=COLUMNS):
+        for row in batch.to_pylist():
+            yield tuple(row[column] for column in COLUMNS)
+
+
+def _merge(existing, changed):
+    """
+    Fusionne l'export précédent et les lignes modifiées, tous deux triés par
+    user_id : une ligne modifiée remplace celle du même utilisateur.
+    """
+    old, new = next(existing, None), next(changed, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old
+            old = next(existing, None)
+        else:
+            if old is not None and old[0] == new[0]:
+                old = next(existing, None)
+            yield new
+            new = next(changed, None)
+
+
+def _chunked(rows, chunk_size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Exporte les profils des utilisateurs (jeu de données de ml/) en CSV ou Parquet, complet ou incrémental"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='dataset_users.csv')
+        parser.add_argument('--format', choices=['csv', 'parquet'],
+                            help="Déduit de l'extension de --output par défaut")
+        parser.add_argument('--since',
+                            help="Date ISO, ou 'last' pour reprendre au dernier export (fichier <output>.watermark)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('parquet' if output.endswith('.parquet') else 'csv')
+        if fmt == 'parquet' and pa is None:
+            raise CommandError("pyarrow n'est pas installé : exporter en CSV ou installer pyarrow")
+
+        watermark_path = f'{output}.watermark'
+        since = options['since']
+        if since == 'last':
+            since = _read_watermark(watermark_path)   # aucun export précédent : export complet
+        if since:
+            parsed = parse_datetime(since)
+            if parsed is None:
+                raise CommandError(f"Date invalide : {since}")
+            since = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+        if since and not os.path.exists(output):
+            raise CommandError(f"{output} n'existe pas : lancer d'abord un export complet (sans --since)")
+
+        started_at = timezone.now()   # avant la lecture : rien de ce qui change pendant l'export n'est perdu
+        start = time.perf_counter()
+        chunk_size = options['chunk_size']
+        changed = 0
+
+        def count_changed(chunks):
+            nonlocal changed
+            for chunk in chunks:
+                changed += len(chunk)
+                yield from chunk
+
+        rows = count_changed(iter_chunks(since, chunk_size))
+        if since:
+            # Incrémental : les lignes modifiées sont fusionnées dans l'export complet existant
+            read = _read_csv if fmt == 'csv' else _read_parquet
+            rows = _merge(read(output, chunk_size), rows)
+        chunks = _chunked(rows, chunk_size)
+        tmp_path = f'{output}.tmp'
+        try:
+            count = self._write_csv(tmp_path, chunks) if fmt == 'csv' else self._write_parquet(tmp_path, chunks)
+            os.replace(tmp_path, output)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with open(watermark_path, 'w', encoding='utf-8') as f:
+            f.write(started_at.isoformat())
+
+        scope = f"{changed} modifié(s) depuis {since.isoformat()}" if since else "export complet"
+        self.stdout.write(
+            f"✅ {count} utilisateur(s) ({scope}) exporté(s) vers {output} en {time.perf_counter() - start:.2f}s"
+        )
+
+    def _write_csv(self, path, chunks):
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for chunk in chunks:
+                writer.writerows(chunk)
+                count += len(chunk)
+        return count
+
+    def _write_parquet(self, path, chunks):
+        schema = pa.schema([
+            (column, pa.string() if column in ('username', 'genres_authored') else pa.int64()) for column in COLUMNS
+        ])
+        count = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, row)) for row in chunk], schema=schema))
+                count += len(chunk)
+        return count
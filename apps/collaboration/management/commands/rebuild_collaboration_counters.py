@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.collaboration.stats import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les compteurs de réponses par post et globaux "
+            "(après une migration ou des écritures en masse qui contournent les signaux)")
+
+    def handle(self, *args, **options):
+        stats = rebuild_counters()
+        self.stdout.write(
+            f"✅ {stats['posts']} post(s), {stats['responses']} réponse(s) : {stats['accepted']} acceptée(s), "
+            f"{stats['pending']} en attente, {stats['refused']} refusée(s)"
+        )
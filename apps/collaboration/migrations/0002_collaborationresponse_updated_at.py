@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-18 04:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collaborationresponse',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 02:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0002_collaborationresponse_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollaborationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('accepted', models.IntegerField(default=0)),
+                ('refused', models.IntegerField(default=0)),
+                ('post', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='counter', to='collaboration.collaborationpost')),
+            ],
+        ),
+    ]
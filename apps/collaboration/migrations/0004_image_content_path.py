@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 03:07
+
+import apps.collaboration.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0003_collaboration_counter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='collaborationpost',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=apps.collaboration.models.collaboration_image_path),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 03:23
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.functions.comparison
+
+STATUSES = ['pending', 'accepted', 'refused']
+
+
+def create_global_counter(apps, schema_editor):
+    """Une seule ligne globale, recalculée depuis les posts et les réponses"""
+    CollaborationCounter = apps.get_model('collaboration', 'CollaborationCounter')
+    CollaborationPost = apps.get_model('collaboration', 'CollaborationPost')
+    CollaborationResponse = apps.get_model('collaboration', 'CollaborationResponse')
+    CollaborationCounter.objects.filter(post__isnull=True).delete()
+    CollaborationCounter.objects.create(
+        post=None,
+        posts=CollaborationPost.objects.count(),
+        **CollaborationResponse.objects.aggregate(
+            **{status: Count('id', filter=Q(status=status)) for status in STATUSES}
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0004_image_content_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_global_counter, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='collaborationcounter',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('post', models.Value(0)), condition=models.Q(('post__isnull', True)), name='collaboration_single_global_counter'),
+        ),
+    ]
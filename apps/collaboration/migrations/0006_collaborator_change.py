@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 03:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('collaboration', '0005_single_global_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollaboratorChange',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('changed_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -1,6 +1,17 @@
 from django.db import models
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from apps.book.models import Book 
+from apps.images import content_path, process_upload, thumbnail_urls
+
+# Vignettes écrites à l'enregistrement : avatar de la liste admin, carte de la liste des posts
+THUMBNAIL_SIZES = {'small': (96, 96), 'card': (720, 440)}
+
+
+def collaboration_image_path(instance, filename):
+    return content_path('collaboration', instance.image, filename)
+
 
 class CollaborationPost(models.Model):
     author = models.ForeignKey(
@@ -11,9 +22,17 @@ class CollaborationPost(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='collab_posts')
     title = models.CharField(max_length=200)
     content = models.TextField(help_text="Description de votre demande de collaboration")
-    image = models.ImageField(upload_to='collaboration/', blank=True, null=True)
+    image = models.ImageField(upload_to=collaboration_image_path, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def thumbnails(self):
+        return thumbnail_urls(self.image, THUMBNAIL_SIZES)
+
+    def save(self, *args, **kwargs):
+        process_upload(self.image, 'collaboration', THUMBNAIL_SIZES)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.title} par {self.author.username}"
 
@@ -30,6 +49,52 @@ class CollaborationResponse(models.Model):
     pdf_file = models.FileField(upload_to='responses/pdfs/', blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Réponse de {self.responder.username} pour {self.post.title} ({self.status})"
+
+
+class CollaborationCounter(models.Model):
+    """
+    Compteurs de réponses par statut, tenus à jour par signals.py : une ligne
+    par post, plus une ligne globale (post vide) qui compte aussi les posts.
+    Recalculés par la commande rebuild_collaboration_counters.
+    """
+    post = models.OneToOneField(
+        CollaborationPost, on_delete=models.CASCADE, null=True, blank=True, related_name='counter'
+    )
+    posts = models.IntegerField(default=0)   # ligne globale seulement
+    pending = models.IntegerField(default=0)
+    accepted = models.IntegerField(default=0)
+    refused = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Une seule ligne globale (créée par la migration 0005)
+            models.UniqueConstraint(
+                Coalesce('post', Value(0)), condition=Q(post__isnull=True), name='collaboration_single_global_counter'
+            ),
+        ]
+
+    @property
+    def total(self):
+        return self.pending + self.accepted + self.refused
+
+    def __str__(self):
+        scope = self.post_id or 'global'
+        return f"Compteurs {scope} : {self.accepted}/{self.pending}/{self.refused}"
+
+
+class CollaboratorChange(models.Model):
+    """
+    Dernier ajout ou retrait de l'utilisateur comme collaborateur d'un livre
+    (signals.py). La table M2M n'est pas datée et Book.updated_at ne bouge
+    pas : l'export incrémental (dataset.py) lit cette date.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='+')
+    changed_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.changed_at:%Y-%m-%d %H:%M}"
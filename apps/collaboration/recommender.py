@@ -0,0 +1,151 @@
+"""
+Collaborateurs recommandés : utilisateurs au profil proche (similarité cosinus).
+
+Profil d'un utilisateur : genres écrits (one-hot creux) + compteurs mis à
+l'échelle [0, 1] (livres écrits, livres en collaboration, réponses
+acceptées / en attente / refusées). Les profils sont construits en quelques
+requêtes d'agrégation, puis seuls les TOP_K voisins de chaque utilisateur
+sont calculés, par blocs de lignes : la mémoire reste en O(n·k).
+
+Le résultat est sauvegardé (collaborators.npz dans RECOMMENDER_DATA_DIR) par
+la commande `build_collaborator_index` et servi par `recommended_collaborators`.
+"""
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from scipy import sparse
+
+from apps.book.models import Book
+from apps.booksRecommendation.storage import CachedFile, atomic_path, file_lock
+from .models import CollaborationResponse
+
+TOP_K = 20
+BLOCK_ELEMENTS = 2 ** 23   # scores calculés à la fois (32 Mo en float32), quel que soit n
+STORE_NAME = 'collaborators.npz'
+COUNT_COLUMNS = [
+    'nbr_books_authored', 'nbr_books_collab', 'nbr_collab_accepted', 'nbr_collab_pending', 'nbr_collab_refused',
+]
+STATUS_COLUMNS = {
+    'accepted': 'nbr_collab_accepted',
+    'pending': 'nbr_collab_pending',
+    'refused': 'nbr_collab_refused',
+}
+
+
+def build_features(counts, genre_lists):
+    """
+    Matrice creuse (utilisateurs x (compteurs + genres)).
+    `counts` : tableau (n x len(COUNT_COLUMNS)) ; `genre_lists` : genres de chaque utilisateur.
+    Retourne (matrice csr float32, liste des genres).
+    """
+    counts = np.asarray(counts, dtype=np.float32).reshape(len(genre_lists), len(COUNT_COLUMNS))
+    low, high = counts.min(axis=0, initial=0), counts.max(axis=0, initial=0)
+    span = np.where(high > low, high - low, 1)
+    scaled = (counts - low) / span   # équivalent de MinMaxScaler
+
+    genres = sorted({genre for user_genres in genre_lists for genre in user_genres})
+    column = {genre: i for i, genre in enumerate(genres)}
+    rows = [i for i, user_genres in enumerate(genre_lists) for _ in set(user_genres)]
+    columns = [column[genre] for user_genres in genre_lists for genre in set(user_genres)]
+    one_hot = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=(len(genre_lists), len(genres))
+    )
+    return sparse.hstack([sparse.csr_matrix(scaled), one_hot], format='csr', dtype=np.float32), genres
+
+
+def database_features():
+    """(ids des utilisateurs, matrice de profils) construits en 4 requêtes d'agrégation"""
+    user_ids = np.array(get_user_model().objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    position = {user_id: i for i, user_id in enumerate(user_ids.tolist())}
+    counts = np.zeros((len(user_ids), len(COUNT_COLUMNS)), dtype=np.float32)
+    genre_lists = [[] for _ in user_ids]
+
+    for row in Book.objects.values('author_id', 'genre').annotate(n=Count('id')):
+        i = position.get(row['author_id'])
+        if i is not None:
+            counts[i, 0] += row['n']
+            if row['genre']:
+                genre_lists[i].append(row['genre'])
+    for row in Book.collaborators.through.objects.values('user_id').annotate(n=Count('id')):
+        if row['user_id'] in position:
+            counts[position[row['user_id']], 1] = row['n']
+    for row in CollaborationResponse.objects.values('responder_id', 'status').annotate(n=Count('id')):
+        if row['responder_id'] in position and row['status'] in STATUS_COLUMNS:
+            counts[position[row['responder_id']], COUNT_COLUMNS.index(STATUS_COLUMNS[row['status']])] = row['n']
+
+    features, _ = build_features(counts, genre_lists)
+    return user_ids, features
+
+
+def top_k_similar(features, k=TOP_K, block_elements=BLOCK_ELEMENTS):
+    """
+    k voisins les plus proches (cosinus) de chaque ligne, soi-même exclu.
+    Retourne (indices, scores) de forme (n x k) ; les cases vides valent -1 / 0.
+    """
+    # Quelques dizaines de colonnes (compteurs + genres) : les profils tiennent en dense
+    normalized = features.toarray() if sparse.issparse(features) else np.asarray(features, dtype=np.float32)
+    norms = np.linalg.norm(normalized, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    normalized = (normalized / norms).astype(np.float32)
+
+    n = features.shape[0]
+    kk = min(k, n - 1)
+    indices = np.full((n, k), -1, dtype=np.int64)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if kk <= 0:
+        return indices, scores
+    block_size = max(1, block_elements // n)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = normalized[start:stop] @ normalized.T
+        block *= -1   # argpartition cherche les plus petits : pas de copie négative
+        block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        best = np.argpartition(block, kk - 1, axis=1)[:, :kk]
+        best_scores = -np.take_along_axis(block, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        indices[start:stop, :kk] = np.take_along_axis(best, order, axis=1)
+        scores[start:stop, :kk] = np.take_along_axis(best_scores, order, axis=1)
+    indices[scores <= 0] = -1
+    scores[scores <= 0] = 0
+    return indices, scores
+
+
+def build_index(k=TOP_K):
+    """Recalcule et publie les voisins de tous les utilisateurs ; retourne leur nombre"""
+    user_ids, features = database_features()
+    indices, scores = top_k_similar(features, k)
+    neighbors = np.where(indices >= 0, user_ids[np.maximum(indices, 0)], -1) if len(user_ids) else indices
+    with file_lock(STORE_NAME), atomic_path(STORE_NAME) as path:
+        np.savez(path, user_ids=user_ids, neighbors=neighbors, scores=scores)
+    return len(user_ids)
+
+
+def _load(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+_store = CachedFile(STORE_NAME, _load)
+
+
+def similar_users(user_id, top_n=5, exclude=()):
+    """[(id, score)] des utilisateurs au profil le plus proche, d'après l'index publié"""
+    store = _store.get()
+    if store is None:
+        return []
+    row = np.searchsorted(store['user_ids'], user_id)
+    if row >= len(store['user_ids']) or store['user_ids'][row] != user_id:
+        return []
+    excluded = set(exclude)
+    return [
+        (int(neighbor), float(score))
+        for neighbor, score in zip(store['neighbors'][row], store['scores'][row])
+        if neighbor >= 0 and int(neighbor) not in excluded
+    ][:top_n]
+
+
+def recommended_collaborators(user, top_n=5, exclude=()):
+    """[(utilisateur, score)] proposés comme collaborateurs à `user` (une requête)"""
+    pairs = similar_users(user.id, top_n, exclude)
+    users = get_user_model().objects.in_bulk([user_id for user_id, _ in pairs])
+    return [(users[user_id], score) for user_id, score in pairs if user_id in users]
@@ -0,0 +1,90 @@
+"""
+Score des artistes ayant répondu à un post de collaboration (collaboration_detail).
+
+Les caractéristiques de tous les candidats sont lues en un nombre fixe de
+requêtes, quel que soit le nombre de réponses :
+1. les répondants ;
+2. leurs collaborations acceptées, au total et avec l'auteur du post (comptes groupés) ;
+3. leurs livres écrits, groupés par genre.
+Les scores sont ensuite calculés d'un bloc avec numpy.
+"""
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+
+from apps.book.models import Book
+from .models import CollaborationResponse
+
+RESPONDED_WEIGHT = 1         # a répondu au post
+GENRE_WEIGHT = 3             # par genre du livre déjà écrit par l'artiste
+AUTHOR_WEIGHT = 5            # par collaboration acceptée avec l'auteur du post
+ACCEPTED_WEIGHT = 2          # par collaboration acceptée en général
+
+
+def _genres(value):
+    return {genre.strip().lower() for genre in (value or '').split(',') if genre.strip()}
+
+
+class Candidates:
+    """Caractéristiques des répondants d'un post, alignées sur `users`"""
+
+    def __init__(self, post):
+        self.users = list(
+            get_user_model().objects.filter(collaborationresponse__post=post).distinct().order_by('id')
+        )
+        position = {user.id: i for i, user in enumerate(self.users)}
+        self.accepted = np.zeros(len(self.users), dtype=np.int64)
+        self.accepted_with_author = np.zeros(len(self.users), dtype=np.int64)
+        self.books = np.zeros(len(self.users), dtype=np.int64)
+        self.genres = [set() for _ in self.users]
+
+        for row in CollaborationResponse.objects.filter(responder_id__in=position, status='accepted').values(
+            'responder_id'
+        ).annotate(total=Count('id'), with_author=Count('id', filter=Q(post__author_id=post.author_id))):
+            i = position[row['responder_id']]
+            self.accepted[i] = row['total']
+            self.accepted_with_author[i] = row['with_author']
+        for row in Book.objects.filter(author_id__in=position).values('author_id', 'genre').annotate(n=Count('id')):
+            i = position[row['author_id']]
+            self.books[i] += row['n']
+            self.genres[i] |= _genres(row['genre'])
+
+    def scores(self, post_genres):
+        genre_matches = np.array([len(genres & post_genres) for genres in self.genres], dtype=np.int64)
+        return (
+            RESPONDED_WEIGHT
+            + GENRE_WEIGHT * genre_matches
+            + AUTHOR_WEIGHT * self.accepted_with_author
+            + ACCEPTED_WEIGHT * self.accepted
+        )
+
+
+def summary_text(books, accepted, genre, has_written_genre):
+    """Résumé affiché sous chaque artiste recommandé"""
+    genre_text = (
+        f"a déjà écrit dans le genre '{genre}'" if has_written_genre
+        else f"n'a pas encore écrit dans le genre '{genre}'"
+    )
+    return (f" a écrit {books} livre(s), "
+            f"a participé à {accepted} collaboration(s) acceptée(s), "
+            f"et {genre_text}.")
+
+
+def recommend_artists_for_post(post, top_n=5):
+    """[(utilisateur, score)] des meilleurs répondants ; chaque utilisateur reçoit son `ai_text`"""
+    candidates = Candidates(post)
+    if not candidates.users:
+        return []
+    genre = post.book.genre if post.book_id else ''
+    post_genres = _genres(genre)
+    scores = candidates.scores(post_genres)
+    best = np.argsort(-scores, kind='stable')[:top_n]   # à score égal : le plus ancien inscrit
+
+    recommendations = []
+    for i in best.tolist():
+        user = candidates.users[i]
+        user.ai_text = summary_text(
+            candidates.books[i], candidates.accepted[i], genre, bool(candidates.genres[i] & post_genres)
+        )
+        recommendations.append((user, int(scores[i])))
+    return recommendations
@@ -0,0 +1,68 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.book.models import Book
+from . import stats
+from .models import CollaborationPost, CollaborationResponse, CollaboratorChange
+
+
+@receiver(pre_save, sender=CollaborationResponse)
+def remember_previous_status(sender, instance, raw=False, **kwargs):
+    """Statut (et post) en base avant l'enregistrement, pour déplacer le compteur"""
+    instance._previous = None
+    if raw or instance.pk is None:
+        return
+    instance._previous = (
+        CollaborationResponse.objects.filter(pk=instance.pk).values_list('post_id', 'status').first()
+    )
+
+
+@receiver(post_save, sender=CollaborationResponse)
+def count_response(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous == (instance.post_id, instance.status):
+        return
+    if previous is not None:
+        stats.bump(*previous, -1)
+    stats.bump(instance.post_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=CollaborationResponse)
+def uncount_response(sender, instance, **kwargs):
+    stats.bump(instance.post_id, instance.status, -1)
+
+
+@receiver(post_save, sender=CollaborationPost)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.add_post(instance.id, 1)
+
+
+@receiver(post_delete, sender=CollaborationPost)
+def uncount_post(sender, instance, **kwargs):
+    # Les réponses supprimées en cascade ont déjà été décomptées une à une
+    stats.add_post(instance.id, -1)
+
+
+@receiver(m2m_changed, sender=Book.collaborators.through)
+def date_collaborator_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Date l'ajout ou le retrait de collaborateurs (export incrémental du jeu de données)"""
+    if action == 'pre_clear':
+        # Les collaborateurs retirés ne sont plus lisibles après le clear
+        instance._cleared_collaborators = (
+            [instance.pk] if reverse else list(instance.collaborators.values_list('pk', flat=True))
+        )
+        return
+    if action == 'post_clear':
+        user_ids = getattr(instance, '_cleared_collaborators', [])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        user_ids = [instance.pk] if reverse else list(pk_set)
+    else:
+        return
+    if user_ids:
+        CollaboratorChange.objects.bulk_create(
+            [CollaboratorChange(user_id=user_id) for user_id in user_ids],
+            update_conflicts=True, unique_fields=['user'], update_fields=['changed_at'],
+        )
@@ -0,0 +1,117 @@
+"""
+Statistiques des collaborations pour les pages d'administration.
+
+Les compteurs (CollaborationCounter) sont incrémentés par les signaux des
+réponses et des posts : les pages lisent une ligne au lieu de compter les
+réponses. Les statistiques globales sont en plus gardées STATS_TTL secondes
+dans le cache (invalidé à chaque changement dans ce processus).
+
+La ligne globale (post vide) est créée par la migration 0005 et unique
+(contrainte partielle) : elle n'est jamais supprimée, seulement mise à jour.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import CollaborationCounter, CollaborationPost, CollaborationResponse
+
+logger = logging.getLogger(__name__)
+
+STATUSES = [status for status, _ in CollaborationResponse.STATUS_CHOICES]
+STATS_CACHE_KEY = 'collaboration:stats'
+STATS_TTL = 30
+
+
+def bump(post_id, status, delta):
+    """Ajoute `delta` au compteur du statut pour le post et pour la ligne globale (une requête)"""
+    if status not in STATUSES:
+        return
+    CollaborationCounter.objects.filter(Q(post_id=post_id) | Q(post__isnull=True)).update(
+        **{status: F(status) + delta}
+    )
+    invalidate()
+
+
+def add_post(post_id, delta):
+    """Crée (ou non) la ligne du post et met à jour le nombre de posts de la ligne globale"""
+    if delta > 0:
+        CollaborationCounter.objects.get_or_create(post_id=post_id)
+    CollaborationCounter.objects.filter(post__isnull=True).update(posts=F('posts') + delta)
+    invalidate()
+
+
+def invalidate():
+    transaction.on_commit(lambda: cache.delete(STATS_CACHE_KEY))
+
+
+def _as_dict(counter, posts=None):
+    return {
+        'posts': counter.posts if posts is None else posts,
+        'responses': counter.total,
+        **{status: getattr(counter, status) for status in STATUSES},
+    }
+
+
+def global_stats():
+    """{'posts', 'responses', 'pending', 'accepted', 'refused'} pour tout le site (cache, puis une requête)"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        counter = CollaborationCounter.objects.filter(post__isnull=True).first()
+        if counter is None:
+            # Ligne globale absente (base vidée) : comptage sans écriture, voir rebuild_collaboration_counters
+            logger.warning("Compteur global des collaborations absent : comptage direct")
+            return {'posts': CollaborationPost.objects.count(), **_totals(_count())}
+        stats = _as_dict(counter)
+        cache.set(STATS_CACHE_KEY, stats, STATS_TTL)
+    return stats
+
+
+def post_stats(post):
+    """Mêmes compteurs pour un post (une requête, aucune si `counter` est déjà chargé)"""
+    try:
+        counter = post.counter
+    except CollaborationCounter.DoesNotExist:
+        counter, _ = CollaborationCounter.objects.get_or_create(post=post, defaults=_count(post=post))
+    return _as_dict(counter, posts=1)
+
+
+def _totals(counts):
+    return {'responses': sum(counts.values()), **counts}
+
+
+def _count(**filters):
+    """Compteurs par statut recalculés en une requête d'agrégation conditionnelle"""
+    return CollaborationResponse.objects.filter(**filters).aggregate(
+        **{status: Count('id', filter=Q(status=status)) for status in STATUSES}
+    )
+
+
+def rebuild_counters():
+    """Recalcule toutes les lignes depuis les réponses ; retourne les statistiques globales"""
+    with transaction.atomic():
+        # La ligne globale verrouillée sérialise les reconstructions concurrentes
+        total = CollaborationCounter.objects.select_for_update().filter(post__isnull=True).first()
+        if total is None:
+            total = CollaborationCounter.objects.create(post=None)
+        per_post = {
+            row['post_id']: row
+            for row in CollaborationResponse.objects.values('post_id').annotate(
+                **{status: Count('id', filter=Q(status=status)) for status in STATUSES}
+            )
+        }
+        post_ids = list(CollaborationPost.objects.values_list('id', flat=True))
+        CollaborationCounter.objects.filter(post__isnull=False).delete()
+        rows = [
+            CollaborationCounter(post_id=post_id, **{status: per_post.get(post_id, {}).get(status, 0)
+                                                     for status in STATUSES})
+            for post_id in post_ids
+        ]
+        CollaborationCounter.objects.bulk_create(rows, batch_size=1000)
+        total.posts = len(post_ids)
+        for status in STATUSES:
+            setattr(total, status, sum(row[status] for row in per_post.values()))
+        total.save(update_fields=['posts'] + STATUSES)
+    invalidate()
+    return _as_dict(total)
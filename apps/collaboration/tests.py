@@ -1,3 +1,198 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase
+
+from apps.book.models import Book
+from apps.booksRecommendation.evaluation import synthetic_dataset
+from .models import CollaborationCounter, CollaborationPost, CollaborationResponse
+from .recommender import COUNT_COLUMNS, build_features, top_k_similar
+from .scoring import recommend_artists_for_post
+from .stats import STATS_CACHE_KEY, global_stats, post_stats, rebuild_counters
+
+
+class RecommendArtistsForPostTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user('auteur', password='x')
+        book = Book.objects.create(title='Livre', synopsis='-', genre='fantasy', status='en_cours', author=self.author)
+        self.post = CollaborationPost.objects.create(author=self.author, book=book, title='Post', content='-')
+        self.other_post = CollaborationPost.objects.create(
+            author=User.objects.create_user('autre', password='x'), book=book, title='Autre', content='-'
+        )
+        self.User = User
+
+    def add_responders(self, count):
+        for i in range(count):
+            user = self.User.objects.create_user(f'artiste{self.User.objects.count()}', password='x')
+            CollaborationResponse.objects.create(post=self.post, responder=user, message='-')
+            Book.objects.create(title='B', synopsis='-', genre='fantasy' if i % 2 else 'romance',
+                                status='termine', author=user)
+            CollaborationResponse.objects.create(post=self.other_post, responder=user, message='-', status='accepted')
+
+    def test_query_count_does_not_grow_with_responses(self):
+        self.add_responders(2)
+        with self.assertNumQueries(3):
+            recommend_artists_for_post(self.post)
+        self.add_responders(20)
+        with self.assertNumQueries(3):
+            recommendations = recommend_artists_for_post(self.post)
+        self.assertEqual(len(recommendations), 5)
+
+    def test_scores(self):
+        User = self.User
+        expert = User.objects.create_user('expert', password='x')
+        novice = User.objects.create_user('novice', password='x')
+        Book.objects.create(title='F', synopsis='-', genre='fantasy', status='termine', author=expert)
+        earlier = CollaborationPost.objects.create(author=self.author, book=self.post.book, title='Avant', content='-')
+        CollaborationResponse.objects.create(post=earlier, responder=expert, message='-', status='accepted')
+        CollaborationResponse.objects.create(post=self.other_post, responder=expert, message='-', status='accepted')
+        for user in (expert, novice):
+            CollaborationResponse.objects.create(post=self.post, responder=user, message='-')
+
+        recommendations = recommend_artists_for_post(self.post)
+        # expert : réponse 1 + genre 3 + 1 collaboration avec l'auteur 5 + 2 acceptées x 2
+        self.assertEqual([(user.username, score) for user, score in recommendations], [('expert', 13), ('novice', 1)])
+        self.assertIn("2 collaboration(s) acceptée(s)", recommendations[0][0].ai_text)
+        self.assertIn("a déjà écrit dans le genre 'fantasy'", recommendations[0][0].ai_text)
+        self.assertIn("n'a pas encore écrit", recommendations[1][0].ai_text)
+
+
+class CollaborationCounterTests(TestCase):
+
+    def test_counters_follow_responses(self):
+        User = get_user_model()
+        author = User.objects.create_user('auteur', password='x')
+        book = Book.objects.create(title='Livre', synopsis='-', genre='fantasy', status='en_cours', author=author)
+        post = CollaborationPost.objects.create(author=author, book=book, title='Post', content='-')
+        other = CollaborationPost.objects.create(author=author, book=book, title='Autre', content='-')
+        responses = [
+            CollaborationResponse.objects.create(post=post, responder=User.objects.create_user(f'a{i}'), message='-')
+            for i in range(4)
+        ]
+        CollaborationResponse.objects.create(post=other, responder=author, message='-', status='accepted')
+        responses[0].status = 'accepted'
+        responses[0].save()
+        responses[1].status = 'refused'
+        responses[1].save()
+        responses[2].delete()
+
+        post.refresh_from_db()
+        self.assertEqual(post_stats(post), {'posts': 1, 'responses': 3, 'pending': 1, 'accepted': 1, 'refused': 1})
+        self.assertEqual(global_stats(), {'posts': 2, 'responses': 4, 'pending': 1, 'accepted': 2, 'refused': 1})
+
+        other.delete()
+        expected = {'posts': 1, 'responses': 3, 'pending': 1, 'accepted': 1, 'refused': 1}
+        cache.delete(STATS_CACHE_KEY)
+        self.assertEqual(global_stats(), expected)
+        self.assertEqual(rebuild_counters(), expected)
+        self.assertEqual(CollaborationCounter.objects.filter(post__isnull=True).count(), 1)
+
+    def test_single_global_row(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CollaborationCounter.objects.create(post=None)
+        CollaborationCounter.objects.filter(post__isnull=True).delete()
+        # Sans ligne globale, la page compte sans rien écrire
+        cache.delete(STATS_CACHE_KEY)
+        self.assertEqual(global_stats()['posts'], 0)
+        self.assertFalse(CollaborationCounter.objects.exists())
+
+
+class ExportUserDatasetTests(TestCase):
+
+    def read(self, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return {row['username']: row for row in csv.DictReader(f)}
+
+    def test_incremental_export_is_merged_into_the_full_export(self):
+        User = get_user_model()
+        alice = User.objects.create_user('alice', password='x')
+        User.objects.create_user('bob', password='x')
+        Book.objects.create(title='Livre', synopsis='-', genre='fantasy', status='en_cours', author=alice)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'users.csv')
+            call_command('export_user_dataset', output=output, stdout=io.StringIO())
+            self.assertEqual(set(self.read(output)), {'alice', 'bob'})
+
+            Book.objects.create(title='Autre', synopsis='-', genre='romance', status='en_cours', author=alice)
+            User.objects.create_user('carol', password='x')
+            call_command('export_user_dataset', output=output, since='last', stdout=io.StringIO())
+
+            rows = self.read(output)
+            self.assertEqual(list(rows), ['alice', 'bob', 'carol'])
+            self.assertEqual(rows['alice']['nbr_books_authored'], '2')
+            self.assertEqual(rows['alice']['genres_authored'], 'fantasy,romance')
+            self.assertEqual(rows['bob']['nbr_books_authored'], '0')
+
+    def test_collaborator_changes_are_exported_incrementally(self):
+        User = get_user_model()
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        carol = User.objects.create_user('carol', password='x')
+        book = Book.objects.create(title='Livre', synopsis='-', genre='fantasy', status='en_cours', author=alice)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'users.csv')
+            call_command('export_user_dataset', output=output, stdout=io.StringIO())
+
+            # L'ajout par la M2M ne modifie pas Book.updated_at
+            book.collaborators.add(bob)
+            carol.collaborative_books.add(book)
+            call_command('export_user_dataset', output=output, since='last', stdout=io.StringIO())
+            rows = self.read(output)
+            self.assertEqual((rows['bob']['nbr_books_collab'], rows['carol']['nbr_books_collab']), ('1', '1'))
+
+            # Retrait : le collaborateur n'est plus lié au livre mais sa ligne est relue
+            book.collaborators.remove(bob)
+            call_command('export_user_dataset', output=output, since='last', stdout=io.StringIO())
+            self.assertEqual(self.read(output)['bob']['nbr_books_collab'], '0')
+
+            book.collaborators.clear()
+            call_command('export_user_dataset', output=output, since='last', stdout=io.StringIO())
+            rows = self.read(output)
+            self.assertEqual((rows['bob']['nbr_books_collab'], rows['carol']['nbr_books_collab']), ('0', '0'))
+
+
+class TopKSimilarTests(SimpleTestCase):
+
+    def test_blocks_match_the_dense_similarity(self):
+        # Profils tirés du jeu synthétique : genres lus, compteurs d'interactions par poids
+        dataset = synthetic_dataset(np.random.default_rng(0), n_users=300, n_books=400, per_user=6)
+        genre_lists = [[] for _ in range(dataset.n_users)]
+        for user, book in zip(dataset.users, dataset.books):
+            genre_lists[user].append(f'genre{dataset.book_genres[book]}')
+        counts = np.zeros((dataset.n_users, len(COUNT_COLUMNS)))
+        for column, weight in enumerate([1, 2, 3]):
+            counts[:, column] = np.bincount(dataset.users[dataset.weights == weight], minlength=dataset.n_users)
+        counts[:, 3] = np.bincount(dataset.users, minlength=dataset.n_users)
+        counts[:, 4] = [len(set(genres)) for genres in genre_lists]
+        features, _ = build_features(counts, genre_lists)
+
+        dense = features.toarray()
+        dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+        similarity = dense @ dense.T
+        np.fill_diagonal(similarity, -np.inf)
+        expected = -np.sort(-similarity, axis=1)[:, :10]
+
+        # Blocs de 7 lignes : le dernier bloc est incomplet
+        indices, scores = top_k_similar(features, k=10, block_elements=7 * dataset.n_users)
+        self.assertEqual(indices.shape, (dataset.n_users, 10))
+        np.testing.assert_allclose(scores, expected, rtol=1e-5)
+        np.testing.assert_allclose(np.take_along_axis(similarity, indices, axis=1), scores, rtol=1e-5)
+        self.assertFalse((indices == np.arange(dataset.n_users)[:, None]).any())
+        np.testing.assert_array_equal(top_k_similar(features, k=10)[1], scores)
+
+    def test_missing_neighbors_are_marked(self):
+        features, _ = build_features(np.zeros((3, len(COUNT_COLUMNS))), [['a'], ['a'], ['b']])
+        indices, scores = top_k_similar(features, k=4)
+        self.assertEqual(indices.tolist(), [[1, -1, -1, -1], [0, -1, -1, -1], [-1, -1, -1, -1]])
+        self.assertEqual(scores[:, 0].tolist(), [1, 1, 0])
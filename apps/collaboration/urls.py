@@ -19,4 +19,5 @@ urlpatterns = [
     # Admin
     path('admin-collaboration/', views.admin_collaborations, name='admin_collaborations'),
     path('admin-collaboration/<int:post_id>/responses/', views.admin_collaboration_responses, name='admin_collaboration_responses'),
+    path('admin-collaboration/stats/', views.admin_collaboration_stats, name='admin_collaboration_stats'),
 ]
\ No newline at end of file
@@ -1,9 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .models import CollaborationPost, CollaborationResponse, Book
+from .models import CollaborationPost, CollaborationResponse
 from .forms import CollaborationPostForm, CollaborationResponseForm
+from .recommender import recommended_collaborators as recommend_collaborators
+from .scoring import recommend_artists_for_post
+from .stats import global_stats, post_stats
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.http import JsonResponse
 
 User = get_user_model()
 
@@ -190,19 +195,21 @@ def update_response_status(request, response_id, status):
 @login_required
 @user_passes_test(is_admin)
 def admin_collaborations(request):
-    posts = CollaborationPost.objects.all().order_by('-created_at')
-    
-    total_posts = posts.count()
-    total_responses = CollaborationResponse.objects.count()
-    pending_responses = CollaborationResponse.objects.filter(status='pending').count()
-    accepted_responses = CollaborationResponse.objects.filter(status='accepted').count()
+    # Compteurs tenus à jour par signaux (stats.py) : aucun COUNT sur les réponses
+    recent = CollaborationResponse.objects.select_related('responder').order_by('-created_at')[:3]
+    posts = (
+        CollaborationPost.objects.select_related('author', 'counter')
+        .prefetch_related(Prefetch('responses', queryset=recent, to_attr='recent_responses'))
+        .order_by('-created_at')
+    )
+    stats = global_stats()
     
     context = {
         'posts': posts,
-        'total_posts': total_posts,
-        'total_responses': total_responses,
-        'pending_responses': pending_responses,
-        'accepted_responses': accepted_responses,
+        'total_posts': stats['posts'],
+        'total_responses': stats['responses'],
+        'pending_responses': stats['pending'],
+        'accepted_responses': stats['accepted'],
     }
     
     return render(request, 'collaboration/admin-collaboration.html', context)
@@ -210,110 +217,51 @@ def admin_collaborations(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_collaboration_responses(request, post_id):
-    post = get_object_or_404(CollaborationPost, id=post_id)
-    responses = post.responses.all().order_by('-created_at')
-    
-    accepted_count = responses.filter(status='accepted').count()
-    pending_count = responses.filter(status='pending').count()
-    refused_count = responses.filter(status='refused').count()
+    post = get_object_or_404(CollaborationPost.objects.select_related('counter'), id=post_id)
+    responses = post.responses.select_related('responder').order_by('-created_at')
+    stats = post_stats(post)
     
     context = {
         'post': post,
         'responses': responses,
-        'accepted_count': accepted_count,
-        'pending_count': pending_count,
-        'refused_count': refused_count,
+        'total_count': stats['responses'],
+        'accepted_count': stats['accepted'],
+        'pending_count': stats['pending'],
+        'refused_count': stats['refused'],
     }
     
     return render(request, 'collaboration/admin-collaboration-responses.html', context)
 
 
-def recommend_artists_for_post(post, top_n=5):
-    # ✅ Tous les artistes qui ont répondu à ce post (peu importe status)
-    responses = post.responses.all()  
-    candidates = set(resp.responder for resp in responses)
-
-    recommendations = []
-
-    for user in candidates:
-        score = 0
-        
-        # ✅ Bonus simple: ils ont répondu
-        score += 1  
-
-        # ✅ Similarité de genre
-        if post.book and hasattr(user, 'genres_authored') and post.book.genre:
-            user_genres = set([g.strip().lower() for g in user.genres_authored.split(',')])
-            book_genres = set([g.strip().lower() for g in post.book.genre.split(',')])
-            
-            genre_match = len(user_genres & book_genres)
-            score += genre_match * 3
-
-        # ✅ Collaborations passées réussies avec l'auteur du post
-        past_collabs = CollaborationResponse.objects.filter(
-            responder=user,
-            post__author=post.author,
-            status='accepted'
-        ).count()
-        score += past_collabs * 5
-
-        # ✅ Expérience générale
-        global_success = CollaborationResponse.objects.filter(
-            responder=user,
-            status='accepted'
-        ).count()
-        score += global_success * 2
-
-        recommendations.append((user, score))
-
-    # ✅ Trier par score décroissant
-    recommendations.sort(key=lambda x: x[1], reverse=True)
-
-    return recommendations[:top_n]
-
+@login_required
+@user_passes_test(is_admin)
+def admin_collaboration_stats(request):
+    """Statistiques globales (et d'un post avec ?post=<id>) en JSON, servies depuis le cache"""
+    data = {'global': global_stats()}
+    post_id = request.GET.get('post')
+    if post_id:
+        if not post_id.isdigit():
+            return JsonResponse({'error': 'Identifiant de post invalide'}, status=400)
+        post = get_object_or_404(CollaborationPost.objects.select_related('counter'), id=post_id)
+        data['post'] = post_stats(post)
+    return JsonResponse(data)
 
-def fake_ai_text(user, post):
-    # Tous les livres écrits par l'artiste
-    books = Book.objects.filter(author=user)
-    total_books = books.count()
-    
-    # Vérifier si l'artiste a déjà écrit dans le genre du post
-    post_genre = post.book.genre.lower() if post.book and post.book.genre else None
-    has_written_genre = False
-    genres_written = set()
-    
-    for book in books:
-        if book.genre:
-            genres_written.add(book.genre.strip().lower())
-    
-    if post_genre:
-        has_written_genre = post_genre in genres_written
-    
-    # Nombre de collaborations acceptées
-    accepted_collabs = CollaborationResponse.objects.filter(
-        responder=user,
-        status='accepted'
-    ).count()
-    
-    # Construire le résumé
-    genre_text = f"a déjà écrit dans le genre '{post.book.genre}'" if has_written_genre else f"n'a pas encore écrit dans le genre '{post.book.genre}'"
-    
-    return (f" a écrit {total_books} livre(s), "
-            f"a participé à {accepted_collabs} collaboration(s) acceptée(s), "
-            f"et {genre_text}.")
 
 @login_required
 def collaboration_detail(request, post_id):
-    post = get_object_or_404(CollaborationPost, id=post_id)
+    post = get_object_or_404(CollaborationPost.objects.select_related('author', 'book'), id=post_id)
     
-    # Recommandation
-    recommended_artists = recommend_artists_for_post(post, top_n=5)
-
-    # Texte AI fake pour chaque artiste recommandé
-    for user, score in recommended_artists:
-        user.ai_text = fake_ai_text(user, post)
+    # Recommandations, affichées à l'auteur seulement
+    recommended_artists, recommended_collaborators = [], []
+    if request.user == post.author:
+        # Répondants classés (avec le texte AI fake de chacun), en un nombre fixe de requêtes
+        recommended_artists = recommend_artists_for_post(post, top_n=5)
+        # Profils proches de l'auteur qui n'ont pas encore répondu (index build_collaborator_index)
+        responders = set(post.responses.values_list('responder_id', flat=True))
+        recommended_collaborators = recommend_collaborators(post.author, top_n=5, exclude=responders | {post.author_id})
 
     return render(request, 'collaboration/collaboration_detail.html', {
         'post': post,
         'recommended_artists': recommended_artists,
+        'recommended_collaborators': recommended_collaborators,
     })
@@ -0,0 +1,74 @@
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = ("Mesure le débit (requêtes/s) des pages selon la durée de vie des connexions "
+            "à la base (CONN_MAX_AGE), requêtes passées par le handler WSGI comme sous gunicorn")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', nargs='+', default=['home', 'book_list'], help="Noms d'URL mesurés")
+        parser.add_argument('--requests', type=int, default=200, help="Requêtes par page et par réglage")
+        parser.add_argument('--conn-max-age', type=int, nargs='+', default=[0, 60],
+                            help="Valeurs de CONN_MAX_AGE comparées (0 = une connexion par requête)")
+        parser.add_argument('--user', help="Utilisateur connecté (par défaut : le premier)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError("Aucun utilisateur pour se connecter")
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*'), '127.0.0.1').lstrip('.')
+
+        handler = WSGIHandler()
+        opened = []
+        connection_created.connect(lambda sender, connection, **kwargs: opened.append(connection.alias))
+        connection = connections['default']
+        initial_max_age = connection.settings_dict['CONN_MAX_AGE']
+
+        self.stdout.write(f"{'page':<12} {'CONN_MAX_AGE':>12} {'req/s':>8} {'ms/req':>8} {'connexions':>11}")
+        try:
+            for page in options['pages']:
+                path = reverse(page)
+                for max_age in options['conn_max_age']:
+                    # Lu à l'ouverture de la connexion : on repart d'une connexion fermée
+                    connection.close()
+                    connection.settings_dict['CONN_MAX_AGE'] = max_age
+                    self.request(handler, path, host, cookie)   # échauffement (gabarits, caches)
+                    opened.clear()
+                    start = time.perf_counter()
+                    for _ in range(options['requests']):
+                        self.request(handler, path, host, cookie)
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{page:<12} {max_age:>12} {options['requests'] / elapsed:>8.0f} "
+                        f"{elapsed * 1000 / options['requests']:>8.2f} {len(opened):>11}"
+                    )
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = initial_max_age
+
+    def request(self, handler, path, host, cookie):
+        environ = {'PATH_INFO': path, 'HTTP_HOST': host, 'HTTP_COOKIE': cookie}
+        setup_testing_defaults(environ)
+        statuses = []
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()   # request_finished : ferme la connexion si CONN_MAX_AGE est dépassé
+        if not statuses[0].startswith('200'):
+            raise CommandError(f"{path} : {statuses[0]}")
@@ -0,0 +1,168 @@
+"""
+Images téléversées (badges, posts de collaboration) : normalisation, chemins
+adressés par contenu et vignettes précalculées.
+
+À l'enregistrement, l'image est redressée (EXIF), réduite à MAX_DIMENSION,
+débarrassée de ses métadonnées puis ré-encodée (PNG si transparente, JPEG
+sinon). Elle est rangée sous <préfixe>/<2 premiers caractères>/<sha256>.<ext> :
+un même contenu n'est stocké qu'une fois. Chaque taille de vignette est
+écrite à côté, en WebP et en JPEG (<sha256>_<taille>.webp / .jpg), pour que
+les pages de liste n'envoient que de petites images.
+
+La commande process_images traite les fichiers déjà en ligne (et complète les
+vignettes manquantes des images déjà traitées).
+"""
+import hashlib
+import io
+import os
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_DIMENSION = 1600
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/([0-9a-f]{64})\.(png|jpg)$')
+
+
+def content_path(prefix, file, filename):
+    """<préfixe>/ab/<sha256 du contenu>.<ext> : chemin d'un fichier non normalisé (upload_to)"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(65536), b''):
+        digest.update(chunk)
+    file.seek(0)
+    ext = os.path.splitext(filename)[1].lower()
+    return f'{prefix}/{digest.hexdigest()[:2]}/{digest.hexdigest()}{ext}'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _flatten(image):
+    """RGB sur fond blanc (JPEG n'a pas de transparence)"""
+    if not _has_alpha(image):
+        return image.convert('RGB')
+    rgba = image.convert('RGBA')
+    background = Image.new('RGB', rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel('A'))
+    return background
+
+
+def _encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def _thumbnail_name(name, size_name, ext):
+    return f'{os.path.splitext(name)[0]}_{size_name}.{ext}'
+
+
+def store_image(source, prefix, sizes, storage=default_storage):
+    """
+    Normalise `source` (fichier image ouvert), l'enregistre à son adresse de
+    contenu avec ses vignettes `sizes` ({nom: (largeur, hauteur)}) ; retourne
+    le nom stocké. Lève ValueError si le fichier n'est pas une image.
+    """
+    source.seek(0)
+    try:
+        image = Image.open(source)
+        image.load()
+    except (UnidentifiedImageError, OSError) as exc:
+        raise ValueError(f"Image illisible : {exc}") from exc
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+
+    if image.mode == 'RGBA':
+        data, ext = _encode(image, 'PNG', optimize=True), 'png'
+    else:
+        data, ext = _encode(image, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True), 'jpg'
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{prefix}/{digest[:2]}/{digest}.{ext}'
+    if not storage.exists(name):   # même contenu : même fichier
+        storage.save(name, ContentFile(data))
+
+    _write_thumbnails(image, name, sizes, storage)
+    return name
+
+
+def _write_thumbnails(image, name, sizes, storage):
+    """Écrit les vignettes absentes de l'image `name` ; retourne leur nombre"""
+    written = 0
+    for size_name, size in sizes.items():
+        webp_name, jpeg_name = (_thumbnail_name(name, size_name, e) for e in ('webp', 'jpg'))
+        if storage.exists(webp_name) and storage.exists(jpeg_name):
+            continue
+        thumbnail = ImageOps.fit(image, size, Image.LANCZOS)
+        if not storage.exists(webp_name):
+            storage.save(webp_name, ContentFile(_encode(thumbnail, 'WEBP', quality=WEBP_QUALITY, method=4)))
+            written += 1
+        if not storage.exists(jpeg_name):
+            storage.save(jpeg_name, ContentFile(
+                _encode(_flatten(thumbnail), 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            ))
+            written += 1
+    return written
+
+
+def complete_thumbnails(name, sizes, storage=default_storage):
+    """
+    Vignettes manquantes d'une image déjà traitée, tirées du fichier stocké
+    (jamais ré-encodé : son nom, adresse de son contenu, ne change pas).
+    Lève ValueError si le fichier n'est pas une image.
+    """
+    with storage.open(name, 'rb') as source:
+        try:
+            image = Image.open(source)
+            image.load()
+        except (UnidentifiedImageError, OSError) as exc:
+            raise ValueError(f"Image illisible : {exc}") from exc
+    return _write_thumbnails(image, name, sizes, storage)
+
+
+def process_upload(field_file, prefix, sizes):
+    """Avant l'enregistrement du modèle : traite le fichier d'un ImageField s'il vient d'être téléversé"""
+    if not field_file or getattr(field_file, '_committed', True):
+        return
+    try:
+        name = store_image(field_file.file, prefix, sizes, field_file.storage)
+    except ValueError:
+        return   # laissé tel quel : upload_to le range quand même par contenu
+    field_file.name = name
+    field_file._committed = True
+
+
+def is_processed(name):
+    return bool(name and HASHED_NAME.search(name))
+
+
+def thumbnail_urls(field_file, sizes):
+    """{taille: {'webp': url, 'jpeg': url}} ; vide pour une image pas encore traitée"""
+    if not field_file or not is_processed(field_file.name):
+        return {}
+    storage = field_file.storage
+    return {
+        size_name: {
+            'webp': storage.url(_thumbnail_name(field_file.name, size_name, 'webp')),
+            'jpeg': storage.url(_thumbnail_name(field_file.name, size_name, 'jpg')),
+        }
+        for size_name in sizes
+    }
+
+
+def delete_image(name, sizes, storage=default_storage):
+    """Supprime une image traitée et ses vignettes (à n'appeler que si plus aucune ligne n'y renvoie)"""
+    if not name:
+        return
+    names = [name]
+    if is_processed(name):
+        names += [_thumbnail_name(name, size_name, ext) for size_name in sizes for ext in ('webp', 'jpg')]
+    for path in names:
+        if storage.exists(path):
+            storage.delete(path)
@@ -87,11 +87,51 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT',default=5432, cast=int),
+        # Connexions persistantes : gardées DB_CONN_MAX_AGE secondes par processus
+        # (0 = une connexion par requête) et vérifiées avant d'être réutilisées
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        # Derrière PgBouncer en mode transaction : pas de curseurs côté serveur
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_PGBOUNCER', default=False, cast=bool),
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            # Détecte les connexions coupées (pare-feu, redémarrage) pendant qu'elles dorment
+            'keepalives': 1,
+            'keepalives_idle': 60,
+        },
     }
 }
 
 
 
+# Cache
+# `plagiarism` : réponses de recherche et texte des pages web (cache disque avec TTL)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'plagiarism': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('PLAGIARISM_CACHE_DIR', default=os.path.join(CORE_DIR, 'cache', 'plagiarism')),
+        'TIMEOUT': config('PLAGIARISM_CACHE_TTL', default=7 * 24 * 3600, cast=int),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # `badges` : résumés de la page your_badges ; partagé entre le web et les workers
+    # (DatabaseCache : `python manage.py createcachetable` au déploiement)
+    'badges': {
+        'BACKEND': config('BADGE_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('BADGE_CACHE_LOCATION', default='badge_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Recommandations : matrices et modèles précalculés (hors base de données)
+RECOMMENDER_DATA_DIR = config('RECOMMENDER_DATA_DIR', default=os.path.join(CORE_DIR, 'data', 'recommender'))
+# Moteur des recommandations utilisateur : 'knn' (utilisateurs proches) ou 'als' (facteurs latents)
+RECOMMENDER_ENGINE = config('RECOMMENDER_ENGINE', default='knn')
+# Index de plus proches voisins (livres, utilisateurs) : 'ivf' (approché) ou 'exact'
+RECOMMENDER_ANN_BACKEND = config('RECOMMENDER_ANN_BACKEND', default='ivf')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
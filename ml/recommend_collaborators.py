@@ -1,45 +1,37 @@
+import os
+import sys
+
+import django
+
+# ⚡ Définir les settings avant tout import de modèles
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
 import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer, MinMaxScaler
-from sklearn.metrics.pairwise import cosine_similarity
+from apps.collaboration.recommender import COUNT_COLUMNS, build_features, top_k_similar
+
+TOP_N = 10
 
 # 1️⃣ Charger le dataset
 df = pd.read_csv('dataset_users.csv')
 
-# 2️⃣ Préparer les genres
-df['genres_authored'] = df['genres_authored'].fillna('')
-df['genres_authored'] = df['genres_authored'].apply(lambda x: x.split(',') if x else [])
-
-# 3️⃣ Encoder les genres
-mlb = MultiLabelBinarizer()
-genres_encoded = mlb.fit_transform(df['genres_authored'])
-genres_df = pd.DataFrame(genres_encoded, columns=mlb.classes_, index=df.index)
-
-# 4️⃣ Features numériques
-numeric_features = df[['nbr_books_authored', 'nbr_books_collab', 'nbr_collab_accepted', 'nbr_collab_pending', 'nbr_collab_refused']]
-scaler = MinMaxScaler()
-numeric_scaled = pd.DataFrame(scaler.fit_transform(numeric_features), columns=numeric_features.columns, index=df.index)
-
-# 5️⃣ Combiner toutes les features
-features = pd.concat([numeric_scaled, genres_df], axis=1)
-
-# 6️⃣ Calculer la similarité cosine
-similarity_matrix = cosine_similarity(features)
-similarity_df = pd.DataFrame(similarity_matrix, index=df['user_id'], columns=df['user_id'])
-
-# 7️⃣ Fonction pour obtenir top N recommandations
-def get_top_recommendations(user_id, top_n=10):
-    scores = similarity_df.loc[user_id].drop(user_id)
-    top_users = scores.sort_values(ascending=False).head(top_n)
-    return top_users
-
-# 8️⃣ Afficher recommandations
-print("===== Top 10 collaborateurs recommandés =====\n")
-for user_id, username in zip(df['user_id'], df['username']):
-    top_users = get_top_recommendations(user_id)
+# 2️⃣ Features : compteurs mis à l'échelle + genres one-hot (creux), comme dans l'application
+genre_lists = [genres.split(',') if genres else [] for genres in df['genres_authored'].fillna('')]
+features, _ = build_features(df[COUNT_COLUMNS].to_numpy(), genre_lists)
+
+# 3️⃣ Top N voisins (cosinus) par blocs : pas de matrice n x n en mémoire
+indices, scores = top_k_similar(features, k=TOP_N)
+
+# 4️⃣ Afficher recommandations
+user_ids = df['user_id'].to_numpy()
+print(f"===== Top {TOP_N} collaborateurs recommandés =====\n")
+for row, (user_id, username) in enumerate(zip(user_ids, df['username'])):
     print(f"Utilisateur {username} (id={user_id}):")
-    for uid, score in top_users.items():
-        print(f"   - id={uid} | score={score:.3f}")
+    for neighbor, score in zip(indices[row], scores[row]):
+        if neighbor >= 0:
+            print(f"   - id={user_ids[neighbor]} | score={score:.3f}")
     print("\n----------------------------------------\n")
 
-# 9️⃣ Exporter le dataset ML final
+# 5️⃣ Exporter le dataset ML final
 df.to_csv('dataset_users_ml.csv', index=False)